@@ -1,8 +1,9 @@
 import logging
 import os
 
+import httpx
 from dotenv import load_dotenv
-from supabase import Client, create_client
+from supabase import Client, ClientOptions, create_client
 
 # Load environment variables from .env file
 load_dotenv()   
@@ -26,9 +27,32 @@ WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 WHATSAPP_WEBHOOK_VERIFY_TOKEN = os.getenv("WHATSAPP_WEBHOOK_VERIFY_TOKEN")
 WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", "https://graph.facebook.com/v18.0")
+WHATSAPP_POOL_SIZE = int(os.getenv("WHATSAPP_POOL_SIZE", "20"))
+WHATSAPP_TIMEOUT_SECONDS = float(os.getenv("WHATSAPP_TIMEOUT_SECONDS", "10"))
+WHATSAPP_MAX_RETRIES = int(os.getenv("WHATSAPP_MAX_RETRIES", "3"))
+WHATSAPP_KEEPALIVE_SECONDS = float(os.getenv("WHATSAPP_KEEPALIVE_SECONDS", "60"))
+WHATSAPP_MESSAGES_PER_SECOND = float(os.getenv("WHATSAPP_MESSAGES_PER_SECOND", "80"))
+WHATSAPP_RECIPIENT_INTERVAL_SECONDS = float(os.getenv("WHATSAPP_RECIPIENT_INTERVAL_SECONDS", "6"))
+
+# Webhook deduplication (ids of already processed messages/updates)
+WEBHOOK_DEDUP_BACKEND = os.getenv("WEBHOOK_DEDUP_BACKEND", "memory").lower()
+WEBHOOK_DEDUP_DB_PATH = os.getenv("WEBHOOK_DEDUP_DB_PATH", "data/webhook_events.sqlite3")
+WEBHOOK_DEDUP_MAX_ENTRIES = int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "100000"))
+WEBHOOK_DEDUP_TTL_SECONDS = float(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", str(7 * 24 * 3600)))
 
 # LocationIQ Configuration
 LOCATIONIQ_TOKEN = os.getenv("LOCATIONIQ_TOKEN")
+LOCATIONIQ_ENDPOINTS = [
+    endpoint.strip() for endpoint in
+    os.getenv("LOCATIONIQ_ENDPOINTS", "https://us1.locationiq.com/v1,https://eu1.locationiq.com/v1").split(",")
+    if endpoint.strip()
+]
+LOCATIONIQ_POOL_SIZE = int(os.getenv("LOCATIONIQ_POOL_SIZE", "10"))
+LOCATIONIQ_TIMEOUT_SECONDS = float(os.getenv("LOCATIONIQ_TIMEOUT_SECONDS", "3"))
+LOCATIONIQ_HEDGE_SECONDS = float(os.getenv("LOCATIONIQ_HEDGE_SECONDS", "0.5"))
+LOCATIONIQ_BREAKER_FAILURES = int(os.getenv("LOCATIONIQ_BREAKER_FAILURES", "5"))
+LOCATIONIQ_BREAKER_RESET_SECONDS = float(os.getenv("LOCATIONIQ_BREAKER_RESET_SECONDS", "30"))
+LOCATIONIQ_FALLBACK_DETOUR = float(os.getenv("LOCATIONIQ_FALLBACK_DETOUR", "1.5"))
 RESTAURANT_LAT = 4.7235821
 RESTAURANT_LON = -74.0416399
 max_lat = 4.779974
@@ -36,6 +60,46 @@ min_lat = 4.658535
 max_lon = -74.000675
 min_lon = -74.136503
 
+# Geocoding/route cache (normalized address -> coordinates and driving distance)
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "data/geocode_cache.sqlite3")
+GEOCODE_CACHE_TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", str(90 * 24 * 3600)))
+GEOCODE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_SECONDS", str(24 * 3600)))
+
+# Offline delivery zones (fee band grid over the bounding box above)
+DELIVERY_ZONE_CELL_DEGREES = float(os.getenv("DELIVERY_ZONE_CELL_DEGREES", "0.001"))
+DELIVERY_ZONE_MARGIN = float(os.getenv("DELIVERY_ZONE_MARGIN", "0.1"))
+
+# Menu catalog (in-memory snapshot of the menu tables)
+MENU_CATALOG_TTL_SECONDS = int(os.getenv("MENU_CATALOG_TTL_SECONDS", "900"))
+
+# Database access (pooled HTTP connections to Supabase)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+
+# Conversation memory cache (bounded LRU with TTL)
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "5000"))
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MEMORY_CACHE_TTL_SECONDS = int(os.getenv("MEMORY_CACHE_TTL_SECONDS", "1800"))
+MEMORY_CACHE_SWEEP_SECONDS = int(os.getenv("MEMORY_CACHE_SWEEP_SECONDS", "60"))
+
+# Conversation checkpoints ("sqlite" local store or shared "supabase" tables)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite3")
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "3"))
+CHECKPOINT_MESSAGE_WINDOW = int(os.getenv("CHECKPOINT_MESSAGE_WINDOW", "12"))
+CHECKPOINT_COMPACT_EVERY = int(os.getenv("CHECKPOINT_COMPACT_EVERY", "10"))
+
+# Message grouping (adaptive per-user debounce window)
+DEBOUNCE_MIN_SECONDS = float(os.getenv("DEBOUNCE_MIN_SECONDS", "0.4"))
+DEBOUNCE_MAX_SECONDS = float(os.getenv("DEBOUNCE_MAX_SECONDS", "3.0"))
+DEBOUNCE_INITIAL_SECONDS = float(os.getenv("DEBOUNCE_INITIAL_SECONDS", "1.2"))
+DEBOUNCE_TYPING_SECONDS = float(os.getenv("DEBOUNCE_TYPING_SECONDS", "4.0"))
+
+# Workflow admission control (global pool of concurrent turns)
+WORKFLOW_MAX_CONCURRENCY = int(os.getenv("WORKFLOW_MAX_CONCURRENCY", "8"))
+WORKFLOW_MAX_QUEUE = int(os.getenv("WORKFLOW_MAX_QUEUE", "200"))
+WORKFLOW_QUEUE_SLO_SECONDS = float(os.getenv("WORKFLOW_QUEUE_SLO_SECONDS", "30"))
 
 
 
@@ -44,7 +108,15 @@ logging.info(f"Using LLM_MODEL: {GOOGLE_MODEL}")
 
 supabase: Client = create_client(
     supabase_url=SUPABASE_URL,
-    supabase_key=SUPABASE_KEY
+    supabase_key=SUPABASE_KEY,
+    options=ClientOptions(
+        postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS,
+        httpx_client=httpx.Client(
+            timeout=SUPABASE_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE,
+                                max_keepalive_connections=SUPABASE_POOL_SIZE),
+        ),
+    ),
 )
 
 
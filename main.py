@@ -50,25 +50,23 @@ async def run_both_bots(whatsapp_host: str = "0.0.0.0", whatsapp_port: int = 500
     telegram_bot = TelegramBot(TELEGRAM_BOT_TOKEN)
     whatsapp_bot = WhatsAppBot()
     
-    # Create tasks for both bots
-    telegram_task = asyncio.create_task(telegram_bot.run())
-    
-    # Run WhatsApp webhook server in a separate thread
-    import threading
-    whatsapp_thread = threading.Thread(
-        target=whatsapp_bot.run_webhook_server,
-        args=(whatsapp_host, whatsapp_port),
-        daemon=True
-    )
-    whatsapp_thread.start()
+    # Both bots share this event loop: the webhook server, the Telegram
+    # polling and every workflow run
+    tasks = [
+        asyncio.create_task(telegram_bot.run()),
+        asyncio.create_task(whatsapp_bot.serve(whatsapp_host, whatsapp_port)),
+    ]
     
     try:
-        # Wait for Telegram bot (WhatsApp runs in background thread)
-        await telegram_task
-    except KeyboardInterrupt:
+        # Run until either bot stops
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
         logger.info("Stopping both bots...")
-        await telegram_bot.stop()
-        await whatsapp_bot.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 def print_config_status():
     """Print the configuration status for both platforms."""
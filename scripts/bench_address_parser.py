@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+⏱️ Address parser microbenchmarks
+
+Times parse_colombian_address against the previous multi-pass
+implementation (kept here as the reference), with a cold and a warm memo,
+and the batch API over a list of addresses with repeats.
+
+Usage:
+    python scripts/bench_address_parser.py
+    python scripts/bench_address_parser.py --number 20000
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+from typing import Dict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services import distance_calculator as dc
+
+SAMPLES = [
+    "Cl 127a # 11b-76 apto 301",
+    "Calle 127A Bis Sur # 11B - 76, Torre 9 Apto 1001",
+    "cra 7 No 123-45",
+    "Kr. 15 n° 80-20 int 2",
+    "Av 68 #  24-10 oficina 502",
+    "Diagonal 62 sur # 15C-30",
+    "tv 25b num 61-30 casa 4",
+    "Transversal 25B No 61-30 Bloque 3 piso 2",
+    "dg 40 # 5-12, mz 4 lote 7",
+    "Aut norte # 170-15",
+    "AVDA CALLE 26 # 69-76 TORRE 2",
+    "Prado Alto",
+    "calle 100 #7-33 of. 1203",
+    "  cr 11   #   93-07  ",
+    "Cll 45 # 13-40",
+]
+
+
+# --- Previous implementation (one re.sub per abbreviation, regex rebuilt per call) ---
+
+LEGACY_ABBR = [
+    (r"\bcl\b\.?", "calle"),
+    (r"\bcal\b\.?", "calle"),
+    (r"\bcra\b\.?", "carrera"),
+    (r"\bcr\b\.?", "carrera"),
+    (r"\bkr\b\.?", "carrera"),
+    (r"\bk\b\.?", "carrera"),
+    (r"\bav\b\.?", "avenida"),
+    (r"\bavda\b\.?", "avenida"),
+    (r"\bdg\b\.?", "diagonal"),
+    (r"\bdiag\b\.?", "diagonal"),
+    (r"\btv\b\.?", "transversal"),
+    (r"\btransv\b\.?", "transversal"),
+    (r"\btrv\b\.?", "transversal"),
+    (r"\baut\b\.?", "autopista"),
+    (r"\bn[º°o]\b\.?", "#"),
+    (r"\bnum\b\.?", "#"),
+]
+
+
+def legacy_normalize_text(s: str) -> str:
+    s = s.strip()
+    s = re.sub(r"[,\s]+", " ", s)
+    for pat, rep in LEGACY_ABBR:
+        s = re.sub(pat, rep, s, flags=re.IGNORECASE)
+    return s
+
+
+def legacy_extract_complements(s: str) -> (Dict[str, str], str):
+    comps = {}
+    rest = s
+    for key, pat in dc._COMPLEMENTS.items():
+        regex = re.compile(rf"\b{pat}\s+([A-Za-z0-9\-]+)", re.IGNORECASE)
+        while True:
+            m = regex.search(rest)
+            if not m:
+                break
+            comps[key] = m.group(1).strip().upper()
+            start, end = m.span()
+            rest = (rest[:start] + " ").strip() + " " + rest[end:].strip()
+            rest = re.sub(r"\s{2,}", " ", rest).strip()
+    return comps, rest
+
+
+def legacy_parse(address: str) -> dc.AddressParts:
+    complements, base = legacy_extract_complements(legacy_normalize_text(address))
+    m = dc._STREET_RE.search(base)
+    ap = dc.AddressParts(raw=address, complements=complements or {})
+    if not m:
+        return ap
+    ap.street_type = m.group("type").lower()
+    ap.street_number = m.group("num").upper()
+    ap.bis = bool(m.group("bis"))
+    ap.sector = (m.group("sector") or "").lower() or None
+    ap.secondary = (m.group("sec") or "").upper() or None
+    ap.tertiary = (m.group("ter") or "").upper() or None
+    return ap
+
+
+def bench(label: str, fn, number: int, per_call: int = 1) -> float:
+    seconds = min(timeit.repeat(fn, number=number, repeat=3))
+    usec = seconds / (number * per_call) * 1e6
+    print(f"   {label:<32} {usec:8.2f} µs/address")
+    return usec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Address parser microbenchmarks")
+    parser.add_argument("--number", type=int, default=5000, help="Iterations per measurement")
+    args = parser.parse_args()
+    n = args.number
+    address = SAMPLES[1]
+
+    print("🔤 Normalization")
+    bench("legacy _normalize_text", lambda: legacy_normalize_text(address), n)
+    bench("compiled _normalize_text", lambda: dc._normalize_text(address), n)
+
+    print("🏷️ Complements")
+    norm = dc._normalize_text(address)
+    bench("legacy _extract_complements", lambda: legacy_extract_complements(norm), n)
+    bench("single-pass _extract_complements", lambda: dc._extract_complements(norm), n)
+
+    print("📍 Full parse")
+    bench("legacy parse", lambda: legacy_parse(address), n)
+    bench("parse, memo miss", lambda: dc._to_parts(address, dc._parse_fields(address)), n)
+    bench("parse, memo hit", lambda: dc.parse_colombian_address(address), n)
+
+    print("📦 Batch (10k addresses, 15 distinct)")
+    batch = (SAMPLES * 700)[:10_000]
+    bench("legacy, one by one", lambda: [legacy_parse(a) for a in batch], max(1, n // 1000), len(batch))
+    bench("parse_colombian_addresses", lambda: dc.parse_colombian_addresses(batch), max(1, n // 1000), len(batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+🗺️ Re-zone stored customer addresses
+
+Recomputes the delivery band and fee of every geocoded address in
+direcciones_clientes in one vectorized pass. Run it after changing the fee
+bands, or with --moved after changing the restaurant location, when the
+stored driving distances are no longer valid.
+
+Usage:
+    python scripts/rezone_addresses.py                    # report only
+    python scripts/rezone_addresses.py --moved            # distances are stale
+    python scripts/rezone_addresses.py --moved --route    # route boundary addresses via LocationIQ
+    python scripts/rezone_addresses.py --moved --route --apply
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.database import addresses
+from src.services.delivery_zones import DeliveryZones
+from src.services.distance_calculator import DistanceCalculator
+from src.services.geo_batch import zone_fees_many
+
+
+def rezone(rows, calculator: DistanceCalculator, zones: DeliveryZones, moved: bool, route: bool):
+    """
+    New (fee, distance) for every address row.
+
+    Stored distances are kept unless the restaurant moved; addresses without
+    a valid distance get their fee from the zone grid, and the ones on a band
+    boundary are routed (with `route`) or left with fee None.
+    """
+    lats = np.array([row["lat"] for row in rows], dtype=np.float64)
+    lons = np.array([row["lon"] for row in rows], dtype=np.float64)
+    distances = np.array([np.nan if moved or row.get("distancia") is None else row["distancia"] for row in rows],
+                         dtype=np.float64)
+
+    known = ~np.isnan(distances)
+    fees = np.zeros(len(rows), dtype=np.int64)
+    fees[known] = calculator.fees_many(distances[known])
+    grid_fees, needs_route = zone_fees_many(zones, lats[~known], lons[~known])
+    fees[~known] = grid_fees
+
+    pending = np.zeros(len(rows), dtype=bool)
+    pending[np.flatnonzero(~known)[needs_route]] = True
+    if route:
+        for i in np.flatnonzero(pending):
+            distances[i] = calculator.calculate_driving_distance(lats[i], lons[i])
+            fees[i] = calculator.calculate_delivery_fee(distances[i])
+        pending[:] = False
+
+    return [
+        (None if pending[i] else int(fees[i]), None if np.isnan(distances[i]) else float(distances[i]))
+        for i in range(len(rows))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-zone every stored customer address")
+    parser.add_argument("--moved", action="store_true",
+                        help="The restaurant location changed: ignore stored driving distances")
+    parser.add_argument("--route", action="store_true",
+                        help="Call the routing API for addresses on a band boundary")
+    parser.add_argument("--apply", action="store_true",
+                        help="Write the new distances to direcciones_clientes")
+    args = parser.parse_args()
+
+    calculator = DistanceCalculator()
+    rows = addresses.list_located_sync(with_distance=False)
+    print(f"📍 {len(rows)} geocoded addresses")
+    if not rows:
+        return
+
+    # Routes measured from the old location would bias the grid after a move
+    zones = calculator.zones
+    if args.moved:
+        zones.build([])
+    else:
+        calculator.ensure_zones()
+
+    results = rezone(rows, calculator, zones, args.moved, args.route)
+
+    by_fee = Counter(fee for fee, _ in results)
+    for fee, count in sorted(by_fee.items(), key=lambda item: (item[0] is None, item[0] or 0)):
+        label = "needs routing" if fee is None else ("out of zone" if fee < 0 else f"${fee:,}")
+        print(f"   {label:>14}: {count}")
+
+    changes = [
+        (row["direccion_id"], distance)
+        for row, (_, distance) in zip(rows, results)
+        if distance != row.get("distancia") and (distance is not None or args.moved)
+    ]
+    print(f"✏️ {len(changes)} addresses with a new distance")
+
+    if args.apply:
+        for direccion_id, distance in changes:
+            addresses.update_by_id_sync(direccion_id, {"distancia": distance})
+        if args.moved:
+            calculator.cache.clear_distances()
+        print("✅ Changes applied")
+    elif changes:
+        print("ℹ️ Run with --apply to write them")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
-import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
 
 from langchain_core.messages import HumanMessage
 
+from src.bots.debounce import AdaptiveDebouncer
+from src.bots.mailbox import Mailboxes
 from src.core.checkpointer import state_manager
 from src.core.memory import memory
+from src.core.scheduler import (OVERLOAD_MESSAGE, WorkflowOverloaded,
+                                workflow_scheduler)
 from src.core.workflow import Workflow
 
 logger = logging.getLogger(__name__)
@@ -26,14 +30,15 @@ class BaseBot(ABC):
         """Initialize the base bot with common components."""
         self.workflow = Workflow()
         
-        # Message grouping mechanism - prevents multiple responses for rapid messages
-        self.pending_tasks: Dict[str, asyncio.Task] = {}  # cliente_id -> processing task
-        self.pending_messages: Dict[str, List[str]] = {}  # cliente_id -> list of messages
-        self.message_delay = 3.0  # seconds to wait for additional messages
+        # Message grouping - one mailbox per user serializes its turns, waiting
+        # for a per-user adaptive window before running a turn
+        self.debouncer = AdaptiveDebouncer()
+        self.mailboxes = Mailboxes(self._process_messages, self.debouncer)
         
-        # Rate limiting
-        self.rate_limiter: Dict[str, float] = {}  # cliente_id -> last_message_time
-        self.min_message_interval = 1.0  # seconds between messages per user
+        # Rate limiting - only floods are dropped; bursts are grouped by the mailbox
+        self.rate_limiter: Dict[str, Deque[float]] = {}  # cliente_id -> recent message times
+        self.rate_limit_messages = 20  # messages allowed per user...
+        self.rate_limit_window = 10.0  # ...within this many seconds
         
     @abstractmethod
     async def send_message(self, recipient: str, message: str, **kwargs) -> bool:
@@ -78,7 +83,8 @@ class BaseBot(ABC):
     
     async def is_rate_limited(self, cliente_id: str) -> bool:
         """
-        Check if a user is rate limited.
+        Check if a user is flooding (more than rate_limit_messages in rate_limit_window).
+        Sub-second bursts are allowed: the mailbox groups them into one turn.
         
         Args:
             cliente_id: User identifier
@@ -88,15 +94,18 @@ class BaseBot(ABC):
         """
         import time
         current_time = time.time()
-        last_message_time = self.rate_limiter.get(cliente_id, 0)
+        recent = self.rate_limiter.setdefault(cliente_id, deque())
+        while recent and current_time - recent[0] >= self.rate_limit_window:
+            recent.popleft()
         
-        if current_time - last_message_time < self.min_message_interval:
+        if len(recent) >= self.rate_limit_messages:
             return True
             
-        self.rate_limiter[cliente_id] = current_time
+        recent.append(current_time)
         return False
     
-    async def process_user_message(self, cliente_id: str, message_text: str, user_name: str = None) -> None:
+    async def process_user_message(self, cliente_id: str, message_text: str, user_name: str = None,
+                                   complete: bool = False) -> None:
         """
         Process a user message with grouping and workflow integration.
         
@@ -104,6 +113,7 @@ class BaseBot(ABC):
             cliente_id: User identifier
             message_text: The message content
             user_name: Optional user name for logging
+            complete: True when the message needs no follow-up (e.g. a button reply)
         """
         try:
             # Check rate limiting
@@ -113,22 +123,9 @@ class BaseBot(ABC):
             
             logger.info(f"📥 Received message from {user_name or cliente_id}: {message_text}")
             
-            # Cancel any existing processing task for this user
-            if cliente_id in self.pending_tasks:
-                self.pending_tasks[cliente_id].cancel()
-                logger.info(f"⏹️ Cancelled previous processing task for user {cliente_id}")
-            
-            # Add message to pending messages for this user
-            if cliente_id not in self.pending_messages:
-                self.pending_messages[cliente_id] = []
-            self.pending_messages[cliente_id].append(message_text)
-            
-            logger.info(f"📋 Total pending messages for {user_name or cliente_id}: {len(self.pending_messages[cliente_id])}")
-            
-            # Create new delayed processing task
-            self.pending_tasks[cliente_id] = asyncio.create_task(
-                self._delayed_message_processing(cliente_id, user_name)
-            )
+            # Queue the message in the user's mailbox; a running turn is never cancelled
+            box = self.mailboxes.post(cliente_id, message_text, user_name, complete)
+            logger.info(f"📋 Total pending messages for {user_name or cliente_id}: {len(box.inbox)}")
             
         except Exception as e:
             import traceback
@@ -137,27 +134,16 @@ class BaseBot(ABC):
             logger.error(f"Full traceback:\n{error_traceback}")
             await self.send_error_message(cliente_id, "Lo siento, hubo un error procesando tu mensaje. Por favor, intenta de nuevo.")
     
-    async def _delayed_message_processing(self, cliente_id: str, user_name: str = None) -> None:
+    async def _process_messages(self, cliente_id: str, messages: List[str], user_name: str = None) -> None:
         """
-        Process messages after a delay, allowing for message grouping.
+        Run one conversation turn for the messages grouped by the user's mailbox.
         
         Args:
             cliente_id: User identifier
+            messages: Messages received since the previous turn
             user_name: Optional user name for logging
         """
         try:
-            # Wait for the delay period
-            await asyncio.sleep(self.message_delay)
-            
-            # Get all pending messages for this user
-            messages = self.pending_messages.get(cliente_id, [])
-            if not messages:
-                logger.warning(f"No pending messages found for user {cliente_id}")
-                return
-            
-            # Clear pending messages for this user
-            self.pending_messages[cliente_id] = []
-            
             # Combine multiple messages into one if needed
             if len(messages) == 1:
                 combined_message = messages[0]
@@ -167,22 +153,24 @@ class BaseBot(ABC):
                 logger.info(f"🔄 Processing {len(messages)} grouped messages from {user_name or cliente_id}")
                 logger.info(f"📝 Combined message: {combined_message}")
             
-            # Send typing indicator
-            await self.send_typing_action(cliente_id)
-            
-            # Process combined message through workflow
-            initial_state = await state_manager.load_state_for_user(cliente_id, HumanMessage(combined_message))
-            initial_state["messages"] += [HumanMessage(combined_message)]
-            
-            logger.info("Starting workflow execution...")
-            response_state = await self.workflow.workflow.ainvoke(initial_state)
-            logger.info(f"Workflow completed. Response state keys: {list(response_state.keys()) if response_state else 'None'}")
+            # Bounded global pool: waits for a slot or sheds the turn under overload
+            async with workflow_scheduler.slot(cliente_id):
+                # Send typing indicator
+                await self.send_typing_action(cliente_id)
+                
+                # Process combined message through workflow
+                initial_state = await state_manager.load_state_for_user(cliente_id, HumanMessage(combined_message))
+                initial_state["messages"] += [HumanMessage(combined_message)]
+                
+                logger.info("Starting workflow execution...")
+                response_state = await self.workflow.workflow.ainvoke(initial_state)
+                logger.info(f"Workflow completed. Response state keys: {list(response_state.keys()) if response_state else 'None'}")
             
-            # Get the last message from the response state
+            # Reply outside the slot, so outbound pacing never holds up other users' turns
             if response_state and response_state.get("messages"):
                 response = response_state["messages"][-1]
                 logger.info(f"Extracted response: {response.content[:100]}..." if len(response.content) > 100 else response.content)
-                
+            
                 # Send response to user
                 success = await self.send_message(cliente_id, response.content)
                 if success:
@@ -195,30 +183,19 @@ class BaseBot(ABC):
                     "Lo siento, no pude procesar tu mensaje. ¿Podrías intentar de nuevo?"
                 )
                 logger.warning("No messages found in response state")
-            
-            # Clean up pending task
-            if cliente_id in self.pending_tasks:
-                del self.pending_tasks[cliente_id]
                 
-        except asyncio.CancelledError:
-            logger.info(f"⏹️ Message processing cancelled for user {cliente_id}")
-            # Don't re-raise CancelledError as it's expected behavior
+        except WorkflowOverloaded:
+            await self.send_error_message(cliente_id, OVERLOAD_MESSAGE)
         except Exception as e:
             import traceback
             error_traceback = traceback.format_exc()
-            logger.error(f"Error in delayed message processing: {str(e)}")
+            logger.error(f"Error in message processing: {str(e)}")
             logger.error(f"Full traceback:\n{error_traceback}")
             
             await self.send_error_message(
                 cliente_id,
                 "Lo siento, hubo un error procesando tu mensaje. Por favor, intenta de nuevo."
             )
-            
-            # Clean up on error
-            if cliente_id in self.pending_tasks:
-                del self.pending_tasks[cliente_id]
-            if cliente_id in self.pending_messages:
-                self.pending_messages[cliente_id] = []
     
     async def send_error_message(self, recipient: str, error_message: str) -> None:
         """
@@ -282,20 +259,10 @@ class BaseBot(ABC):
         """Stop the bot gracefully."""
         logger.info("Stopping bot...")
         
-        # Cancel all pending message processing tasks
-        if self.pending_tasks:
-            logger.info(f"⏹️ Cancelling {len(self.pending_tasks)} pending message tasks...")
-            for cliente_id, task in self.pending_tasks.items():
-                if not task.cancelled():
-                    task.cancel()
-                    logger.info(f"   Cancelled task for user {cliente_id}")
-            
-            # Wait a brief moment for tasks to clean up
-            await asyncio.sleep(0.1)
-            
-            # Clear the dictionaries
-            self.pending_tasks.clear()
-            self.pending_messages.clear()
+        # Cancel the mailbox workers (the only place turns are cancelled)
+        if len(self.mailboxes):
+            logger.info(f"⏹️ Stopping {len(self.mailboxes)} user mailboxes...")
+            await self.mailboxes.stop()
             logger.info("✅ All pending tasks cleared")
     
     def get_pending_messages_info(self) -> Dict[str, Any]:
@@ -305,17 +272,4 @@ class BaseBot(ABC):
         Returns:
             Dictionary with pending tasks and messages information
         """
-        return {
-            "active_tasks": len(self.pending_tasks),
-            "users_with_pending_messages": len(self.pending_messages),
-            "total_pending_messages": sum(len(msgs) for msgs in self.pending_messages.values()),
-            "message_delay_seconds": self.message_delay,
-            "user_details": {
-                cliente_id: {
-                    "pending_message_count": len(messages),
-                    "has_active_task": cliente_id in self.pending_tasks,
-                    "task_cancelled": cliente_id in self.pending_tasks and self.pending_tasks[cliente_id].cancelled()
-                }
-                for cliente_id, messages in self.pending_messages.items() if messages
-            }
-        }
\ No newline at end of file
+        return {**self.mailboxes.info(), "scheduler": workflow_scheduler.stats()}
@@ -0,0 +1,112 @@
+"""
+Grouping windows for incoming chat messages.
+Decides how long a user's mailbox waits for more messages before running a
+turn, learning per user how quickly they send the parts of one request.
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, List
+
+from config.settings import (DEBOUNCE_INITIAL_SECONDS, DEBOUNCE_MAX_SECONDS,
+                             DEBOUNCE_MIN_SECONDS, DEBOUNCE_TYPING_SECONDS)
+from src.core.cache import LRUTTLCache
+from src.services.product_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Button / callback payloads (confirm_order_12, cancel_order_12, ...)
+_PAYLOAD_RE = re.compile(r"^[a-z]+(_[a-z0-9]+)+$")
+
+# Single short replies that never need a follow-up (matched after normalize_text)
+_COMPLETE_RE = re.compile(
+    r"^(si+|sip|no|ok|okey|okay|dale|listo|vale|claro|confirmo|correcto|de acuerdo|perfecto"
+    r"|esta bien|de una|gracias|muchas gracias|efectivo|tarjeta|nequi|daviplata|transferencia)"
+    r"( (si|listo|gracias|confirmo|por favor))*$")
+
+
+def looks_complete(message: str) -> bool:
+    """True for button payloads and single short confirmations."""
+    raw = message.strip()
+    if _PAYLOAD_RE.match(raw):
+        return True
+    return bool(_COMPLETE_RE.match(normalize_text(raw)))
+
+
+class FixedDebouncer:
+    """Always waits the same number of seconds."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.typing_seconds = 0.0
+
+    def observe(self, cliente_id: str, message: str) -> None:
+        pass
+
+    def delay(self, cliente_id: str, messages: List[str], complete: bool = False) -> float:
+        return self.seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "fixed", "delay_seconds": self.seconds}
+
+
+class AdaptiveDebouncer:
+    """
+    Per-user grouping window learned from how each user types.
+
+    For every user it keeps an exponential moving average of the gap between
+    consecutive messages of a burst and of how often a message is followed
+    by another one within `max_delay`. Users who send one message at a time
+    get `min_delay`; users who type in bursts get ~1.5x their usual gap,
+    capped at `max_delay`. A single message that looks complete (button
+    payload, "sí", "listo"...) is answered without waiting, and users with
+    no history start at `initial_delay`.
+    """
+
+    def __init__(self, min_delay: float = DEBOUNCE_MIN_SECONDS, max_delay: float = DEBOUNCE_MAX_SECONDS,
+                 initial_delay: float = DEBOUNCE_INITIAL_SECONDS, typing_seconds: float = DEBOUNCE_TYPING_SECONDS,
+                 alpha: float = 0.3, burst_threshold: float = 0.25, max_users: int = 10000):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.typing_seconds = typing_seconds
+        self.alpha = alpha
+        self.burst_threshold = burst_threshold
+        # cliente_id -> [last_arrival, gap_ewma, burst_rate, message_count]
+        self._users = LRUTTLCache(max_entries=max_users, ttl_seconds=24 * 3600, sweep_interval=0,
+                                  name="debounce-profiles")
+
+    def observe(self, cliente_id: str, message: str) -> None:
+        """Record an incoming message of the user."""
+        now = time.monotonic()
+        profile = self._users.get(cliente_id)
+        if profile is None:
+            self._users.put(cliente_id, [now, None, 0.0, 1])
+            return
+        gap = now - profile[0]
+        followed_up = gap <= self.max_delay
+        profile[0] = now
+        profile[3] += 1
+        profile[2] += self.alpha * ((1.0 if followed_up else 0.0) - profile[2])
+        if followed_up:
+            profile[1] = gap if profile[1] is None else profile[1] + self.alpha * (gap - profile[1])
+
+    def delay(self, cliente_id: str, messages: List[str], complete: bool = False) -> float:
+        """Seconds of silence to wait before running a turn for `messages`."""
+        if len(messages) == 1 and (complete or looks_complete(messages[0])):
+            return 0.0
+        profile = self._users.peek(cliente_id)
+        if profile is None or profile[3] < 2:
+            return self.initial_delay
+        if profile[2] < self.burst_threshold or profile[1] is None:
+            return self.min_delay
+        return min(self.max_delay, max(self.min_delay, profile[1] * 1.5))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "adaptive",
+            "profiles": len(self._users),
+            "min_delay_seconds": self.min_delay,
+            "max_delay_seconds": self.max_delay,
+        }
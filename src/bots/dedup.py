@@ -0,0 +1,174 @@
+"""
+Webhook redelivery filter.
+Remembers the ids of processed WhatsApp messages and Telegram updates, in
+process and optionally in a shared SQLite or Supabase store.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config.settings import (WEBHOOK_DEDUP_BACKEND, WEBHOOK_DEDUP_DB_PATH,
+                             WEBHOOK_DEDUP_MAX_ENTRIES,
+                             WEBHOOK_DEDUP_TTL_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+
+class SeenIds:
+    """
+    Bounded in-memory set of recently seen ids.
+
+    Ids are kept in arrival order with the time they were first seen, so
+    both the membership test and the eviction of ids older than
+    `ttl_seconds` (or beyond `max_entries`) are O(1) amortized.
+    """
+
+    def __init__(self, max_entries: int = WEBHOOK_DEDUP_MAX_ENTRIES, ttl_seconds: float = WEBHOOK_DEDUP_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, key: str) -> bool:
+        """Record `key`; False if it was already seen within the TTL."""
+        now = time.monotonic()
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl_seconds and len(self._seen) < self.max_entries:
+                break
+            del self._seen[oldest]
+        if key in self._seen:
+            return False
+        self._seen[key] = now
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class SQLiteSeenStore:
+    """Seen ids in a local SQLite file, shared by the bot processes of one host."""
+
+    def __init__(self, path: str, ttl_seconds: float = WEBHOOK_DEDUP_TTL_SECONDS, prune_every: int = 1000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_events (event_key TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+
+    def add(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._inserts += 1
+            if self._inserts % self.prune_every == 0:
+                self._conn.execute("DELETE FROM webhook_events WHERE seen_at < ?", (now - self.ttl_seconds,))
+            cursor = self._conn.execute(
+                "INSERT INTO webhook_events (event_key, seen_at) VALUES (?, ?) "
+                "ON CONFLICT(event_key) DO UPDATE SET seen_at = excluded.seen_at "
+                "WHERE webhook_events.seen_at < ?",
+                (key, now, now - self.ttl_seconds),
+            )
+            return cursor.rowcount == 1
+
+    async def aadd(self, key: str) -> bool:
+        return await asyncio.to_thread(self.add, key)
+
+
+class SupabaseSeenStore:
+    """
+    Seen ids in Supabase, shared by every bot instance.
+
+    Expected table:
+
+        create table webhook_events (
+            event_key text primary key,
+            seen_at timestamptz not null default now()
+        );
+    """
+
+    table = "webhook_events"
+
+    def __init__(self, db=None):
+        if db is None:
+            from src.services.database import database as db
+        self.db = db
+
+    async def aadd(self, key: str) -> bool:
+        # One round trip: the row comes back only if this call inserted it
+        result = await self.db.execute(
+            lambda client: client.table(self.table).upsert(
+                {"event_key": key}, on_conflict="event_key", ignore_duplicates=True),
+            op="webhook dedup",
+        )
+        return bool(result.data)
+
+
+class WebhookDeduplicator:
+    """
+    Drops platform redeliveries (WhatsApp message ids, Telegram update ids).
+
+    Every id is checked against the in-memory set first, so a redelivery to
+    the same process costs one dict lookup. When a shared store is
+    configured, ids new to this process are also claimed there, so a
+    redelivery that lands on another instance is dropped too. If the shared
+    store fails the event is processed: a rare duplicate reply is better
+    than a lost message.
+    """
+
+    def __init__(self, local: Optional[SeenIds] = None, shared=None):
+        self.local = local or SeenIds()
+        self.shared = shared
+        self.stats = {"seen": 0, "duplicates": 0, "shared_errors": 0}
+
+    async def first_time(self, platform: str, event_id: Any) -> bool:
+        """True the first time an event id is seen; False for redeliveries."""
+        if event_id is None:
+            return True
+        key = f"{platform}:{event_id}"
+        self.stats["seen"] += 1
+        if not self.local.add(key):
+            self.stats["duplicates"] += 1
+            return False
+        if self.shared is not None:
+            try:
+                if not await self.shared.aadd(key):
+                    self.stats["duplicates"] += 1
+                    return False
+            except Exception as e:
+                self.stats["shared_errors"] += 1
+                logger.warning(f"Shared webhook dedup store failed ({e!r}), processing {key}")
+        return True
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "tracked_ids": len(self.local)}
+
+
+def create_deduplicator(kind: str = WEBHOOK_DEDUP_BACKEND, path: str = WEBHOOK_DEDUP_DB_PATH) -> WebhookDeduplicator:
+    """Deduplicator selected by the WEBHOOK_DEDUP_BACKEND setting ("memory", "sqlite" or "supabase")."""
+    if kind == "supabase":
+        return WebhookDeduplicator(shared=SupabaseSeenStore())
+    if kind == "sqlite":
+        return WebhookDeduplicator(shared=SQLiteSeenStore(path))
+    if kind != "memory":
+        logger.warning(f"Unknown webhook dedup backend {kind!r}, using memory")
+    return WebhookDeduplicator()
+
+
+# Global instance, shared by the Telegram and WhatsApp bots
+webhook_dedup = create_deduplicator()
@@ -0,0 +1,168 @@
+"""
+Per-user mailboxes for incoming chat messages.
+Each user's messages go through one actor that groups bursts and runs that
+user's conversation turns one at a time, without cancelling a running turn.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# handler(cliente_id, messages, context) runs one conversation turn
+TurnHandler = Callable[[str, List[str], Any], Awaitable[None]]
+
+
+class UserMailbox:
+    """
+    Actor that owns the conversation turns of one user.
+
+    Incoming messages are queued in the mailbox and a single worker task runs
+    the turns one after another:
+
+    - While the user is idle the worker waits until the debouncer's window
+      has passed without a new message (or typing signal), so a burst is
+      grouped into one turn.
+    - Messages that arrive while a turn is running are queued for the next
+      turn. The running turn is never cancelled, so LLM calls already paid
+      for always produce a reply.
+    """
+
+    def __init__(self, cliente_id: str, handler: TurnHandler, debouncer,
+                 on_idle: Optional[Callable[["UserMailbox"], None]] = None):
+        self.cliente_id = cliente_id
+        self.handler = handler
+        self.debouncer = debouncer
+        self.on_idle = on_idle
+        self.inbox: List[str] = []
+        self.context: Any = None
+        self.complete = False
+        self.last_arrival = 0.0
+        self.typing_until = 0.0
+        self.in_turn = False
+        self.turns = 0
+        self._arrived = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def post(self, message: str, context: Any = None, complete: bool = False) -> None:
+        """
+        Queue a message; `context` (e.g. the platform update) of the latest message is passed to the handler.
+        `complete` marks messages known to need no follow-up, such as button replies.
+        """
+        self.debouncer.observe(self.cliente_id, message)
+        self.complete = complete and not self.inbox
+        self.inbox.append(message)
+        self.context = context
+        self.last_arrival = time.monotonic()
+        self.typing_until = 0.0
+        self._arrived.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"mailbox-{self.cliente_id}")
+
+    def typing(self) -> None:
+        """Platform typing signal: more text is coming, keep the window open."""
+        self.typing_until = time.monotonic() + self.debouncer.typing_seconds
+        self._arrived.set()
+
+    async def _debounce(self) -> None:
+        """Wait until the user has been quiet for the debouncer's window."""
+        while True:
+            delay = self.debouncer.delay(self.cliente_id, self.inbox, self.complete)
+            remaining = max(self.last_arrival + delay, self.typing_until) - time.monotonic()
+            if remaining <= 0:
+                return
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self) -> None:
+        try:
+            while self.inbox:
+                await self._debounce()
+                messages, self.inbox = self.inbox, []
+                self.in_turn = True
+                try:
+                    await self.handler(self.cliente_id, messages, self.context)
+                except Exception as e:
+                    logger.error(f"Turn failed for user {self.cliente_id}: {e}")
+                finally:
+                    self.in_turn = False
+                    self.turns += 1
+                if self.inbox:
+                    logger.info(f"📬 {len(self.inbox)} messages queued during the turn of {self.cliente_id}")
+        finally:
+            # No await between the empty-inbox check and here: a later post() starts a new worker
+            self._task = None
+            if self.on_idle:
+                self.on_idle(self)
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None
+
+    async def stop(self) -> None:
+        """Cancel the worker (shutdown only) and drop queued messages."""
+        task, self._task = self._task, None
+        self.inbox = []
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class Mailboxes:
+    """Per-cliente_id mailboxes; a mailbox is dropped as soon as its user has nothing pending."""
+
+    def __init__(self, handler: TurnHandler, debouncer):
+        self.handler = handler
+        self.debouncer = debouncer
+        self._boxes: Dict[str, UserMailbox] = {}
+
+    def post(self, cliente_id: str, message: str, context: Any = None, complete: bool = False) -> UserMailbox:
+        box = self._boxes.get(cliente_id)
+        if box is None:
+            box = self._boxes[cliente_id] = UserMailbox(cliente_id, self.handler, self.debouncer,
+                                                        on_idle=self._release)
+        box.post(message, context, complete)
+        return box
+
+    def typing(self, cliente_id: str) -> None:
+        """Forward a typing signal; ignored unless the user has messages waiting."""
+        box = self._boxes.get(cliente_id)
+        if box is not None and box.inbox:
+            box.typing()
+
+    def _release(self, box: UserMailbox) -> None:
+        if self._boxes.get(box.cliente_id) is box and not box.inbox:
+            del self._boxes[box.cliente_id]
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def get(self, cliente_id: str) -> Optional[UserMailbox]:
+        return self._boxes.get(cliente_id)
+
+    async def stop(self) -> None:
+        boxes = list(self._boxes.values())
+        self._boxes.clear()
+        await asyncio.gather(*(box.stop() for box in boxes))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "active_tasks": sum(1 for box in self._boxes.values() if box.active),
+            "users_in_turn": sum(1 for box in self._boxes.values() if box.in_turn),
+            "users_with_pending_messages": sum(1 for box in self._boxes.values() if box.inbox),
+            "total_pending_messages": sum(len(box.inbox) for box in self._boxes.values()),
+            "debounce": self.debouncer.stats(),
+            "user_details": {
+                cliente_id: {
+                    "pending_message_count": len(box.inbox),
+                    "in_turn": box.in_turn,
+                    "turns": box.turns,
+                }
+                for cliente_id, box in self._boxes.items()
+            },
+        }
@@ -0,0 +1,160 @@
+"""
+Outbound message queue for the WhatsApp bot.
+Paces replies under a global token bucket and a per-recipient interval,
+merging texts that pile up for the same recipient into one message.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# deliver(recipient, text, **options) -> True if the platform accepted the message
+Deliver = Callable[..., Awaitable[bool]]
+
+SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """
+    Global send rate: `rate` tokens per second, bursts of up to `capacity`.
+
+    `reserve()` takes a token immediately and returns how long the caller
+    must wait before using it, so concurrent senders queue up in order
+    instead of polling.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _Batch:
+    """Texts waiting to go out to one recipient as a single message."""
+
+    def __init__(self, text: str, options: Dict[str, Any]):
+        self.texts = [text]
+        self.chars = len(text)
+        self.options = options
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def fits(self, text: str, options: Dict[str, Any], max_chars: int) -> bool:
+        return options == self.options and self.chars + len(SEPARATOR) + len(text) <= max_chars
+
+    def add(self, text: str) -> None:
+        self.texts.append(text)
+        self.chars += len(SEPARATOR) + len(text)
+
+    @property
+    def text(self) -> str:
+        return SEPARATOR.join(self.texts)
+
+
+class OutboundQueue:
+    """
+    Paced outbound messages.
+
+    Every send waits for a token of the global bucket and for `min_interval`
+    seconds since the previous message to the same recipient; it is delayed,
+    never dropped. Texts queued for a recipient while it waits are coalesced
+    into one message (up to `max_chars`), and every caller gets the outcome
+    of the message that carried its text.
+
+    The time of the last send per recipient lives in an OrderedDict kept in
+    send order, so recording a send and dropping entries older than
+    `min_interval` (which no longer delay anything) are O(1) amortized.
+    """
+
+    def __init__(self, deliver: Deliver, rate: float, min_interval: float, max_chars: int = 4096):
+        self.deliver = deliver
+        self.bucket = TokenBucket(rate)
+        self.min_interval = min_interval
+        self.max_chars = max_chars
+        self._last_sent: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: Dict[str, Deque[_Batch]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "coalesced": 0, "delayed": 0}
+
+    async def send(self, recipient: str, text: str, **options) -> bool:
+        """Queue a text for `recipient` and wait until it has been delivered."""
+        self.stats["queued"] += 1
+        queue = self._pending.setdefault(recipient, deque())
+        if queue and queue[-1].fits(text, options, self.max_chars):
+            batch = queue[-1]
+            batch.add(text)
+            self.stats["coalesced"] += 1
+        else:
+            batch = _Batch(text, options)
+            queue.append(batch)
+
+        if recipient not in self._workers:
+            self._workers[recipient] = asyncio.create_task(self._run(recipient), name=f"outbox-{recipient}")
+        # Shielded: a cancelled caller must not cancel texts coalesced from other callers
+        return await asyncio.shield(batch.future)
+
+    def _recipient_delay(self, recipient: str, now: float) -> float:
+        while self._last_sent:
+            oldest, sent_at = next(iter(self._last_sent.items()))
+            if now - sent_at < self.min_interval:
+                break
+            del self._last_sent[oldest]
+        sent_at = self._last_sent.get(recipient)
+        return 0.0 if sent_at is None else sent_at + self.min_interval - now
+
+    async def _run(self, recipient: str) -> None:
+        queue = self._pending[recipient]
+        try:
+            while queue:
+                delay = self._recipient_delay(recipient, time.monotonic())
+                if delay > 0:
+                    self.stats["delayed"] += 1
+                    logger.info(f"⏳ Pacing messages to {recipient}: sending in {delay:.1f}s")
+                    # Texts queued meanwhile are coalesced into the head batch
+                    await asyncio.sleep(delay)
+                delay = self.bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                batch = queue.popleft()
+                try:
+                    delivered = await self.deliver(recipient, batch.text, **batch.options)
+                except Exception as e:
+                    logger.error(f"Error delivering message to {recipient}: {e}")
+                    delivered = False
+                self._last_sent[recipient] = time.monotonic()
+                self._last_sent.move_to_end(recipient)
+                self.stats["sent" if delivered else "failed"] += 1
+                if not batch.future.done():
+                    batch.future.set_result(delivered)
+        finally:
+            for batch in queue:
+                if not batch.future.done():
+                    batch.future.set_result(False)
+            self._pending.pop(recipient, None)
+            self._workers.pop(recipient, None)
+
+    async def drain(self) -> None:
+        """Wait until every queued message has been sent."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def info(self) -> Dict[str, Any]:
+        pending: List[int] = [sum(len(b.texts) for b in queue) for queue in self._pending.values()]
+        return {
+            **self.stats,
+            "pending_recipients": len(self._pending),
+            "pending_texts": sum(pending),
+            "paced_recipients": len(self._last_sent),
+        }
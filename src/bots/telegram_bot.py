@@ -10,8 +10,13 @@ from telegram import BotCommand, Update
 from telegram.ext import (Application, CommandHandler, ContextTypes,
                           MessageHandler, filters)
 
+from src.bots.debounce import AdaptiveDebouncer
+from src.bots.dedup import webhook_dedup
+from src.bots.mailbox import Mailboxes
 from src.core.checkpointer import state_manager
 from src.core.memory import memory
+from src.core.scheduler import (OVERLOAD_MESSAGE, WorkflowOverloaded,
+                                workflow_scheduler)
 from src.core.state import ChatState
 from src.core.workflow import Workflow
 
@@ -38,10 +43,10 @@ class TelegramBot:
         self._setup_handlers()
         self._setup_shutdown_handlers()
         
-        # Message grouping mechanism - prevents multiple responses for rapid messages
-        self.pending_tasks: Dict[str, asyncio.Task] = {}  # cliente_id -> processing task
-        self.pending_messages: Dict[str, List[str]] = {}  # cliente_id -> list of messages
-        self.message_delay = 3.0  # seconds to wait for additional messages
+        # Message grouping - one mailbox per user serializes its turns, waiting
+        # for a per-user adaptive window before running a turn
+        self.debouncer = AdaptiveDebouncer()
+        self.mailboxes = Mailboxes(self._process_messages, self.debouncer)
 
     def _setup_handlers(self) -> None:
         """Set up all command and message handlers."""
@@ -106,12 +111,19 @@ class TelegramBot:
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
-        Handle incoming messages with 3-second grouping delay.
+        Handle incoming messages through the user's mailbox.
         
-        Multiple consecutive messages from the same user within 3 seconds
-        will be grouped together and processed as a single request.
+        Consecutive messages sent while the user is idle are grouped into one
+        turn (the wait adapts to how the user types, and short confirmations
+        are answered right away); messages sent while a turn is running are
+        answered in the next one.
         """
         try:
+            # Updates can be delivered again (e.g. after a restart before the offset was confirmed)
+            if not await webhook_dedup.first_time("telegram", update.update_id):
+                logger.info(f"🔁 Skipping repeated update {update.update_id}")
+                return
+            
             # Get the user's message and info
             message_text = update.message.text
             user = update.effective_user
@@ -120,22 +132,9 @@ class TelegramBot:
             
             logger.info(f"📥 Received message from {user_name} ({cliente_id}): {message_text}")
             
-            # Cancel any existing processing task for this user
-            if cliente_id in self.pending_tasks:
-                self.pending_tasks[cliente_id].cancel()
-                logger.info(f"⏹️ Cancelled previous processing task for user {cliente_id}")
-            
-            # Add message to pending messages for this user
-            if cliente_id not in self.pending_messages:
-                self.pending_messages[cliente_id] = []
-            self.pending_messages[cliente_id].append(message_text)
-            
-            logger.info(f"📋 Total pending messages for {user_name}: {len(self.pending_messages[cliente_id])}")
-            
-            # Create new delayed processing task
-            self.pending_tasks[cliente_id] = asyncio.create_task(
-                self._delayed_message_processing(update, cliente_id, user_name)
-            )
+            # Queue the message in the user's mailbox; a running turn is never cancelled
+            box = self.mailboxes.post(cliente_id, message_text, update)
+            logger.info(f"📋 Total pending messages for {user_name}: {len(box.inbox)}")
             
         except Exception as e:
             import traceback
@@ -146,28 +145,17 @@ class TelegramBot:
                 "Lo siento, hubo un error procesando tu mensaje. Por favor, intenta de nuevo."
             )
     
-    async def _delayed_message_processing(self, update: Update, cliente_id: str, user_name: str) -> None:
+    async def _process_messages(self, cliente_id: str, messages: List[str], update: Update) -> None:
         """
-        Process messages after a delay, allowing for message grouping.
+        Run one conversation turn for the messages grouped by the user's mailbox.
         
         Args:
-            update: The Telegram update object
             cliente_id: User identifier
-            user_name: User's first name
+            messages: Messages received since the previous turn
+            update: The Telegram update of the latest message
         """
+        user_name = update.effective_user.first_name
         try:
-            # Wait for the delay period
-            await asyncio.sleep(self.message_delay)
-            
-            # Get all pending messages for this user
-            messages = self.pending_messages.get(cliente_id, [])
-            if not messages:
-                logger.warning(f"No pending messages found for user {cliente_id}")
-                return
-            
-            # Clear pending messages for this user
-            self.pending_messages[cliente_id] = []
-            
             # Combine multiple messages into one if needed
             if len(messages) == 1:
                 combined_message = messages[0]
@@ -177,19 +165,21 @@ class TelegramBot:
                 logger.info(f"🔄 Processing {len(messages)} grouped messages from {user_name}")
                 logger.info(f"📝 Combined message: {combined_message}")
             
-            # Process combined message through workflow
-            initial_state = await state_manager.load_state_for_user(cliente_id, HumanMessage(combined_message))
-            initial_state["messages"] += [HumanMessage(combined_message)]
-            
-            logger.info("Starting workflow execution...")
-            response_state = await self.workflow.workflow.ainvoke(initial_state)
-            logger.info(f"Workflow completed. Response state: {response_state}")
+            # Bounded global pool: waits for a slot or sheds the turn under overload
+            async with workflow_scheduler.slot(cliente_id):
+                # Process combined message through workflow
+                initial_state = await state_manager.load_state_for_user(cliente_id, HumanMessage(combined_message))
+                initial_state["messages"] += [HumanMessage(combined_message)]
+                
+                logger.info("Starting workflow execution...")
+                response_state = await self.workflow.workflow.ainvoke(initial_state)
+                logger.info(f"Workflow completed. Response state: {response_state}")
             
-            # Get the last message from the response state
+            # Reply outside the slot, so a slow Telegram API call never holds up other users' turns
             if response_state and response_state.get("messages"):
                 response = response_state["messages"][-1]
                 logger.info(f"Extracted response: {response}")
-                
+            
                 # Send response to user
                 await update.message.reply_text(response.content)
                 logger.info(f"✅ Response sent to {user_name}")
@@ -198,18 +188,13 @@ class TelegramBot:
                     "Lo siento, no pude procesar tu mensaje. ¿Podrías intentar de nuevo?"
                 )
                 logger.warning("No messages found in response state")
-            
-            # Clean up pending task
-            if cliente_id in self.pending_tasks:
-                del self.pending_tasks[cliente_id]
                 
-        except asyncio.CancelledError:
-            logger.info(f"⏹️ Message processing cancelled for user {cliente_id}")
-            # Don't re-raise CancelledError as it's expected behavior
+        except WorkflowOverloaded:
+            await update.message.reply_text(OVERLOAD_MESSAGE)
         except Exception as e:
             import traceback
             error_traceback = traceback.format_exc()
-            logger.error(f"Error in delayed message processing: {str(e)}")
+            logger.error(f"Error in message processing: {str(e)}")
             logger.error(f"Full traceback:\n{error_traceback}")
             
             try:
@@ -218,12 +203,6 @@ class TelegramBot:
                 )
             except Exception as reply_error:
                 logger.error(f"Failed to send error message: {reply_error}")
-            
-            # Clean up on error
-            if cliente_id in self.pending_tasks:
-                del self.pending_tasks[cliente_id]
-            if cliente_id in self.pending_messages:
-                self.pending_messages[cliente_id] = []
 
     async def _handle_tool_response(self, update: Update, tool_call: dict) -> None:
         """Handle different types of tool responses."""
@@ -535,32 +514,30 @@ class TelegramBot:
             raise
         
     async def run(self) -> None:
-        """Run the bot asynchronously."""
+        """Run the bot on the current event loop (e.g. alongside the WhatsApp webhook server)."""
         logger.info("Starting bot asynchronously...")
         
-        # Setup bot commands menu
-        await self.setup_bot_commands()
-        
-        await self.application.run_polling(drop_pending_updates=True)
+        async with self.application:
+            # Setup bot commands menu
+            await self.setup_bot_commands()
+            
+            await self.application.start()
+            await self.application.updater.start_polling(drop_pending_updates=True)
+            try:
+                # Poll until the task running the bot is cancelled
+                await asyncio.Event().wait()
+            finally:
+                await self.application.updater.stop()
+                await self.stop()
         
     async def stop(self) -> None:
         """Stop the bot gracefully."""
         logger.info("Stopping bot...")
         
-        # Cancel all pending message processing tasks
-        if self.pending_tasks:
-            logger.info(f"⏹️ Cancelling {len(self.pending_tasks)} pending message tasks...")
-            for cliente_id, task in self.pending_tasks.items():
-                if not task.cancelled():
-                    task.cancel()
-                    logger.info(f"   Cancelled task for user {cliente_id}")
-            
-            # Wait a brief moment for tasks to clean up
-            await asyncio.sleep(0.1)
-            
-            # Clear the dictionaries
-            self.pending_tasks.clear()
-            self.pending_messages.clear()
+        # Cancel the mailbox workers (the only place turns are cancelled)
+        if len(self.mailboxes):
+            logger.info(f"⏹️ Stopping {len(self.mailboxes)} user mailboxes...")
+            await self.mailboxes.stop()
             logger.info("✅ All pending tasks cleared")
         
         await self.application.stop()
@@ -573,17 +550,4 @@ class TelegramBot:
         Returns:
             Dictionary with pending tasks and messages information
         """
-        return {
-            "active_tasks": len(self.pending_tasks),
-            "users_with_pending_messages": len(self.pending_messages),
-            "total_pending_messages": sum(len(msgs) for msgs in self.pending_messages.values()),
-            "message_delay_seconds": self.message_delay,
-            "user_details": {
-                cliente_id: {
-                    "pending_message_count": len(messages),
-                    "has_active_task": cliente_id in self.pending_tasks,
-                    "task_cancelled": cliente_id in self.pending_tasks and self.pending_tasks[cliente_id].cancelled()
-                }
-                for cliente_id, messages in self.pending_messages.items() if messages
-            }
-        }
+        return {**self.mailboxes.info(), "scheduler": workflow_scheduler.stats(), "dedup": webhook_dedup.info()}
@@ -0,0 +1,127 @@
+"""
+Minimal ASGI app for the bot webhooks.
+Routes requests to async handlers, so the webhook server (uvicorn) shares
+one event loop with the bots instead of running Flask in a thread.
+"""
+
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+class Request:
+    """Incoming HTTP request of the ASGI app."""
+
+    def __init__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]]):
+        self.scope = scope
+        self._receive = receive
+        self._body: Optional[bytes] = None
+        self.method: str = scope["method"]
+        self.path: str = scope["path"]
+        self.args: Dict[str, str] = {
+            key: values[0] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()
+        }
+        self.headers: Dict[str, str] = {
+            key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])
+        }
+
+    async def body(self) -> bytes:
+        if self._body is None:
+            chunks = []
+            while True:
+                message = await self._receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            self._body = b"".join(chunks)
+        return self._body
+
+    async def get_json(self) -> Any:
+        body = await self.body()
+        return json.loads(body) if body else None
+
+
+class Response:
+    """HTTP response; `body` is sent as-is with the given content type."""
+
+    def __init__(self, body: Any = b"", status: int = 200, content_type: str = "text/plain; charset=utf-8"):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+
+    async def send(self, send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": [(b"content-type", self.content_type.encode()),
+                        (b"content-length", str(len(self.body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    return Response(json.dumps(data, ensure_ascii=False, default=str), status, "application/json")
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class WebhookApp:
+    """
+    Minimal ASGI application for the bot webhooks.
+
+    Exact-path routing plus lifespan hooks; served by uvicorn on the same
+    event loop that runs the workflow, so background work started by a
+    request outlives the request.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Handler] = {}
+        self.on_startup: List[Callable[[], Awaitable[None]]] = []
+        self.on_shutdown: List[Callable[[], Awaitable[None]]] = []
+
+    def route(self, path: str, methods: List[str]):
+        def decorator(handler: Handler) -> Handler:
+            for method in methods:
+                self.routes[(method.upper(), path)] = handler
+            return handler
+        return decorator
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            allowed = any(path == scope["path"] for _, path in self.routes)
+            response = json_response({"status": "error", "message": "method not allowed" if allowed else "not found"},
+                                     405 if allowed else 404)
+        else:
+            try:
+                response = await handler(Request(scope, receive))
+            except Exception as e:
+                logger.error(f"Unhandled error in {scope['method']} {scope['path']}: {e}")
+                response = json_response({"status": "error", "message": str(e)}, 500)
+        await response.send(send)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for hook in self.on_startup:
+                    await hook()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for hook in self.on_shutdown:
+                    try:
+                        await hook()
+                    except Exception as e:
+                        logger.error(f"Shutdown hook failed: {e}")
+                await send({"type": "lifespan.shutdown.complete"})
+                return
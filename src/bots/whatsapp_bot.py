@@ -2,17 +2,20 @@ import asyncio
 import json
 import logging
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
-import requests
-from flask import Flask, jsonify, make_response, request
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import uvicorn
 
 from config.settings import (WHATSAPP_ACCESS_TOKEN, WHATSAPP_API_URL,
+                             WHATSAPP_MESSAGES_PER_SECOND,
                              WHATSAPP_PHONE_NUMBER_ID,
+                             WHATSAPP_RECIPIENT_INTERVAL_SECONDS,
                              WHATSAPP_WEBHOOK_VERIFY_TOKEN)
 from src.bots.base_bot import BaseBot
+from src.bots.dedup import webhook_dedup
+from src.bots.send_queue import OutboundQueue
+from src.bots.webhook_app import Request, Response, WebhookApp, json_response
+from src.bots.whatsapp_client import WhatsAppClient
 
 logger = logging.getLogger(__name__)
 
@@ -53,80 +56,78 @@ class WhatsAppBot(BaseBot):
             "Content-Type": "application/json"
         }
         
-        # Rate limiting for WhatsApp API
-        self.global_rate_limiter = {}  # Global rate limiting (80 msg/sec)
-        self.user_rate_limiter = {}   # Per-user rate limiting (1 msg/6sec)
-        self.min_message_interval = 6.0  # WhatsApp requires 6 seconds between messages per user
+        # Outbound queue enforcing the API limits (80 msg/sec overall, 1 msg/6sec per user)
+        self.outbox = OutboundQueue(self._deliver_text, rate=WHATSAPP_MESSAGES_PER_SECOND,
+                                    min_interval=WHATSAPP_RECIPIENT_INTERVAL_SECONDS)
         
-        # Setup HTTP session with retries
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        # Pooled async HTTP client (keep-alive, jittered retries, Retry-After)
+        self.http = WhatsAppClient(self.headers)
         
-        # Flask app for webhook
-        self.app = Flask(__name__)
+        # ASGI app for the webhook, served on the same event loop as the workflow
+        self.app = WebhookApp()
+        self.background_tasks: Set[asyncio.Task] = set()
         self._setup_webhook_routes()
         
         logger.info("WhatsApp bot initialized successfully")
     
     def _setup_webhook_routes(self) -> None:
-        """Set up Flask routes for WhatsApp webhook."""
+        """Set up the ASGI routes for the WhatsApp webhook."""
         
         @self.app.route("/webhook/whatsapp", methods=["GET"])
-        def webhook_verify():
+        async def webhook_verify(request: Request) -> Response:
             """Verify webhook URL with WhatsApp."""
             return self.verify_webhook(request)
         
         @self.app.route("/webhook/whatsapp", methods=["POST"])
-        def webhook_receive():
+        async def webhook_receive(request: Request) -> Response:
             """Receive messages from WhatsApp."""
-            return asyncio.run(self.handle_webhook(request))
+            return await self.handle_webhook(request)
         
         @self.app.route("/whatsapp/status", methods=["GET"])
-        def status_check():
+        async def status_check(request: Request) -> Response:
             """Health check endpoint."""
-            return jsonify({
+            return json_response({
                 "status": "active",
                 "bot_type": "whatsapp",
+                "background_tasks": len(self.background_tasks),
+                "api": self.http.stats,
+                "outbox": self.outbox.info(),
+                "dedup": webhook_dedup.info(),
                 "pending_messages": self.get_pending_messages_info()
             })
         
         @self.app.route("/health", methods=["GET"])
-        def health_check():
+        async def health_check(request: Request) -> Response:
             """Generic health check endpoint for Docker/K8s monitoring."""
             try:
                 # Verificar conexión básica y configuración
                 if not all([self.access_token, self.phone_number_id]):
-                    return jsonify({
+                    return json_response({
                         "status": "unhealthy",
                         "reason": "Missing configuration"
-                    }), 503
+                    }, 503)
                 
-                return jsonify({
+                return json_response({
                     "status": "healthy",
                     "timestamp": time.time(),
                     "bot_type": "whatsapp",
                     "service": "one-pizzeria-bot"
-                }), 200
+                }, 200)
             except Exception as e:
                 logger.error(f"Health check failed: {e}")
-                return jsonify({
+                return json_response({
                     "status": "unhealthy",
                     "reason": str(e)
-                }), 503
+                }, 503)
+        
+        self.app.on_shutdown.append(self.stop)
     
-    def verify_webhook(self, request) -> Any:
+    def verify_webhook(self, request: Request) -> Response:
         """
         Verify webhook URL with WhatsApp.
         
         Args:
-            request: Flask request object
+            request: Incoming webhook request
             
         Returns:
             Challenge response or error
@@ -138,44 +139,55 @@ class WhatsAppBot(BaseBot):
             
             if mode == "subscribe" and token == self.verify_token:
                 logger.info("✅ WhatsApp webhook verified successfully")
-                return make_response(challenge, 200)
+                return Response(challenge or "", 200)
             else:
                 logger.warning("❌ WhatsApp webhook verification failed")
-                return make_response("Verification failed", 403)
+                return Response("Verification failed", 403)
                 
         except Exception as e:
             logger.error(f"Error in webhook verification: {e}")
-            return make_response("Verification error", 500)
+            return Response("Verification error", 500)
     
-    async def handle_webhook(self, request) -> Any:
+    async def handle_webhook(self, request: Request) -> Response:
         """
         Handle incoming webhook from WhatsApp.
         
+        Meta is acknowledged right away; the messages are processed in a
+        background task on the server's event loop, so a slow workflow never
+        delays the ack (and never triggers a redelivery).
+        
         Args:
-            request: Flask request object
+            request: Incoming webhook request
             
         Returns:
             JSON response confirming receipt
         """
         try:
-            data = request.get_json()
+            data = await request.get_json()
             
             if not data:
                 logger.warning("Received empty webhook data")
-                return jsonify({"status": "no_data"}), 200
+                return json_response({"status": "no_data"}, 200)
             
             logger.info(f"📨 Received WhatsApp webhook: {json.dumps(data, indent=2)}")
             
-            # Process webhook data
-            await self._process_webhook_data(data)
+            # Process webhook data in the background
+            self._spawn(self._process_webhook_data(data))
             
-            return jsonify({"status": "received"}), 200
+            return json_response({"status": "received"}, 200)
             
         except Exception as e:
             logger.error(f"Error handling webhook: {e}")
             import traceback
             logger.error(f"Full traceback:\n{traceback.format_exc()}")
-            return jsonify({"status": "error", "message": str(e)}), 500
+            return json_response({"status": "error", "message": str(e)}, 500)
+    
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
     
     async def _process_webhook_data(self, data: Dict[str, Any]) -> None:
         """
@@ -230,6 +242,11 @@ class WhatsAppBot(BaseBot):
                 logger.warning("Received message without sender information")
                 return
             
+            # Meta redelivers webhooks it considers unacknowledged: run each message once
+            if not await webhook_dedup.first_time("whatsapp", message_id):
+                logger.info(f"🔁 Skipping redelivered message {message_id} from {from_number}")
+                return
+            
             # Get contact name
             user_name = contact_map.get(from_number, "Usuario")
             cliente_id = self.format_recipient_id(from_number)
@@ -240,8 +257,9 @@ class WhatsAppBot(BaseBot):
             message_text = await self._extract_message_content(message, message_type)
             
             if message_text:
-                # Process the message through the workflow
-                await self.process_user_message(cliente_id, message_text, user_name)
+                # Process the message through the workflow; button replies need no grouping wait
+                complete = message_type in ("interactive", "button")
+                await self.process_user_message(cliente_id, message_text, user_name, complete)
             else:
                 # Send acknowledgment for unsupported message types
                 await self.send_message(
@@ -309,6 +327,17 @@ class WhatsAppBot(BaseBot):
                 content += "]"
                 return content
             
+            elif message_type == "interactive":
+                # Reply buttons and list rows: the id is the payload the bot sent
+                interactive = message.get("interactive", {})
+                reply = interactive.get("button_reply") or interactive.get("list_reply") or {}
+                return reply.get("id") or reply.get("title")
+            
+            elif message_type == "button":
+                # Quick-reply buttons of template messages
+                button = message.get("button", {})
+                return button.get("payload") or button.get("text")
+            
             elif message_type == "contacts":
                 contacts = message.get("contacts", [])
                 if contacts:
@@ -329,6 +358,9 @@ class WhatsAppBot(BaseBot):
         """
         Send a text message via WhatsApp Business API.
         
+        Waits for the recipient's 6-second window and a global send token;
+        texts queued for the same user meanwhile go out as one message.
+        
         Args:
             recipient: Phone number (with country code)
             message: Message content
@@ -337,24 +369,32 @@ class WhatsAppBot(BaseBot):
         Returns:
             bool: True if message was sent successfully
         """
-        try:
-            # Check rate limiting
-            if not await self._check_rate_limits(recipient):
-                logger.warning(f"Rate limit exceeded for {recipient}")
-                return False
+        # Paced by the outbound queue: delayed (and coalesced) instead of dropped
+        return await self.outbox.send(recipient, message, preview_url=kwargs.get("preview_url", False))
+    
+    async def _deliver_text(self, recipient: str, message: str, preview_url: bool = False) -> bool:
+        """
+        Post one text message to the WhatsApp Business API (called by the outbound queue).
+        
+        Args:
+            recipient: Phone number (with country code)
+            message: Message content
+            preview_url: Render a preview for URLs in the text
             
-            # Prepare message payload
+        Returns:
+            bool: True if the API accepted the message
+        """
+        try:
             payload = {
                 "messaging_product": "whatsapp",
                 "to": recipient,
                 "type": "text",
                 "text": {
-                    "preview_url": kwargs.get("preview_url", False),
+                    "preview_url": preview_url,
                     "body": message
                 }
             }
             
-            # Send message
             response = await self._make_api_request("POST", self.messages_url, payload)
             
             if response and response.get("messages"):
@@ -398,37 +438,6 @@ class WhatsAppBot(BaseBot):
         # WhatsApp IDs are already in the correct format (e.g., "573001234567")
         return raw_id
     
-    async def _check_rate_limits(self, recipient: str) -> bool:
-        """
-        Check WhatsApp API rate limits.
-        
-        Args:
-            recipient: Phone number
-            
-        Returns:
-            bool: True if request is within rate limits
-        """
-        current_time = time.time()
-        
-        # Check per-user rate limit (1 message per 6 seconds per user)
-        last_message_time = self.user_rate_limiter.get(recipient, 0)
-        if current_time - last_message_time < self.min_message_interval:
-            time_to_wait = self.min_message_interval - (current_time - last_message_time)
-            logger.warning(f"User rate limit: Need to wait {time_to_wait:.1f}s for {recipient}")
-            return False
-        
-        # Update rate limiter
-        self.user_rate_limiter[recipient] = current_time
-        
-        # Clean up old entries (older than 1 hour)
-        cutoff_time = current_time - 3600
-        self.user_rate_limiter = {
-            k: v for k, v in self.user_rate_limiter.items() 
-            if v > cutoff_time
-        }
-        
-        return True
-    
     async def _make_api_request(self, method: str, url: str, data: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """
         Make an API request to WhatsApp Business API.
@@ -442,46 +451,42 @@ class WhatsAppBot(BaseBot):
             Response data or None if failed
         """
         try:
-            if method == "POST":
-                response = self.session.post(url, headers=self.headers, json=data, timeout=30)
-            elif method == "GET":
-                response = self.session.get(url, headers=self.headers, timeout=30)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-            
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                logger.error(f"Rate limit exceeded: {e}")
-            else:
-                logger.error(f"HTTP error {e.response.status_code}: {e}")
-                logger.error(f"Response content: {e.response.text}")
-            return None
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed: {e}")
-            return None
-            
+            return await self.http.request(method, url, data)
         except Exception as e:
             logger.error(f"Unexpected error in API request: {e}")
             return None
     
+    def _server_config(self, host: str, port: int, debug: bool = False) -> uvicorn.Config:
+        return uvicorn.Config(self.app, host=host, port=port, log_level="debug" if debug else "info",
+                              lifespan="on")
+    
     def run_webhook_server(self, host: str = "0.0.0.0", port: int = 5000, debug: bool = False) -> None:
         """
-        Run the Flask webhook server.
+        Run the webhook server (uvicorn) on a long-lived event loop.
         
         Args:
             host: Server host
             port: Server port
-            debug: Enable debug mode
+            debug: Enable debug logging
         """
         logger.info(f"🚀 Starting WhatsApp webhook server on {host}:{port}")
         logger.info(f"📡 Webhook URL: http://{host}:{port}/webhook/whatsapp")
         logger.info(f"🔍 Status URL: http://{host}:{port}/whatsapp/status")
         
-        self.app.run(host=host, port=port, debug=debug)
+        uvicorn.Server(self._server_config(host, port, debug)).run()
+    
+    async def serve(self, host: str = "0.0.0.0", port: int = 5000, debug: bool = False) -> None:
+        """Serve the webhook on the current event loop (to run alongside other bots)."""
+        logger.info(f"🚀 Starting WhatsApp webhook server on {host}:{port}")
+        await uvicorn.Server(self._server_config(host, port, debug)).serve()
+    
+    async def stop(self) -> None:
+        """Let in-flight webhook processing finish, stop the mailboxes and flush the outbox."""
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        await super().stop()
+        await self.outbox.drain()
+        await self.http.aclose()
     
     async def send_welcome_message(self, recipient: str) -> bool:
         """
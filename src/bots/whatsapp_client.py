@@ -0,0 +1,146 @@
+"""
+Async HTTP client for the WhatsApp Cloud API.
+One pooled httpx.AsyncClient with keep-alive connections to graph.facebook.com,
+strict timeouts and non-blocking retries (jittered backoff, Retry-After on 429).
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config.settings import (WHATSAPP_KEEPALIVE_SECONDS, WHATSAPP_MAX_RETRIES,
+                             WHATSAPP_POOL_SIZE, WHATSAPP_TIMEOUT_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: throttling and transient server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# A POST (sending a message) is only resent when it surely never reached the
+# API: failures before the request went out, and 429. After a read timeout or
+# a 5xx Meta may already have accepted it, and resending duplicates the reply.
+SAFE_POST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+SAFE_POST_STATUSES = {429}
+
+# Never wait longer than this between attempts, whatever Retry-After says
+MAX_RETRY_DELAY = 30.0
+
+
+def _backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter (0.5s, 1s, 2s... capped at 8s)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP date)."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class WhatsAppClient:
+    """
+    Pooled async client for the Graph API.
+
+    The httpx.AsyncClient is bound to the event loop that creates it, so it
+    is created on first use and recreated if the bot is later driven by a
+    different loop. GET requests that fail with a retryable status or a
+    transport error are retried up to `max_retries` times with
+    `asyncio.sleep`, so a throttled send never stalls other conversations.
+    POST requests are not idempotent: they are only retried on connection
+    errors and 429, never after the API may have processed them.
+    """
+
+    def __init__(self, headers: Dict[str, str], pool_size: int = WHATSAPP_POOL_SIZE,
+                 timeout: float = WHATSAPP_TIMEOUT_SECONDS, max_retries: int = WHATSAPP_MAX_RETRIES,
+                 keepalive_seconds: float = WHATSAPP_KEEPALIVE_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.headers = headers
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.keepalive_seconds = keepalive_seconds
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size,
+                                    keepalive_expiry=self.keepalive_seconds),
+                transport=self._transport,
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def request(self, method: str, url: str, data: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Send a request and return the decoded JSON body, or None if it failed.
+
+        Args:
+            method: HTTP method (GET, POST)
+            url: API endpoint URL
+            data: JSON payload for POST requests
+        """
+        if method not in ("GET", "POST"):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        self.stats["requests"] += 1
+        idempotent = method == "GET"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt >= self.max_retries
+            try:
+                response = await self.client().request(method, url, json=data if method == "POST" else None)
+            except httpx.TransportError as e:
+                if last_attempt or not (idempotent or isinstance(e, SAFE_POST_ERRORS)):
+                    self.stats["failures"] += 1
+                    logger.error(f"Request failed after {attempt + 1} attempts: {e!r}")
+                    return None
+                delay = _backoff(attempt)
+                logger.warning(f"WhatsApp API transport error ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if response.is_success:
+                    return response.json()
+
+                if response.status_code == 429:
+                    self.stats["throttled"] += 1
+                retryable = RETRY_STATUSES if idempotent else SAFE_POST_STATUSES
+                if response.status_code not in retryable or last_attempt:
+                    self.stats["failures"] += 1
+                    if response.status_code == 429:
+                        logger.error(f"Rate limit exceeded: {response.text}")
+                    else:
+                        logger.error(f"HTTP error {response.status_code}: {response.text}")
+                    return None
+
+                retry_after = _retry_after(response)
+                delay = min(MAX_RETRY_DELAY, retry_after if retry_after is not None else _backoff(attempt))
+                logger.warning(f"WhatsApp API returned {response.status_code}, retrying in {delay:.1f}s")
+
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+        return None
@@ -0,0 +1,194 @@
+"""
+Bounded in-process cache for the pizzeria chatbot.
+LRU eviction by entry count and estimated size, sliding TTL expiry and a
+background sweeper thread, with hit/miss/eviction counters. Also a
+request-scoped cache for values fetched while handling a single message.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache with TTL.
+
+    Entries expire `ttl_seconds` after their last access. When either
+    `max_entries` or `max_bytes` (as measured by `sizeof`) is exceeded, the
+    least recently used entries are evicted. Expired entries are dropped when
+    read and by a daemon sweeper that starts with the first insert, so memory
+    stays bounded even for keys that are never read again.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 1800, sweep_interval: float = 60,
+                 sizeof: Callable[[Any], int] = lambda value: 0, name: str = "cache"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.sizeof = sizeof
+        self.name = name
+        # key -> (value, size, expires_at), least recently used first
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ------------------------------------------------------------------ #
+    # Mapping API
+    # ------------------------------------------------------------------ #
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data[key] = (value, size, now + self.ttl_seconds)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Read a live entry without touching the LRU order, the TTL or the counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                return default
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+        self._ensure_sweeper()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable) -> Optional[Tuple[Any, int, float]]:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    # ------------------------------------------------------------------ #
+    # Expiry
+    # ------------------------------------------------------------------ #
+
+    def sweep(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, _, expires_at) in self._data.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        if expired:
+            logger.info(f"{self.name}: swept {len(expired)} expired entries")
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name=f"{self.name}-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"{self.name}: sweeper error: {e}")
+
+    def stop(self):
+        """Stop the background sweeper."""
+        self._stop.set()
+
+    # ------------------------------------------------------------------ #
+    # Metrics
+    # ------------------------------------------------------------------ #
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# ---------------------------------------------------------------------- #
+# Request-scoped cache
+# ---------------------------------------------------------------------- #
+
+_request_cache: ContextVar[Optional[Dict[Hashable, Any]]] = ContextVar("request_cache", default=None)
+
+
+def begin_request_cache() -> Dict[Hashable, Any]:
+    """
+    Start a fresh cache for the request handled by the current task.
+
+    Tasks spawned afterwards (e.g. the graph nodes) see the same dict, so a
+    row fetched while loading the state is reused instead of queried again.
+    Other tasks, and so other users' requests, never see it.
+    """
+    cache: Dict[Hashable, Any] = {}
+    _request_cache.set(cache)
+    return cache
+
+
+def request_cache() -> Dict[Hashable, Any]:
+    """The current request's cache; outside a request, an empty throwaway dict."""
+    cache = _request_cache.get()
+    return cache if cache is not None else {}
@@ -0,0 +1,339 @@
+"""
+Storage backends for the LangGraph checkpointer.
+A local SQLite (WAL) store for single-node deployments and a Supabase store
+for deployments where several bot processes share the same conversations.
+"""
+
+import base64
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (serde type, serialized bytes) as produced by serde.dumps_typed
+TypedBlob = Tuple[str, bytes]
+# (task_id, idx, channel, value, task_path)
+WriteRow = Tuple[str, int, str, TypedBlob, str]
+
+
+@dataclass
+class CheckpointRecord:
+    """A stored checkpoint, already serialized by the saver."""
+    thread_id: str
+    checkpoint_ns: str
+    checkpoint_id: str
+    parent_checkpoint_id: Optional[str]
+    checkpoint: TypedBlob
+    metadata: TypedBlob
+
+
+class CheckpointBackend(ABC):
+    """Persistence interface used by Checkpointer. Implementations are synchronous."""
+
+    @abstractmethod
+    def get(self, thread_id: str, checkpoint_ns: str = "",
+            checkpoint_id: Optional[str] = None) -> Optional[CheckpointRecord]:
+        """A specific checkpoint, or the latest one of the thread when no id is given."""
+
+    @abstractmethod
+    def list(self, thread_id: Optional[str] = None, checkpoint_ns: Optional[str] = None,
+             before_id: Optional[str] = None, limit: Optional[int] = None) -> List[CheckpointRecord]:
+        """Checkpoints newest first."""
+
+    @abstractmethod
+    def put(self, record: CheckpointRecord, keep_last: int = 0):
+        """Store a checkpoint, keeping only the `keep_last` newest of its thread (0 keeps all)."""
+
+    @abstractmethod
+    def put_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, writes: Iterable[WriteRow]):
+        """Store pending writes of a checkpoint (existing regular (task_id, idx) pairs are kept)."""
+
+    @abstractmethod
+    def get_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[WriteRow]:
+        """Pending writes of a checkpoint ordered by task and index."""
+
+    @abstractmethod
+    def delete_thread(self, thread_id: str):
+        """Remove every checkpoint and write of a thread."""
+
+
+class SQLiteCheckpointBackend(CheckpointBackend):
+    """
+    Local SQLite store in WAL mode.
+
+    WAL lets readers proceed while a turn is being written, and with
+    synchronous=NORMAL a commit is a sequential append to the WAL file, so a
+    checkpoint read or write costs well under a millisecond.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB,
+                    metadata_type TEXT,
+                    metadata BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS checkpoint_writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+            """)
+
+    @staticmethod
+    def _record(row) -> CheckpointRecord:
+        return CheckpointRecord(
+            thread_id=row[0], checkpoint_ns=row[1], checkpoint_id=row[2], parent_checkpoint_id=row[3],
+            checkpoint=(row[4], row[5]), metadata=(row[6], row[7]),
+        )
+
+    _COLUMNS = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+    def get(self, thread_id, checkpoint_ns="", checkpoint_id=None):
+        query = f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: list = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return self._record(row) if row else None
+
+    def list(self, thread_id=None, checkpoint_ns=None, before_id=None, limit=None):
+        query = f"SELECT {self._COLUMNS} FROM checkpoints WHERE 1 = 1"
+        params: list = []
+        if thread_id is not None:
+            query += " AND thread_id = ?"
+            params.append(thread_id)
+        if checkpoint_ns is not None:
+            query += " AND checkpoint_ns = ?"
+            params.append(checkpoint_ns)
+        if before_id is not None:
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._record(row) for row in rows]
+
+    def put(self, record, keep_last=0):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO checkpoints ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record.thread_id, record.checkpoint_ns, record.checkpoint_id, record.parent_checkpoint_id,
+                     record.checkpoint[0], record.checkpoint[1], record.metadata[0], record.metadata[1]),
+                )
+                if keep_last:
+                    stale = self._conn.execute(
+                        "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                        "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                        (record.thread_id, record.checkpoint_ns, keep_last),
+                    ).fetchall()
+                    for (checkpoint_id,) in stale:
+                        params = (record.thread_id, record.checkpoint_ns, checkpoint_id)
+                        self._conn.execute(
+                            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+                        self._conn.execute(
+                            "DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def put_writes(self, thread_id, checkpoint_ns, checkpoint_id, writes):
+        rows = [(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value[0], value[1], task_path)
+                for task_id, idx, channel, value, task_path in writes]
+        columns = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)"
+        with self._lock:
+            # Regular writes are immutable once stored; special writes (negative idx) are replaced
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO checkpoint_writes {columns} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] >= 0])
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO checkpoint_writes {columns} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] < 0])
+
+    def get_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, idx, channel, type, value, task_path FROM checkpoint_writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+        return [(task_id, idx, channel, (type_, value), task_path)
+                for task_id, idx, channel, type_, value, task_path in rows]
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ?", (thread_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SupabaseCheckpointBackend(CheckpointBackend):
+    """
+    Remote store on Supabase, for several bot processes sharing conversations.
+
+    Expected tables (binary values are stored base64-encoded):
+
+        create table chat_checkpoints (
+            thread_id text not null,
+            checkpoint_ns text not null default '',
+            checkpoint_id text not null,
+            parent_checkpoint_id text,
+            type text,
+            checkpoint text,
+            metadata_type text,
+            metadata text,
+            primary key (thread_id, checkpoint_ns, checkpoint_id)
+        );
+        create table chat_checkpoint_writes (
+            thread_id text not null,
+            checkpoint_ns text not null default '',
+            checkpoint_id text not null,
+            task_id text not null,
+            idx integer not null,
+            channel text not null,
+            type text,
+            value text,
+            task_path text not null default '',
+            primary key (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+        );
+    """
+
+    table = "chat_checkpoints"
+    writes_table = "chat_checkpoint_writes"
+
+    def __init__(self, db=None):
+        if db is None:
+            from src.services.database import database as db
+        self.db = db
+
+    @staticmethod
+    def _encode(value: bytes) -> Optional[str]:
+        return base64.b64encode(value).decode("ascii") if value is not None else None
+
+    @staticmethod
+    def _decode(value: Optional[str]) -> bytes:
+        return base64.b64decode(value) if value else b""
+
+    def _record(self, row) -> CheckpointRecord:
+        return CheckpointRecord(
+            thread_id=row["thread_id"], checkpoint_ns=row["checkpoint_ns"], checkpoint_id=row["checkpoint_id"],
+            parent_checkpoint_id=row.get("parent_checkpoint_id"),
+            checkpoint=(row["type"], self._decode(row["checkpoint"])),
+            metadata=(row["metadata_type"], self._decode(row["metadata"])),
+        )
+
+    def get(self, thread_id, checkpoint_ns="", checkpoint_id=None):
+        def build(c):
+            query = c.table(self.table).select("*").eq("thread_id", thread_id).eq("checkpoint_ns", checkpoint_ns)
+            if checkpoint_id:
+                query = query.eq("checkpoint_id", checkpoint_id)
+            return query.order("checkpoint_id", desc=True).limit(1)
+        result = self.db.execute_sync(build, op="checkpoints.get")
+        return self._record(result.data[0]) if result.data else None
+
+    def list(self, thread_id=None, checkpoint_ns=None, before_id=None, limit=None):
+        def build(c):
+            query = c.table(self.table).select("*")
+            if thread_id is not None:
+                query = query.eq("thread_id", thread_id)
+            if checkpoint_ns is not None:
+                query = query.eq("checkpoint_ns", checkpoint_ns)
+            if before_id is not None:
+                query = query.lt("checkpoint_id", before_id)
+            query = query.order("checkpoint_id", desc=True)
+            return query.limit(limit) if limit else query
+        result = self.db.execute_sync(build, op="checkpoints.list")
+        return [self._record(row) for row in result.data or []]
+
+    def put(self, record, keep_last=0):
+        row = {
+            "thread_id": record.thread_id, "checkpoint_ns": record.checkpoint_ns,
+            "checkpoint_id": record.checkpoint_id, "parent_checkpoint_id": record.parent_checkpoint_id,
+            "type": record.checkpoint[0], "checkpoint": self._encode(record.checkpoint[1]),
+            "metadata_type": record.metadata[0], "metadata": self._encode(record.metadata[1]),
+        }
+        self.db.execute_sync(
+            lambda c: c.table(self.table).upsert(row, on_conflict="thread_id,checkpoint_ns,checkpoint_id"),
+            op="checkpoints.put")
+        if keep_last:
+            stale = self.list(record.thread_id, record.checkpoint_ns)[keep_last:]
+            if stale:
+                ids = [r.checkpoint_id for r in stale]
+                for table in (self.table, self.writes_table):
+                    self.db.execute_sync(
+                        lambda c, table=table: c.table(table).delete().eq("thread_id", record.thread_id)
+                        .eq("checkpoint_ns", record.checkpoint_ns).in_("checkpoint_id", ids),
+                        op="checkpoints.prune")
+
+    def put_writes(self, thread_id, checkpoint_ns, checkpoint_id, writes):
+        rows = [{
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            "task_id": task_id, "idx": idx, "channel": channel,
+            "type": value[0], "value": self._encode(value[1]), "task_path": task_path,
+        } for task_id, idx, channel, value, task_path in writes]
+        if rows:
+            self.db.execute_sync(
+                lambda c: c.table(self.writes_table).upsert(
+                    rows, on_conflict="thread_id,checkpoint_ns,checkpoint_id,task_id,idx", ignore_duplicates=True),
+                op="checkpoints.put_writes")
+
+    def get_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        result = self.db.execute_sync(
+            lambda c: c.table(self.writes_table).select("*").eq("thread_id", thread_id)
+            .eq("checkpoint_ns", checkpoint_ns).eq("checkpoint_id", checkpoint_id).order("task_id").order("idx"),
+            op="checkpoints.get_writes")
+        return [(row["task_id"], row["idx"], row["channel"], (row["type"], self._decode(row["value"])),
+                 row.get("task_path") or "") for row in result.data or []]
+
+    def delete_thread(self, thread_id):
+        for table in (self.table, self.writes_table):
+            self.db.execute_sync(
+                lambda c, table=table: c.table(table).delete().eq("thread_id", thread_id),
+                op="checkpoints.delete_thread")
+
+
+def create_backend(kind: str, path: str) -> CheckpointBackend:
+    """Backend selected by the CHECKPOINT_BACKEND setting ("sqlite" or "supabase")."""
+    if kind == "supabase":
+        return SupabaseCheckpointBackend()
+    if kind != "sqlite":
+        logger.warning(f"Unknown checkpoint backend {kind!r}, using sqlite")
+    return SQLiteCheckpointBackend(path)
@@ -1,254 +1,383 @@
 """
- Checkpointer for LangGraph using the hybrid memory approach.
-Much more efficient than the original checkpointer.
+Persistent checkpointer for LangGraph and the chat state manager.
+Checkpoints live in a local SQLite (WAL) store by default, so resuming a
+conversation costs one local read instead of several Supabase round-trips.
 """
 
+import asyncio
 import logging
-from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+from typing import (Any, AsyncIterator, Awaitable, Dict, Iterator, List,
+                    Optional, Sequence, Tuple)
 
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.base import (BaseCheckpointSaver, Checkpoint,
-                                       CheckpointMetadata)
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver,
+                                       ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple,
+                                       empty_checkpoint, get_checkpoint_id,
+                                       get_checkpoint_metadata)
 
-from .memory import ConversationContext, memory
+from config.settings import (CHECKPOINT_BACKEND, CHECKPOINT_COMPACT_EVERY,
+                             CHECKPOINT_DB_PATH, CHECKPOINT_KEEP_LAST,
+                             CHECKPOINT_MESSAGE_WINDOW)
+
+from ..services.database import customers, orders
+from .cache import begin_request_cache, request_cache
+from .checkpoint_backends import (CheckpointBackend, CheckpointRecord,
+                                  create_backend)
+from .memory import memory
 from .state import ChatState
 
 logger = logging.getLogger(__name__)
 
+# Result of a hydration query that failed (as opposed to one that found nothing)
+_UNAVAILABLE = object()
+
 
 class Checkpointer(BaseCheckpointSaver):
     """
-    Optimized checkpointer using MemoryManager.
-    
-    This checkpointer is much more efficient than the original because:
-    1. Only stores essential conversation data
-    2. Uses intelligent sliding window for messages
-    3. Has built-in caching for active conversations
-    4. Auto-cleanup of old conversations
+    LangGraph checkpoint saver on top of a pluggable CheckpointBackend.
+
+    Checkpoints are serialized whole with the saver's serde, so a stored
+    checkpoint is a single row and loading it is a single read. Only the
+    `keep_last` newest checkpoints of each thread are kept.
     """
-    
-    def __init__(self):
+
+    def __init__(self, backend: Optional[CheckpointBackend] = None, keep_last: int = CHECKPOINT_KEEP_LAST):
         super().__init__()
-        self.memory_manager = memory
-        logger.info("Checkpointer initialized")
-    
-    def get(self, config: RunnableConfig) -> Optional[Checkpoint]:
-        """
-        Load checkpoint from  memory.
-        """
-        try:
-            thread_id = config.get("configurable", {}).get("thread_id")
-            if not thread_id:
-                logger.warning("No thread_id provided in config")
-                return None
-            
-            # Note: We can't use async here due to LangGraph interface
-            # In practice, we'll handle this in the graph nodes directly
-            logger.info(f"Checkpoint requested for thread_id: {thread_id}")
-            return None  # We'll handle state loading in graph nodes
-            
-        except Exception as e:
-            logger.error(f"Error getting checkpoint: {e}")
+        self.backend = backend if backend is not None else create_backend(CHECKPOINT_BACKEND, CHECKPOINT_DB_PATH)
+        self.keep_last = keep_last
+        logger.info(f"Checkpointer initialized ({type(self.backend).__name__})")
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[RunnableConfig]:
+        if not checkpoint_id:
             return None
-    
-    async def aget(self, config: RunnableConfig) -> Optional[Checkpoint]:
-        """
-        Async version of get checkpoint.
-        """
-        return self.get(config)
-    
-    def get_tuple(self, config: RunnableConfig) -> Optional[Tuple[Checkpoint, CheckpointMetadata]]:
-        """
-        Get checkpoint with metadata.
-        """
-        checkpoint = self.get(config)
-        if checkpoint:
-            thread_id = config.get("configurable", {}).get("thread_id", "unknown")
-            metadata = self._create_metadata(thread_id)
-            return (checkpoint, metadata)
-        return None
-    
-    async def aget_tuple(self, config: RunnableConfig) -> Optional[Tuple[Checkpoint, CheckpointMetadata]]:
-        """
-        Async version of get_tuple.
-        """
-        return self.get_tuple(config)
-    
-    def put(self, config: RunnableConfig, checkpoint: Checkpoint) -> CheckpointMetadata:
-        """
-        Save checkpoint to  memory.
-        """
-        try:
-            thread_id = config.get("configurable", {}).get("thread_id")
-            if not thread_id:
-                logger.warning("No thread_id provided in config")
-                return self._create_metadata(thread_id or "unknown")
-            
-            logger.info(f"Checkpoint saved for thread_id: {thread_id}")
-            
-            # We'll handle the actual saving in the graph nodes
-            # This is just for LangGraph compliance
-            return self._create_metadata(thread_id)
-            
-        except Exception as e:
-            logger.error(f"Error saving checkpoint: {e}")
-            return self._create_metadata(thread_id or "unknown")
-    
-    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint) -> CheckpointMetadata:
-        """
-        Async version of put checkpoint.
-        """
-        return self.put(config, checkpoint)
-    
-    def list(self, config: RunnableConfig, **kwargs) -> Iterator[CheckpointMetadata]:
-        """
-        List checkpoints (for LangGraph compatibility).
-        """
-        thread_id = config.get("configurable", {}).get("thread_id")
-        if thread_id:
-            yield self._create_metadata(thread_id)
-    
-    def _create_metadata(self, thread_id: str) -> CheckpointMetadata:
-        """Create checkpoint metadata."""
-        return CheckpointMetadata(
-            source_id=thread_id,
-            source_type="user"
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint_id}}
+
+    def _to_tuple(self, record: CheckpointRecord) -> CheckpointTuple:
+        writes = self.backend.get_writes(record.thread_id, record.checkpoint_ns, record.checkpoint_id)
+        return CheckpointTuple(
+            config=self._config(record.thread_id, record.checkpoint_ns, record.checkpoint_id),
+            checkpoint=self.serde.loads_typed(record.checkpoint),
+            metadata=self.serde.loads_typed(record.metadata),
+            parent_config=self._config(record.thread_id, record.checkpoint_ns, record.parent_checkpoint_id),
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value))
+                            for task_id, _, channel, value, _ in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Checkpoint given by config["configurable"]["checkpoint_id"], or the latest of the thread."""
+        configurable = config["configurable"]
+        record = self.backend.get(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                                  get_checkpoint_id(config))
+        return self._to_tuple(record) if record else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Checkpoints newest first, optionally filtered by metadata values."""
+        configurable = (config or {}).get("configurable", {})
+        records = self.backend.list(
+            thread_id=configurable.get("thread_id"),
+            checkpoint_ns=configurable.get("checkpoint_ns"),
+            before_id=get_checkpoint_id(before) if before else None,
+            limit=None if filter else limit,
+        )
+        returned = 0
+        for record in records:
+            checkpoint_tuple = self._to_tuple(record)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit is not None and returned >= limit:
+                break
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """Store a checkpoint and return the config pointing at it."""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        self.backend.put(CheckpointRecord(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=configurable.get("checkpoint_id"),
+            checkpoint=self.serde.dumps_typed(checkpoint),
+            metadata=self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+        ), keep_last=self.keep_last)
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """Store the intermediate writes of a task."""
+        configurable = config["configurable"]
+        self.backend.put_writes(
+            configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"],
+            [(task_id, WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value), task_path)
+             for idx, (channel, value) in enumerate(writes)],
         )
 
+    def delete_thread(self, thread_id: str) -> None:
+        self.backend.delete_thread(thread_id)
+
+    # Async variants: backends are synchronous, run them off the event loop
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+# Channels of the compact per-thread snapshot
+SNAPSHOT_CHANNELS = ("messages", "customer", "active_order", "order_steps")
+
 
 class ChatStateManager:
     """
-    Manager for ChatState that integrates with MemoryManager.
-    This handles the conversion between LangGraph state and our  memory.
+    Loads and saves the per-user ChatState.
+
+    The state of a thread is a compact snapshot (order_steps, active_order,
+    customer and a short message window) followed by an append-only log of
+    per-turn deltas, stored as the snapshot's pending writes: appended
+    messages, changed order_steps keys and replaced customer/active_order.
+    After `compact_every` deltas the log is folded into a new snapshot, so
+    each turn writes only what changed.
+
+    The next turn resumes from one local read. The active order is always
+    re-read from Supabase alongside it, since the order tools write
+    pedidos_activos directly; the rest of Supabase is only queried when
+    the thread has no checkpoint yet.
     """
-    
-    def __init__(self):
+
+    def __init__(self, saver: Optional[Checkpointer] = None, message_window: int = CHECKPOINT_MESSAGE_WINDOW,
+                 compact_every: int = CHECKPOINT_COMPACT_EVERY):
         self.memory_manager = memory
-    
-    async def load_state_for_user(self, cliente_id: str, new_message: str) -> ChatState:
+        self.saver = saver if saver is not None else checkpointer
+        self.message_window = message_window
+        self.compact_every = compact_every
+
+    @staticmethod
+    def _thread_config(cliente_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": cliente_id, "checkpoint_ns": ""}}
+
+    async def _read_checkpoint(self, cliente_id: str):
+        try:
+            return await self.saver.aget_tuple(self._thread_config(cliente_id))
+        except Exception as e:
+            logger.error(f"Error reading checkpoint for {cliente_id}: {e}")
+            return None
+
+    async def load_state_for_user(self, cliente_id: str, new_message: BaseMessage) -> ChatState:
+        """
+        Load complete chat state for a user, from the local checkpoint when available.
+        Starts the request-scoped cache for the turn.
+        """
+        begin_request_cache()
+        active_order_task = asyncio.ensure_future(
+            self._fetch("active order", orders.get_active(cliente_id), default=_UNAVAILABLE))
+        checkpoint_tuple = await self._read_checkpoint(cliente_id)
+
+        if checkpoint_tuple:
+            active_order = await active_order_task
+            values, _ = self._fold(checkpoint_tuple)
+            logger.info(f"Resumed {cliente_id} from checkpoint {checkpoint_tuple.config['configurable']['checkpoint_id']}")
+            return self._build_state(
+                cliente_id,
+                messages=list(values.get("messages", [])),
+                customer=values.get("customer"),
+                # The checkpointed order is only a fallback when Supabase is unreachable
+                active_order=values.get("active_order") if active_order is _UNAVAILABLE else active_order,
+                order_steps=values.get("order_steps"),
+                new_message=new_message,
+            )
+        return await self._load_remote_state(cliente_id, new_message, active_order_task)
+
+    async def _load_remote_state(self, cliente_id: str, new_message: BaseMessage,
+                                 active_order_query: Optional[Awaitable] = None) -> ChatState:
         """
-        Load complete chat state for a user including memory.
+        Hydrate the state from Supabase (first turn of a thread or checkpoint unavailable).
+        `active_order_query` is the active-order lookup already started by load_state_for_user.
         """
+        if active_order_query is None:
+            active_order_query = self._fetch("active order", orders.get_active(cliente_id), default=_UNAVAILABLE)
         try:
-            # Get conversation context from  memory
-            context = await self.memory_manager.get_conversation(cliente_id)
-            
-            # Get customer data from database
-            try:
-                from ..services.tools import get_client_by_id
-                customer = get_client_by_id.invoke({"cliente_id": cliente_id})
-            except (ImportError, Exception) as e:
-                print(f"Warning: Could not get customer data: {e}")
-                customer = None
-            
-            # Get active order if exists
-            try:
-                from ..services.tools import get_order_by_id
-                active_order = get_order_by_id.invoke({"cliente_id": cliente_id})
-            except (ImportError, Exception) as e:
-                print(f"Warning: Could not get active order: {e}")
+            # Conversation, customer and active order are independent: fetch them concurrently
+            context, customer, active_order = await asyncio.gather(
+                self.memory_manager.get_conversation(cliente_id),
+                self._fetch("customer", customers.get(cliente_id)),
+                active_order_query,
+            )
+            if active_order is _UNAVAILABLE:
                 active_order = None
-            
-            # Build the ChatState
-            from langchain_core.messages import HumanMessage
-
-            from .state import ChatState
-
-            # Get conversation history as LangChain messages
-            historical_messages = context.get_messages_for_llm()
-            
-            # Determine current step and flags
-            needs_customer_info = not customer or not customer.get("last_name")
-            ready_to_order = bool(customer and customer.get("last_name"))
-            
-            # Determine current step based on context
-            current_step = self._determine_current_step(context, new_message.content, needs_customer_info)
-            
-            state = ChatState(
-                cliente_id=cliente_id,
-                messages=historical_messages,
+            if customer:
+                # Reused by detect_user_intent_step instead of querying clientes again
+                request_cache()[("customer", cliente_id)] = customer
+
+            return self._build_state(
+                cliente_id,
+                messages=context.get_messages_for_llm(),
                 customer=customer,
-                current_step=current_step,
                 active_order=active_order,
-                needs_customer_info=needs_customer_info,
-                ready_to_order=ready_to_order
+                order_steps=None,
+                new_message=new_message,
             )
-            
-            logger.info(f"Loaded state for {cliente_id}: {len(historical_messages)} messages, step: {current_step}")
-            return state
-            
+
         except Exception as e:
             logger.error(f"Error loading state for {cliente_id}: {e}")
             # Return minimal state on error
-            from langchain_core.messages import HumanMessage
-
-            from .state import ChatState
-            
             return ChatState(
                 cliente_id=cliente_id,
-                #messages=[HumanMessage(content=new_message)],
                 customer={},
                 current_step="greeting",
                 active_order={},
                 needs_customer_info=True,
                 ready_to_order=False
             )
-    
-    async def save_state_for_user(self, state: ChatState, ai_response):
+
+    @staticmethod
+    async def _fetch(what: str, query, default=None):
+        """Await a hydration query; a failed lookup only leaves that part empty (`default`)."""
+        try:
+            return await query
+        except Exception as e:
+            print(f"Warning: Could not get {what}: {e}")
+            return default
+
+    def _build_state(self, cliente_id: str, messages: List[BaseMessage], customer: Optional[Dict[str, Any]],
+                     active_order: Optional[Dict[str, Any]], order_steps: Optional[Dict[str, int]],
+                     new_message: BaseMessage) -> ChatState:
+        # Determine current step and flags
+        needs_customer_info = not customer or not customer.get("last_name")
+        ready_to_order = bool(customer and customer.get("last_name"))
+        recent_contents = [message.content for message in messages[-3:]]
+        current_step = self._determine_current_step(recent_contents, new_message.content, needs_customer_info)
+
+        state = ChatState(
+            cliente_id=cliente_id,
+            messages=messages,
+            customer=customer,
+            current_step=current_step,
+            active_order=active_order,
+            needs_customer_info=needs_customer_info,
+            ready_to_order=ready_to_order
+        )
+        if order_steps:
+            state["order_steps"] = order_steps
+
+        logger.info(f"Loaded state for {cliente_id}: {len(messages)} messages, step: {current_step}")
+        return state
+
+    def _conversation(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """User/assistant exchanges only; tool calls and tool results are not resumed."""
+        return [message for message in messages
+                if isinstance(message, HumanMessage)
+                or (isinstance(message, AIMessage) and message.content and not message.tool_calls)]
+
+    def _window(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        return messages[-self.message_window:] if self.message_window else messages
+
+    def _fold(self, checkpoint_tuple: CheckpointTuple) -> Tuple[Dict[str, Any], int]:
+        """Snapshot values with the delta log applied, and the number of deltas applied."""
+        values = dict(checkpoint_tuple.checkpoint["channel_values"])
+        values["messages"] = list(values.get("messages") or [])
+        deltas = set()
+        for task_id, channel, value in checkpoint_tuple.pending_writes or []:
+            deltas.add(task_id)
+            if channel == "messages":
+                values["messages"] = self._window(values["messages"] + list(value))
+            elif channel == "order_steps":
+                values["order_steps"] = {**(values.get("order_steps") or {}), **value}
+            else:
+                values[channel] = value
+        return values, len(deltas)
+
+    def _delta(self, previous: Dict[str, Any], state: Dict[str, Any]) -> Optional[List[Tuple[str, Any]]]:
+        """Writes turning `previous` into `state`, or None when only a full snapshot can express it."""
+        conversation = self._conversation(state.get("messages", []))
+        known = previous["messages"]
+        # Appended messages are detected by position: the turn started from the folded window
+        if [(m.type, m.content) for m in conversation[:len(known)]] != [(m.type, m.content) for m in known]:
+            return None
+
+        writes: List[Tuple[str, Any]] = []
+        if appended := conversation[len(known):]:
+            writes.append(("messages", appended))
+        old_steps = previous.get("order_steps") or {}
+        new_steps = state.get("order_steps") or {}
+        if any(key not in new_steps for key in old_steps):
+            return None
+        if changed_steps := {key: value for key, value in new_steps.items() if old_steps.get(key) != value}:
+            writes.append(("order_steps", changed_steps))
+        for channel in ("customer", "active_order"):
+            if state.get(channel) != previous.get(channel):
+                writes.append((channel, state.get(channel)))
+        return writes
+
+    async def save_state_for_user(self, state: Dict[str, Any]) -> Optional[RunnableConfig]:
         """
-        Save chat state to  memory.
+        Append the turn's delta to the thread's log, or compact into a new snapshot.
         """
+        cliente_id = state.get("cliente_id")
         try:
-            cliente_id = state["cliente_id"]
-            
-            # Save the AI response to conversation memory
-            from langchain_core.messages import AIMessage
-            ai_message = AIMessage(content=ai_response)
-            
-            # Add both human message and AI response
-            if state["messages"]:
-                # Add the human message (last one in state)
-                human_message = state["messages"][-1]
-                await self.memory_manager.add_message(cliente_id, human_message)
-            
-            # Add the AI response
-            await self.memory_manager.add_message(cliente_id, ai_message)
-            
-            # Update customer context if we have relevant info
-            if state.get("customer") and state["customer"].get("first_name"):
-                await self.memory_manager.update_customer_context(
-                    cliente_id, 
-                    "customer_name", 
-                    f"{state['customer'].get('first_name', '')} {state['customer'].get('last_name', '')}"
-                )
-            
-            # Update order context if we have an active order
-            if state.get("active_order") and state["active_order"]:
-                await self.memory_manager.update_customer_context(
-                    cliente_id,
-                    "current_order",
-                    state["active_order"]
-                )
-            
-            logger.info(f"Saved state for {cliente_id}")
-            
+            config = self._thread_config(cliente_id)
+            previous = await self.saver.aget_tuple(config)
+            if previous:
+                config = previous.config
+                values, deltas = self._fold(previous)
+                writes = self._delta(values, state) if deltas < self.compact_every else None
+                if writes is not None:
+                    if writes:
+                        # Zero-padded so the log replays in order
+                        await self.saver.aput_writes(config, writes, f"delta-{deltas + 1:08d}")
+                        logger.info(f"Appended delta {deltas + 1} for {cliente_id}: {[c for c, _ in writes]}")
+                    return config
+
+            checkpoint = empty_checkpoint()
+            checkpoint["channel_values"] = {
+                "cliente_id": cliente_id,
+                "messages": self._window(self._conversation(state.get("messages", []))),
+                **{channel: state.get(channel) for channel in SNAPSHOT_CHANNELS if channel != "messages"},
+            }
+            step = previous.metadata.get("step", -1) + 1 if previous else 0
+            saved = await self.saver.aput(config, checkpoint, {"source": "update", "step": step, "parents": {}}, {})
+            logger.info(f"Saved snapshot checkpoint for {cliente_id}")
+            return saved
+
         except Exception as e:
             logger.error(f"Error saving state for {cliente_id}: {e}")
-    
-    def _determine_current_step(self, context: ConversationContext, new_message: str, needs_customer_info: bool) -> str:
+            return None
+
+    def _determine_current_step(self, recent_contents: List[str], new_message: str, needs_customer_info: bool) -> str:
         """
         Determine the current step in the conversation.
         """
         message_lower = new_message.lower()
-        
+
         # Check customer context for clues
         if needs_customer_info:
             return "greeting"
-        
+
         # Check recent conversation for context
-        recent_messages = context.recent_messages[-3:] if context.recent_messages else []
-        recent_content = " ".join([msg.get("content", "") for msg in recent_messages]).lower()
-        
+        recent_content = " ".join(recent_contents).lower()
+
         # Determine step based on message content and recent context
         if any(word in message_lower for word in ["menú", "menu", "pizzas", "precios", "qué tienen"]):
             return "menu"
@@ -264,4 +393,4 @@ class ChatStateManager:
 
 # Global instances
 checkpointer = Checkpointer()
-state_manager = ChatStateManager() 
\ No newline at end of file
+state_manager = ChatStateManager()
@@ -0,0 +1,165 @@
+"""
+Rule-based intent pre-classifier for the pizzeria chatbot.
+Handles high-confidence single-intent messages (greetings, confirmations,
+menu requests, payment methods, button payloads, plain product requests)
+without calling the message-splitting LLM. Anything it is not sure about
+returns None so the workflow falls back to the LLM splitter.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from src.services.product_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Messages are normalized first (lowercase, no accents, no punctuation),
+# so every rule is written against plain ASCII words.
+_RULES = [
+    ("saludo", "saludo_inicial", re.compile(
+        r"^(hola+|holi|hey|buenas|buen dia|buenos dias|buenas tardes|buenas noches)"
+        r"( (hola|que tal|como estas|como esta|buenas))*$")),
+    ("general", "agradecimiento", re.compile(
+        r"^(muchas |mil )?(gracias|grax|muy amable)( (muy amable|por todo|que amable))?$")),
+    ("consulta_menu", "solicita_menu", re.compile(
+        r"^((me )?(puedes |podrias )?(muestrame|mostrar|enviame|enviar|mandame|pasame|regalame|ver|quiero ver) )?"
+        r"(el |la )?(menu|carta)( (por favor|porfa|completo|completa))?$"
+        r"|^(que|cuales) (pizzas|productos|opciones|bebidas|combos) (tienen|hay|manejan|venden)$")),
+    ("finalizacion", "metodo_pago_efectivo", re.compile(
+        r"^((pago|pagare|voy a pagar|seria|en|con) )*(efectivo|cash)$")),
+    ("finalizacion", "metodo_pago_tarjeta", re.compile(
+        r"^((pago|pagare|voy a pagar|seria|en|con) )*(tarjeta|datafono)( (de )?(credito|debito))?$")),
+    ("finalizacion", "metodo_pago_transferencia", re.compile(
+        r"^((pago|pagare|voy a pagar|seria|en|con|por) )*(nequi|daviplata|transferencia)$")),
+]
+
+# A bare "si"/"ok" only confirms the order when the bot just asked for that;
+# after any other question ("¿quieres borde de queso?") the splitter decides
+_CONFIRMATION_RE = re.compile(
+    r"^(si+|sip|ok|okey|okay|dale|listo|confirmo|correcto|de acuerdo|perfecto|esta bien|todo bien)"
+    r"( (si|listo|gracias|confirmo|correcto|perfecto|dale|por favor))*$")
+_ORDER_CONFIRMATION_REQUEST_RE = re.compile(
+    r"resumen de tu pedido|confirmas (tu|el) pedido|confirmamos (tu|el) pedido|confirmar (tu|el) pedido")
+
+# Inline-keyboard callback payloads produced by send_order_summary
+_PAYLOAD_RULES = [
+    ("confirmacion", "confirma_pedido_boton", re.compile(r"^confirm_order_\w+$")),
+    ("modificar_pedido", "cancela_pedido_boton", re.compile(r"^cancel_order_\w+$")),
+]
+
+_PRODUCT_REQUEST_RE = re.compile(
+    r"^((quiero|me das|me da|regalame|dame|seria|para mi|me gustaria) )?"
+    r"((una|un|1|otra|otro) )?((pizza|bebida) )?(de )?(?P<name>[a-z0-9 ]+?)"
+    r"( (?P<size>pequena|personal|mediana|grande|small|medium|large))?( por favor| porfa)?$")
+
+_SIZES = {
+    "pequena": "Small", "personal": "Small", "small": "Small",
+    "mediana": "Medium", "medium": "Medium",
+    "grande": "Large", "large": "Large",
+}
+
+
+class IntentPreClassifier:
+    """
+    Deterministic fast path in front of the message-splitting LLM.
+
+    `classify` returns a divided_message list in the same format the LLM
+    produces, or None when the message needs the LLM. Hit/miss counters are
+    kept so the share of turns that skipped the LLM can be monitored.
+    """
+
+    def __init__(self, catalog=None, product_min_score: float = 0.9):
+        self.catalog = catalog
+        self.product_min_score = product_min_score
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent: Dict[str, int] = {}
+
+    def classify(self, message: str, previous_reply: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        """
+        Classify a message, or return None if the splitter LLM is needed.
+        `previous_reply` is the bot's last message, needed to read bare confirmations.
+        """
+        result = self._classify(message, previous_reply)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            intent = result[0]["intent"]
+            self.hits_by_intent[intent] = self.hits_by_intent.get(intent, 0) + 1
+        return result
+
+    async def aclassify(self, message: str, previous_reply: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        """Like classify, reloading an expired menu catalog in a thread instead of on the event loop."""
+        if self.catalog is not None and self.catalog.expired:
+            try:
+                await asyncio.to_thread(self.catalog.refresh)
+            except Exception as e:
+                logger.warning(f"Intent pre-classifier could not refresh the catalog: {e}")
+                self.misses += 1
+                return None
+        return self.classify(message, previous_reply)
+
+    def _classify(self, message: str, previous_reply: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        raw = (message or "").strip()
+        if not raw or len(raw) > 120:
+            return None
+
+        for intent, action, pattern in _PAYLOAD_RULES:
+            if pattern.match(raw):
+                return [{"intent": intent, "action": action}]
+
+        text = normalize_text(raw)
+        if not text:
+            return None
+
+        for intent, action, pattern in _RULES:
+            if pattern.match(text):
+                return [{"intent": intent, "action": action}]
+
+        if _CONFIRMATION_RE.match(text):
+            if previous_reply and _ORDER_CONFIRMATION_REQUEST_RE.search(normalize_text(previous_reply)):
+                return [{"intent": "confirmacion", "action": "confirma_pedido_general"}]
+            return None
+
+        return self._classify_product_request(text)
+
+    def _classify_product_request(self, text: str) -> Optional[List[Dict[str, str]]]:
+        """'una pepperoni grande' -> seleccion_productos, only for unambiguous catalog names."""
+        if self.catalog is None:
+            return None
+        match = _PRODUCT_REQUEST_RE.match(text)
+        if not match:
+            return None
+
+        name = match.group("name").strip()
+        try:
+            candidates = []
+            for kind in ("pizza", "bebida", "combo"):
+                found = self.catalog.search(kind, name, limit=2, min_score=self.product_min_score)
+                candidates += [(kind, item, score) for item, score in found]
+        except Exception as e:
+            logger.warning(f"Intent pre-classifier could not query the catalog: {e}")
+            return None
+
+        names = {(kind, item.nombre.lower()) for kind, item, _ in candidates}
+        if len(names) != 1:
+            return None
+
+        kind, nombre = names.pop()
+        action = f"solicita_{kind}_{normalize_text(nombre).replace(' ', '_')}"
+        size = match.group("size")
+        if size:
+            action += f"_{_SIZES[size].lower()}"
+        return [{"intent": "seleccion_productos", "action": action}]
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "hits_by_intent": dict(self.hits_by_intent),
+        }
@@ -5,12 +5,17 @@ Implements hybrid approach: key context + recent messages with intelligent clean
 
 import json
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
-from config.settings import supabase
+from config.settings import (MEMORY_CACHE_MAX_BYTES, MEMORY_CACHE_MAX_ENTRIES,
+                             MEMORY_CACHE_SWEEP_SECONDS,
+                             MEMORY_CACHE_TTL_SECONDS)
+from src.core.cache import LRUTTLCache
+from src.services.database import conversations, database
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +76,10 @@ class ConversationContext:
             "created_at": self.created_at.isoformat()
         }
     
+    def estimated_size(self) -> int:
+        """Approximate memory footprint in bytes (serialized size)."""
+        return len(json.dumps(self.to_dict(), default=str).encode("utf-8"))
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ConversationContext':
         """Deserialize context from storage."""
@@ -87,6 +96,59 @@ class ConversationContext:
         return context
 
 
+class ConversationTurn:
+    """
+    Unit of work over one conversation turn.
+
+    Mutations are staged here and applied to the ConversationContext only when
+    the turn completes, so a turn costs a single upsert no matter how many
+    messages or context keys it touches (and nothing is written if it fails).
+    """
+    
+    def __init__(self, context: ConversationContext, max_message_length: int):
+        self.context = context
+        self.max_message_length = max_message_length
+        self._messages: List[BaseMessage] = []
+        self._context_updates: List[Tuple[str, Any]] = []
+    
+    @property
+    def thread_id(self) -> str:
+        return self.context.thread_id
+    
+    @property
+    def recent_messages(self) -> List[Dict[str, Any]]:
+        """Messages already stored for the conversation (staged ones not included)."""
+        return self.context.recent_messages
+    
+    @property
+    def has_changes(self) -> bool:
+        return bool(self._messages or self._context_updates)
+    
+    def add_message(self, message: BaseMessage):
+        self._messages.append(_truncate_message(message, self.max_message_length, self.thread_id))
+    
+    def update_customer_context(self, key: str, value: Any):
+        self._context_updates.append((key, value))
+    
+    def apply(self):
+        """Apply the staged mutations to the conversation context."""
+        for message in self._messages:
+            self.context.add_message(message)
+        for key, value in self._context_updates:
+            self.context.update_customer_context(key, value)
+        self._messages.clear()
+        self._context_updates.clear()
+
+
+def _truncate_message(message: BaseMessage, max_length: int, thread_id: str) -> BaseMessage:
+    """Truncate very long messages to save space."""
+    if len(message.content) > max_length:
+        original_length = len(message.content)
+        message.content = message.content[:max_length] + "... [truncated]"
+        logger.info(f"Truncated long message for {thread_id}: {original_length} -> {len(message.content)}")
+    return message
+
+
 class MemoryManager:
     """
     Intelligent memory manager for multi-user conversations.
@@ -98,33 +160,34 @@ class MemoryManager:
         self.ttl_days = 7  # Auto-cleanup after 7 days of inactivity
         self.max_message_length = 1000  # Truncate very long messages
         
-        # In-memory cache for active conversations (optional optimization)
-        self._cache: Dict[str, ConversationContext] = {}
-        self._cache_ttl = timedelta(minutes=30)
+        # In-memory cache for active conversations, bounded in entries and bytes
+        self._cache = LRUTTLCache(
+            max_entries=MEMORY_CACHE_MAX_ENTRIES,
+            max_bytes=MEMORY_CACHE_MAX_BYTES,
+            ttl_seconds=MEMORY_CACHE_TTL_SECONDS,
+            sweep_interval=MEMORY_CACHE_SWEEP_SECONDS,
+            sizeof=lambda context: context.estimated_size(),
+            name="conversation-cache",
+        )
     
     async def get_conversation(self, thread_id: str) -> ConversationContext:
         """
         Get conversation context. Creates new if doesn't exist.
         """
         try:
-            # Check cache first
-            if thread_id in self._cache:
-                cached_context = self._cache[thread_id]
-                # Check if cache is still valid
-                if datetime.now(timezone.utc) - cached_context.last_activity < self._cache_ttl:
-                    logger.info(f"Retrieved conversation from cache: {thread_id}")
-                    return cached_context
-                else:
-                    # Cache expired
-                    del self._cache[thread_id]
+            # Check cache first (expired entries count as misses)
+            cached_context = self._cache.get(thread_id)
+            if cached_context is not None:
+                logger.info(f"Retrieved conversation from cache: {thread_id}")
+                return cached_context
             
             # Load from database
-            result = supabase.table(self.table_name).select("*").eq("thread_id", thread_id).limit(1).execute()
+            row = await conversations.get(thread_id)
             
-            if result.data:
+            if row:
                 # Found existing conversation
-                context = ConversationContext.from_dict(result.data[0])
-                self._cache[thread_id] = context
+                context = ConversationContext.from_dict(row)
+                self._cache.put(thread_id, context)
                 logger.info(f"Loaded conversation from DB: {thread_id}, {len(context.recent_messages)} messages")
                 return context
             else:
@@ -144,18 +207,15 @@ class MemoryManager:
         """
         try:
             # Update cache
-            self._cache[context.thread_id] = context
+            self._cache.put(context.thread_id, context)
             
             # Prepare data for storage
             data = context.to_dict()
             
             # Upsert to database
-            result = supabase.table(self.table_name).upsert(
-                data, 
-                on_conflict="thread_id"
-            ).execute()
+            saved = await conversations.upsert(data)
             
-            if result.data:
+            if saved:
                 logger.info(f"Saved conversation: {context.thread_id}, {len(context.recent_messages)} messages")
             else:
                 logger.warning(f"Failed to save conversation: {context.thread_id}")
@@ -168,14 +228,7 @@ class MemoryManager:
         Add a message to the conversation and save.
         """
         context = await self.get_conversation(thread_id)
-        
-        # Truncate very long messages to save space
-        if len(message.content) > self.max_message_length:
-            original_content = message.content
-            message.content = message.content[:self.max_message_length] + "... [truncated]"
-            logger.info(f"Truncated long message for {thread_id}: {len(original_content)} -> {len(message.content)}")
-        
-        context.add_message(message)
+        context.add_message(_truncate_message(message, self.max_message_length, thread_id))
         await self.save_conversation(context)
         
         return context
@@ -190,6 +243,25 @@ class MemoryManager:
         
         logger.info(f"Updated customer context for {thread_id}: {key} = {value}")
     
+    @asynccontextmanager
+    async def turn(self, thread_id: str) -> AsyncIterator[ConversationTurn]:
+        """
+        Batch every memory mutation of a conversation turn into one upsert.
+
+        Usage:
+            async with memory.turn(thread_id) as turn:
+                turn.add_message(message)
+                turn.update_customer_context("customer_name", name)
+
+        If the block raises, the staged mutations are discarded.
+        """
+        context = await self.get_conversation(thread_id)
+        turn = ConversationTurn(context, self.max_message_length)
+        yield turn
+        if turn.has_changes:
+            turn.apply()
+            await self.save_conversation(context)
+    
     async def cleanup_old_conversations(self):
         """
         Clean up conversations older than TTL.
@@ -198,13 +270,9 @@ class MemoryManager:
         try:
             cutoff_date = datetime.now(timezone.utc) - timedelta(days=self.ttl_days)
             
-            result = supabase.table(self.table_name).delete().lt(
-                "last_activity", 
-                cutoff_date.isoformat()
-            ).execute()
+            cleaned_count = await conversations.delete_inactive(cutoff_date.isoformat())
             
-            if result.data:
-                cleaned_count = len(result.data)
+            if cleaned_count:
                 logger.info(f"Cleaned up {cleaned_count} old conversations")
                 return cleaned_count
             else:
@@ -222,8 +290,9 @@ class MemoryManager:
     
     async def get_conversation_stats(self, thread_id: str) -> Dict[str, Any]:
         """
-        Get statistics about a conversation.
+        Get statistics about a conversation, plus the conversation cache counters.
         """
+        cache_hit = thread_id in self._cache
         context = await self.get_conversation(thread_id)
         
         return {
@@ -232,7 +301,8 @@ class MemoryManager:
             "customer_context_keys": list(context.customer_context.keys()),
             "last_activity": context.last_activity.isoformat(),
             "created_at": context.created_at.isoformat(),
-            "cache_hit": thread_id in self._cache
+            "cache_hit": cache_hit,
+            "cache": self._cache.stats()
         }
 
     async def clear_user_cache(self, cliente_id: str) -> bool:
@@ -252,27 +322,26 @@ class MemoryManager:
             logger.info(f"🧹 CLEARING ALL CACHE FOR USER: {cliente_id}")
             
             # 1. Clear from conversations table
-            result1 = supabase.table("conversations").delete().eq("thread_id", cliente_id).execute()
-            logger.info(f"   ✅ Conversations cleared: {len(result1.data) if result1.data else 0} records")
+            deleted = await conversations.delete_by("conversations", "thread_id", cliente_id)
+            logger.info(f"   ✅ Conversations cleared: {deleted} records")
             
             # 2. Clear from any other related tables (adjust table names as needed)
             try:
                 # Clear customer data cache if separate table exists
-                result2 = supabase.table("customer_cache").delete().eq("cliente_id", cliente_id).execute()
-                logger.info(f"   ✅ Customer cache cleared: {len(result2.data) if result2.data else 0} records")
+                deleted = await conversations.delete_by("customer_cache", "cliente_id", cliente_id)
+                logger.info(f"   ✅ Customer cache cleared: {deleted} records")
             except Exception as e:
                 logger.info(f"   ℹ️  No customer_cache table or already clean: {e}")
             
             try:
                 # Clear order states cache if separate table exists  
-                result3 = supabase.table("order_steps_cache").delete().eq("cliente_id", cliente_id).execute()
-                logger.info(f"   ✅ Order states cache cleared: {len(result3.data) if result3.data else 0} records")
+                deleted = await conversations.delete_by("order_steps_cache", "cliente_id", cliente_id)
+                logger.info(f"   ✅ Order states cache cleared: {deleted} records")
             except Exception as e:
                 logger.info(f"   ℹ️  No order_steps_cache table or already clean: {e}")
             
             # 3. Clear from memory cache
-            if cliente_id in self._cache:
-                del self._cache[cliente_id]
+            if self._cache.pop(cliente_id) is not None:
                 logger.info(f"   ✅ In-memory cache cleared for user")
             
             logger.info(f"🎉 CACHE COMPLETELY CLEARED for user {cliente_id}")
@@ -295,13 +364,15 @@ class MemoryManager:
             results = {}
             
             # Clear conversations table
-            result1 = supabase.table("conversations").delete().neq("id", "impossible_id").execute()
+            result1 = await database.execute(
+                lambda c: c.table("conversations").delete().neq("id", "impossible_id"), op="memory.clear_all")
             results["conversations"] = len(result1.data) if result1.data else 0
             
             # Clear other cache tables
             for table_name in ["customer_cache", "order_steps_cache"]:
                 try:
-                    result = supabase.table(table_name).delete().neq("id", "impossible_id").execute()
+                    result = await database.execute(
+                        lambda c: c.table(table_name).delete().neq("id", "impossible_id"), op="memory.clear_all")
                     results[table_name] = len(result.data) if result.data else 0
                 except Exception as e:
                     results[table_name] = f"Table not found or error: {e}"
@@ -334,7 +405,8 @@ class MemoryManager:
             }
             
             # Check database
-            result = supabase.table("conversations").select("*").eq("thread_id", cliente_id).execute()
+            result = await database.execute(
+                lambda c: c.table("conversations").select("*").eq("thread_id", cliente_id), op="memory.cache_info")
             if result.data:
                 info["database_records"] = len(result.data)
                 if result.data[0].get("data"):
@@ -348,8 +420,8 @@ class MemoryManager:
                     info["cache_size_estimate"] = f"{size_bytes / 1024:.1f} KB"
             
             # Check memory
-            if cliente_id in self._cache:
-                context = self._cache[cliente_id]
+            context = self._cache.peek(cliente_id)
+            if context is not None:
                 info["memory_message_count"] = len(context.recent_messages)
                 info["memory_last_activity"] = context.last_activity.isoformat()
             
@@ -0,0 +1,147 @@
+"""
+Admission control for workflow runs.
+A global bounded pool of turn slots shared by every bot, with a fair
+round-robin queue across users, queue-depth metrics and load shedding when
+the expected wait would exceed the latency SLO.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+
+from config.settings import (WORKFLOW_MAX_CONCURRENCY, WORKFLOW_MAX_QUEUE,
+                             WORKFLOW_QUEUE_SLO_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_MESSAGE = (
+    "¡Hola! En este momento estamos con alta demanda 🍕 y no podemos atenderte de inmediato. "
+    "Por favor escríbenos de nuevo en unos minutos."
+)
+
+
+class WorkflowOverloaded(Exception):
+    """Raised instead of queueing a turn whose expected wait exceeds the SLO."""
+
+    def __init__(self, estimated_wait: float):
+        super().__init__(f"Estimated wait {estimated_wait:.1f}s exceeds the queue SLO")
+        self.estimated_wait = estimated_wait
+
+
+class TurnScheduler:
+    """
+    At most `max_concurrent` workflow runs at once.
+
+    Turns that cannot start right away wait in per-user queues served
+    round-robin, so a user with several queued turns cannot starve the
+    others. The expected wait of a new turn is the queue length times the
+    moving average turn duration divided by the pool size; when it exceeds
+    `slo_seconds` (or the queue holds `max_queue` turns) the turn is shed
+    with WorkflowOverloaded.
+    """
+
+    def __init__(self, max_concurrent: int = WORKFLOW_MAX_CONCURRENCY, max_queue: int = WORKFLOW_MAX_QUEUE,
+                 slo_seconds: float = WORKFLOW_QUEUE_SLO_SECONDS, initial_turn_seconds: float = 8.0,
+                 alpha: float = 0.2):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.slo_seconds = slo_seconds
+        self.alpha = alpha
+        self.avg_turn_seconds = initial_turn_seconds
+        self.avg_wait_seconds = 0.0
+        self._running = 0
+        self._queued = 0
+        # cliente_id -> waiting futures, in round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.admitted = 0
+        self.shed = 0
+        self.max_queue_depth = 0
+
+    def estimated_wait(self) -> float:
+        """Expected wait of a turn submitted now."""
+        if self._running < self.max_concurrent and not self._queued:
+            return 0.0
+        return (self._queued + 1) * self.avg_turn_seconds / self.max_concurrent
+
+    async def acquire(self, cliente_id: str) -> None:
+        enqueued = time.monotonic()
+        if self._running < self.max_concurrent and not self._queued:
+            self._running += 1
+        else:
+            estimate = self.estimated_wait()
+            if self._queued >= self.max_queue or estimate > self.slo_seconds:
+                self.shed += 1
+                logger.warning(f"Shedding turn of {cliente_id}: {self._queued} queued, ~{estimate:.1f}s wait")
+                raise WorkflowOverloaded(estimate)
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiting.setdefault(cliente_id, deque()).append(future)
+            self._queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before the cancellation
+                    self.release()
+                else:
+                    self._discard(cliente_id, future)
+                raise
+        self.admitted += 1
+        self.avg_wait_seconds += self.alpha * (time.monotonic() - enqueued - self.avg_wait_seconds)
+
+    def _discard(self, cliente_id: str, future: asyncio.Future) -> None:
+        queue = self._waiting.get(cliente_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self._queued -= 1
+            if not queue:
+                del self._waiting[cliente_id]
+
+    def release(self) -> None:
+        """Hand the slot to the next user in round-robin order, or free it."""
+        while self._waiting:
+            cliente_id, queue = next(iter(self._waiting.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._waiting.move_to_end(cliente_id)
+            else:
+                del self._waiting[cliente_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    @asynccontextmanager
+    async def slot(self, cliente_id: str):
+        """Run the block as one admitted turn; raises WorkflowOverloaded when shed."""
+        await self.acquire(cliente_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.avg_turn_seconds += self.alpha * (time.monotonic() - started - self.avg_turn_seconds)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "queued_users": len(self._waiting),
+            "max_concurrent": self.max_concurrent,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_turn_seconds": round(self.avg_turn_seconds, 2),
+            "avg_wait_seconds": round(self.avg_wait_seconds, 2),
+            "estimated_wait_seconds": round(self.estimated_wait(), 2),
+            "slo_seconds": self.slo_seconds,
+        }
+
+
+# Global instance
+workflow_scheduler = TurnScheduler()
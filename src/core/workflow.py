@@ -1,3 +1,4 @@
+import asyncio
 import json
 import re
 from datetime import datetime
@@ -9,18 +10,31 @@ from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 from langgraph.prebuilt import ToolNode
 
-from config.settings import supabase
 from src.core.actions import Actions
+from src.core.cache import request_cache
 from src.core.checkpointer import state_manager
+from src.core.intent_classifier import IntentPreClassifier
 from src.core.prompts import CustomerServicePrompts
 from src.core.state import ChatState, Order, ProductDetails
+from src.services.database import customers, orders
+from src.services.menu_catalog import menu_catalog
 from src.services.tools import (ALL_TOOLS, CUSTOMER_TOOLS, MENU_TOOLS,
                                 ORDER_TOOLS, SEND_TOOLS, get_order_by_id)
 
+# Sections that never touch the active order, by intent -> (lane, tools).
+# Each lane runs concurrently with the others; sections that share a lane
+# (they write the same customer row) run one after another inside it.
+# Every other intent stays on the serialized retrieve_data loop.
+INDEPENDENT_SECTIONS = {
+    "consulta_menu": (None, MENU_TOOLS),
+    "consulta_productos": (None, MENU_TOOLS),
+    "registro_datos_personales": ("cliente", CUSTOMER_TOOLS),
+    "registro_direccion": ("cliente", CUSTOMER_TOOLS),
+}
+
 
 class Workflow:
     def __init__(self):
-        self.supabase = supabase
         self.llm = ChatOpenAI(
             model="gpt-4o-mini",
             temperature=0.1,
@@ -28,6 +42,8 @@ class Workflow:
         self.prompts = CustomerServicePrompts()
         self.workflow = self._build_workflow()
         self.actions = Actions()
+        self.intent_classifier = IntentPreClassifier(catalog=menu_catalog)
+        self.tools_by_name = {t.name: t for t in ALL_TOOLS}
     
     
     def _build_workflow(self):
@@ -36,6 +52,7 @@ class Workflow:
         
         # Add nodes with async functions
         graph.add_node("detect_intent", self.detect_user_intent_step)
+        graph.add_node("parallel_sections", self.parallel_sections_step)
         graph.add_node("retrieve_data", self.retrieve_data_step)
         graph.add_node("tools", ToolNode(ALL_TOOLS))
         graph.add_node("process_results", self.process_tool_results_step)
@@ -50,6 +67,17 @@ class Workflow:
             "detect_intent",
             self.should_continue_after_intent,
             {
+                "retrieve": "parallel_sections",
+                "send": "send_response"
+            }
+        )
+        
+        # Independent sections run concurrently; the rest go through retrieve_data
+        graph.add_conditional_edges(
+            "parallel_sections",
+            self.should_continue_after_parallel,
+            {
+                "process": "process_results",
                 "retrieve": "retrieve_data",
                 "send": "send_response"
             }
@@ -120,63 +148,40 @@ class Workflow:
             })
             print(f"Existing order states: {existing_order_steps}")
             
-            # Check if user exists in database and update states accordingly
-            try:
-                customer_result = supabase.table("clientes").select("*").eq("id", cliente_id).execute()
-                if customer_result.data:
-                    customer = customer_result.data[0]
-                    print(f"Customer found: {customer}")
-                    
-                    # Update states based on existing customer data
-                    if customer.get("nombre_completo") and customer.get("telefono"):
-                        existing_order_steps["registro_datos_personales"] = 2
-                        print("Set registro_datos_personales to completed (2)")
-                    
-                    if customer.get("direccion"):
-                        existing_order_steps["registro_direccion"] = 2
-                        print("Set registro_direccion to completed (2)")
-                else:
-                    customer_result = supabase.table("clientes").insert({"id": cliente_id}).execute()
-                    customer = customer_result.data[0]
-                    print("Customer created in database")
-            except Exception as e:
-                print(f"Error checking customer: {e}")
-                customer = None
-            
             new_message = state['messages'][-1].content if state['messages'] else ""
             print(f"New message content: {new_message}")
             
+            # The customer lookup runs on the async client, concurrently with the
+            # splitter LLM call, so it stays off the critical path. The prompt
+            # uses the customer from the previous turn.
+            customer_task = self._get_or_create_customer(cliente_id)
+            
+            # High-confidence messages (greetings, confirmations, menu requests...)
+            # are classified by rules, without calling the splitter LLM
+            previous_reply = next((m.content for m in reversed(state["messages"][:-1])
+                                   if isinstance(m, AIMessage) and isinstance(m.content, str)), None)
+            divided = await self.intent_classifier.aclassify(new_message, previous_reply)
+            if divided is not None:
+                print(f"Fast-path intent: {divided} (stats: {self.intent_classifier.get_stats()})")
+                customer = await customer_task
+            else:
+                prompt_order_steps = self._apply_customer_steps(dict(existing_order_steps), state.get("customer"))
+                customer, raw = await asyncio.gather(
+                    customer_task,
+                    self._split_message(state, prompt_order_steps),
+                )
+                
+                try:
+                    divided = json.loads(raw)
+                    print(f"JSON parsed successfully: {divided}")
+                except json.JSONDecodeError as json_err:
+                    print(f"JSON parsing error: {json_err}")
+                    print(f"Raw content was: {repr(raw)}")
+                    return {"divided_message": [],
+                            "order_steps": self._apply_customer_steps(existing_order_steps, customer)}
             
-            context = [
-                SystemMessage(content=self.prompts.MESSAGE_SPLITTING_SYSTEM),
-                HumanMessage(content=self.prompts.message_splitting_user(
-                    messages=state["messages"],
-                    order_steps=existing_order_steps,
-                    customer_info=customer,
-                    active_order=state.get("active_order", {})
-                ))
-            ]
-            print(f"Context created with {len(context)} messages")
-            
-            response = await self.llm.ainvoke(context)
-            print(f"LLM response received: {response.content}")
-            
-            raw = response.content
-            if not raw.strip():
-                print("ERROR: Empty response content")
-                raise ValueError("Response content is empty or whitespace")
-            
-            if raw.startswith("```json") or raw.startswith("```"):
-                raw = re.sub(r"^```(?:json)?\n?", "", raw)
-                raw = re.sub(r"\n?```$", "", raw)
-            
-            try:
-                divided = json.loads(raw)
-                print(f"JSON parsed successfully: {divided}")
-            except json.JSONDecodeError as json_err:
-                print(f"JSON parsing error: {json_err}")
-                print(f"Raw content was: {repr(raw)}")
-                return {"divided_message": [], "order_steps": existing_order_steps}
+            # Update states based on existing customer data
+            self._apply_customer_steps(existing_order_steps, customer)
             
             # Update states based on current message intents
             for i, section in enumerate(divided):
@@ -246,6 +251,152 @@ class Workflow:
                 "general": existing_states.get("general", 0)
             }
     
+    async def _get_or_create_customer(self, cliente_id: str):
+        """Fetch the customer row, creating it on first contact."""
+        try:
+            # Already fetched while hydrating this request's state
+            customer = request_cache().get(("customer", cliente_id))
+            if customer is None:
+                customer = await customers.get_or_create(cliente_id)
+            print(f"Customer: {customer}")
+            return customer
+        except Exception as e:
+            print(f"Error checking customer: {e}")
+            return None
+    
+    def _apply_customer_steps(self, order_steps: Dict[str, int], customer) -> Dict[str, int]:
+        """Mark the registration steps the customer has already completed."""
+        if not customer:
+            return order_steps
+        if customer.get("nombre_completo") and customer.get("telefono"):
+            order_steps["registro_datos_personales"] = 2
+            print("Set registro_datos_personales to completed (2)")
+        if customer.get("direccion"):
+            order_steps["registro_direccion"] = 2
+            print("Set registro_direccion to completed (2)")
+        return order_steps
+    
+    async def _split_message(self, state: Dict[str, Any], order_steps: Dict[str, int]) -> str:
+        """Ask the splitter LLM to divide the message into intents; returns the raw JSON text."""
+        context = [
+            SystemMessage(content=self.prompts.MESSAGE_SPLITTING_SYSTEM),
+            HumanMessage(content=self.prompts.message_splitting_user(
+                messages=state["messages"],
+                order_steps=order_steps,
+                customer_info=state.get("customer"),
+                active_order=state.get("active_order", {})
+            ))
+        ]
+        print(f"Context created with {len(context)} messages")
+        
+        response = await self.llm.ainvoke(context)
+        print(f"LLM response received: {response.content}")
+        
+        raw = response.content
+        if not raw.strip():
+            print("ERROR: Empty response content")
+            raise ValueError("Response content is empty or whitespace")
+        
+        if raw.startswith("```json") or raw.startswith("```"):
+            raw = re.sub(r"^```(?:json)?\n?", "", raw)
+            raw = re.sub(r"\n?```$", "", raw)
+        return raw
+    
+    async def parallel_sections_step(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the sections that do not depend on the active order (menu queries,
+        customer data, address) as concurrent branches.
+
+        Order-mutating sections are left in divided_message for the serialized
+        retrieve_data loop. Branch messages are merged back in section order, so
+        the resulting state does not depend on which branch finished first.
+        """
+        print("=== PARALLEL SECTIONS STEP START ===")
+        divided = list(state.get("divided_message") or [])
+        cliente_id = state.get("cliente_id", "")
+        
+        lanes: Dict[Any, List[Dict[str, str]]] = {}
+        remaining = []
+        for index, section in enumerate(divided):
+            spec = INDEPENDENT_SECTIONS.get(section.get("intent"))
+            if spec is None:
+                remaining.append(section)
+                continue
+            lane = spec[0] if spec[0] is not None else f"section_{index}"
+            lanes.setdefault(lane, []).append(section)
+        
+        if not lanes:
+            print("No independent sections, continuing with retrieve_data")
+            return {"divided_message": remaining, "tool_results": {"parallel_sections": []}}
+        
+        print(f"Running {sum(len(v) for v in lanes.values())} sections in {len(lanes)} concurrent branches")
+        lane_results = await asyncio.gather(
+            *(self._run_lane(cliente_id, sections) for sections in lanes.values())
+        )
+        
+        merged_messages: List[BaseMessage] = []
+        summary = []
+        for sections, results in zip(lanes.values(), lane_results):
+            for section, messages in zip(sections, results):
+                merged_messages.extend(messages)
+                summary.append({
+                    "intent": section["intent"],
+                    "action": section.get("action", ""),
+                    "tools": [m.name for m in messages if isinstance(m, ToolMessage)],
+                })
+        
+        print(f"=== PARALLEL SECTIONS STEP END: {summary} ===")
+        return {
+            "messages": merged_messages,
+            "divided_message": remaining,
+            "tool_results": {"parallel_sections": summary},
+        }
+    
+    async def _run_lane(self, cliente_id: str, sections: List[Dict[str, str]]) -> List[List[BaseMessage]]:
+        """Run the sections of one lane in order; returns the messages of each section."""
+        results = []
+        for section in sections:
+            try:
+                results.append(await self._run_independent_section(cliente_id, section))
+            except Exception as e:
+                print(f"❌ Error in parallel section {section}: {e}")
+                results.append([])
+        return results
+    
+    async def _run_independent_section(self, cliente_id: str, section: Dict[str, str]) -> List[BaseMessage]:
+        """Tool selection plus tool execution for a single independent section."""
+        tools = INDEPENDENT_SECTIONS[section["intent"]][1]
+        context = [
+            SystemMessage(content=self.prompts.tools_execution_system(section["intent"], section["action"])),
+            HumanMessage(content=self.prompts.tools_execution_user(cliente_id, [], section))
+        ]
+        response = await self.llm.bind_tools(tools).ainvoke(context)
+        if not getattr(response, "tool_calls", None):
+            print(f"⚠️ No tools called for {section['intent']}")
+            return []
+        
+        print(f"🔀 {section['intent']}: {[tc['name'] for tc in response.tool_calls]}")
+        if tools is MENU_TOOLS:
+            # Read-only lookups: run every call of the section at once
+            tool_messages = await asyncio.gather(*(self._execute_tool_call(tc) for tc in response.tool_calls))
+        else:
+            tool_messages = [await self._execute_tool_call(tc) for tc in response.tool_calls]
+        return [response, *tool_messages]
+    
+    async def _execute_tool_call(self, tool_call: Dict[str, Any]) -> ToolMessage:
+        """Execute one tool call and wrap its result like ToolNode does."""
+        tool = self.tools_by_name.get(tool_call["name"])
+        try:
+            if tool is None:
+                raise ValueError(f"Tool {tool_call['name']} not found")
+            result = await tool.ainvoke(tool_call.get("args", {}))
+            content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+            status = "success"
+        except Exception as e:
+            content = json.dumps({"error": str(e)}, ensure_ascii=False)
+            status = "error"
+        return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"], status=status)
+    
     async def retrieve_data_step(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Retrieve relevant data based on user intent."""
         print("=== RETRIEVE DATA STEP START ===")
@@ -293,17 +444,16 @@ class Workflow:
         #===CREAR PEDIDO===#    
         if section["intent"] == "crear_pedido":
             
-            order_response = get_order_by_id.invoke({"cliente_id": cliente_id})
-            print(f"Order response: {order_response}")
+            existing_order = await orders.get_active(cliente_id)
+            print(f"Order response: {existing_order}")
             
-            if hasattr(order_response, "success"):
+            if existing_order:
                 print("🔄 Detected crear_pedido intent - order already exists in database")
-                updated_state["active_order"] = order_response.data
+                updated_state["active_order"] = existing_order
                 
             else:
                 print("🔄 Detected crear_pedido intent - order does not exist in database - creating new order in database")
-                new_order = supabase.table("pedidos_activos").insert({"cliente_id": cliente_id, "estado": "en curso", "productos": {}, "total": 0.0}).execute()
-                updated_state["active_order"] = new_order.data[0]
+                updated_state["active_order"] = await orders.create({"cliente_id": cliente_id, "estado": "en curso", "productos": [], "total": 0.0})
                         
         #===SELECCION DE PRODUCTOS===#
         elif section["intent"] == "seleccion_productos":
@@ -753,69 +903,49 @@ class Workflow:
             # 🔍 IDENTIFICAR MENSAJES NUEVOS QUE NO ESTÁN EN BD
             from src.core.memory import memory
 
-            # Obtener conversación actual de la BD para comparar
-            existing_context = await memory.get_conversation(cliente_id)
-            existing_messages = existing_context.recent_messages
-            existing_count = len(existing_messages)
-            
-            print(f"   - Mensajes ya en BD: {existing_count}")
-            print(f"   - Mensajes en estado actual: {len(messages)}")
-            
-            # 📝 GUARDAR SOLO LOS MENSAJES NUEVOS (comparación por contenido)
-            # Crear set de contenidos existentes para comparación rápida
-            existing_contents = set()
-            for existing_msg in existing_messages:
-                existing_contents.add(f"{existing_msg['role']}:{existing_msg['content']}")
-            
-            new_messages_to_save = []
-            for message in messages:
-                role = "human" if hasattr(message, '__class__') and 'Human' in str(message.__class__) else "assistant"
-                message_key = f"{role}:{message.content}"
+            # Todas las escrituras del turno se agrupan en un solo upsert
+            async with memory.turn(cliente_id) as turn:
+                existing_messages = turn.recent_messages
+                existing_count = len(existing_messages)
                 
-                # Solo agregar si no existe ya en la BD
-                if message_key not in existing_contents:
-                    new_messages_to_save.append(message)
-                    existing_contents.add(message_key)  # Evitar duplicados en esta sesión también
-            
-            print(f"   - Mensajes nuevos a guardar: {len(new_messages_to_save)}")
-            
-            if new_messages_to_save:
-                # Guardar cada mensaje nuevo individualmente
-                for i, message in enumerate(new_messages_to_save):
-                    try:
-                        await memory.add_message(cliente_id, message)
-                        role = "👤 Usuario" if hasattr(message, '__class__') and 'Human' in str(message.__class__) else "🤖 Agente"
-                        content_preview = message.content[:50] + "..." if len(message.content) > 50 else message.content
-                        print(f"   ✅ Guardado {i+1}/{len(new_messages_to_save)}: {role} - {content_preview}")
-                    except Exception as msg_error:
-                        print(f"   ❌ Error guardando mensaje {i+1}: {msg_error}")
-            else:
-                print(f"   ℹ️ No hay mensajes nuevos que guardar (todos ya existen)")
-            
-            # 🔄 ACTUALIZAR CONTEXTO DEL CLIENTE Y PEDIDO
-            try:
-                # Update customer context if we have relevant info
+                print(f"   - Mensajes ya en BD: {existing_count}")
+                print(f"   - Mensajes en estado actual: {len(messages)}")
+                
+                # 📝 GUARDAR SOLO LOS MENSAJES NUEVOS (comparación por contenido)
+                # Crear set de contenidos existentes para comparación rápida
+                existing_contents = set()
+                for existing_msg in existing_messages:
+                    existing_contents.add(f"{existing_msg['role']}:{existing_msg['content']}")
+                
+                new_messages_to_save = []
+                for message in messages:
+                    role = "human" if hasattr(message, '__class__') and 'Human' in str(message.__class__) else "assistant"
+                    message_key = f"{role}:{message.content}"
+                    
+                    # Solo agregar si no existe ya en la BD
+                    if message_key not in existing_contents:
+                        new_messages_to_save.append(message)
+                        existing_contents.add(message_key)  # Evitar duplicados en esta sesión también
+                
+                print(f"   - Mensajes nuevos a guardar: {len(new_messages_to_save)}")
+                
+                for message in new_messages_to_save:
+                    turn.add_message(message)
+                if not new_messages_to_save:
+                    print(f"   ℹ️ No hay mensajes nuevos que guardar (todos ya existen)")
+                
+                # 🔄 ACTUALIZAR CONTEXTO DEL CLIENTE Y PEDIDO
                 if state.get("customer") and state["customer"].get("nombre_completo"):
-                    await memory.update_customer_context(
-                        cliente_id, 
-                        "customer_name", 
-                        state["customer"]["nombre_completo"]
-                    )
-                    print(f"   ✅ Contexto del cliente actualizado")
+                    turn.update_customer_context("customer_name", state["customer"]["nombre_completo"])
                 
-                # Update order context if we have an active order
                 if state.get("active_order") and state["active_order"].get("productos"):
-                    await memory.update_customer_context(
-                        cliente_id,
-                        "current_order",
-                        state["active_order"]
-                    )
-                    print(f"   ✅ Contexto del pedido actualizado")
-            except Exception as context_error:
-                print(f"   ⚠️ Error actualizando contexto: {context_error}")
+                    turn.update_customer_context("current_order", state["active_order"])
             
             print(f"✅ Conversación completa guardada para usuario {cliente_id}")
             
+            # Snapshot compacto para reanudar el próximo turno con una lectura local
+            await state_manager.save_state_for_user(state)
+            
             # Return the state unchanged (this is the final node)
             return state
             
@@ -839,6 +969,15 @@ class Workflow:
             return "send"
         return "retrieve"
 
+    def should_continue_after_parallel(self, state: Dict[str, Any]) -> Literal["process", "retrieve", "send"]:
+        """Process branch tool results first, then continue with the serialized sections."""
+        summary = (state.get("tool_results") or {}).get("parallel_sections", [])
+        if any(section["tools"] for section in summary):
+            return "process"
+        if state.get("divided_message"):
+            return "retrieve"
+        return "send"
+
     def should_continue_after_processing(self, state: Dict[str, Any]) -> Literal["retrieve", "send"]:
         """Determine if we should continue processing more messages or send response."""
         divided_message = state.get("divided_message", [])
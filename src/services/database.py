@@ -0,0 +1,306 @@
+"""
+Data access layer for the pizzeria chatbot.
+Wraps the Supabase clients with pooled HTTP connections, per-call timeouts and
+retries on transient network errors, and groups the queries used by the
+workflow, the tools and the memory manager into small repositories.
+
+Async code (workflow nodes, memory, checkpointer) awaits the async methods and
+never blocks the event loop. LangChain tools are synchronous and are executed
+by ToolNode in a worker thread, so they use the `*_sync` methods, which go
+through the same pooled, retrying path.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from config.settings import (SUPABASE_KEY, SUPABASE_MAX_RETRIES,
+                             SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT_SECONDS,
+                             SUPABASE_URL, supabase)
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: the request never reached PostgREST or timed out.
+# API errors (constraint violations, bad filters...) are raised immediately.
+TRANSIENT_ERRORS = (httpx.TransportError, TimeoutError)
+
+# build(client) -> query builder, e.g. lambda db: db.table("clientes").select("*")
+QueryBuilder = Callable[[Any], Any]
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter (0.1s, 0.2s, 0.4s... capped at 2s)."""
+    return random.uniform(0, min(2.0, 0.1 * 2 ** attempt))
+
+
+def first(result) -> Optional[Dict[str, Any]]:
+    """First row of a query result, or None."""
+    return result.data[0] if result is not None and result.data else None
+
+
+class Database:
+    """
+    Supabase access with pooling, timeouts and retries.
+
+    The sync client is the pooled client from config.settings. Async clients
+    hold an httpx.AsyncClient, which is bound to the event loop that created
+    it, so one async client is kept per running loop (the Telegram bot and the
+    WhatsApp server run on different loops).
+    """
+
+    def __init__(self, sync_client=None, url: str = SUPABASE_URL, key: str = SUPABASE_KEY,
+                 pool_size: int = SUPABASE_POOL_SIZE, timeout: float = SUPABASE_TIMEOUT_SECONDS,
+                 max_retries: int = SUPABASE_MAX_RETRIES, async_client_factory: Callable[[], Any] = None):
+        self.sync_client = sync_client or supabase
+        self.url = url
+        self.key = key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._async_client_factory = async_client_factory or self._create_async_client
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "retries": 0, "failures": 0}
+
+    # ------------------------------------------------------------------ #
+    # Clients
+    # ------------------------------------------------------------------ #
+
+    def _create_async_client(self) -> AsyncClient:
+        http_client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+        options = AsyncClientOptions(postgrest_client_timeout=self.timeout, httpx_client=http_client)
+        return AsyncClient(self.url, self.key, options)
+
+    def async_client(self):
+        """Async client for the running event loop (created on first use)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_client_factory()
+                self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Close the HTTP pool of the current loop's async client."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        http_client = getattr(getattr(client, "options", None), "httpx_client", None)
+        if http_client is not None:
+            await http_client.aclose()
+
+    # ------------------------------------------------------------------ #
+    # Execution
+    # ------------------------------------------------------------------ #
+
+    async def execute(self, build: QueryBuilder, op: str = "query",
+                      timeout: Optional[float] = None, retries: Optional[int] = None):
+        """
+        Run a query on the async client.
+
+        Args:
+            build: Function that receives the client and returns the query builder
+            op: Operation name for logs
+            timeout: Seconds for this call (defaults to SUPABASE_TIMEOUT_SECONDS)
+            retries: Retries on transient errors (use 0 for non-idempotent inserts)
+
+        Returns:
+            The Supabase API response
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.max_retries if retries is None else retries
+        self.stats["queries"] += 1
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(build(self.async_client()).execute(), timeout)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= retries:
+                    self.stats["failures"] += 1
+                    logger.error(f"Database {op} failed after {attempt + 1} attempts: {e!r}")
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Database {op} transient error ({e!r}), retrying")
+                await asyncio.sleep(_backoff(attempt))
+
+    def execute_sync(self, build: QueryBuilder, op: str = "query", retries: Optional[int] = None):
+        """
+        Blocking twin of `execute` for synchronous callers (tools run by ToolNode).
+        The timeout is the one configured on the pooled HTTP client.
+        """
+        retries = self.max_retries if retries is None else retries
+        self.stats["queries"] += 1
+        for attempt in range(retries + 1):
+            try:
+                return build(self.sync_client).execute()
+            except TRANSIENT_ERRORS as e:
+                if attempt >= retries:
+                    self.stats["failures"] += 1
+                    logger.error(f"Database {op} failed after {attempt + 1} attempts: {e!r}")
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Database {op} transient error ({e!r}), retrying")
+                time.sleep(_backoff(attempt))
+
+
+class CustomerRepository:
+    """Queries on `clientes`."""
+
+    table = "clientes"
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).select("*").eq("id", cliente_id), op="clientes.get")
+        return first(result)
+
+    async def get_or_create(self, cliente_id: str) -> Dict[str, Any]:
+        customer = await self.get(cliente_id)
+        if customer is not None:
+            return customer
+        result = await self.db.execute(
+            lambda c: c.table(self.table).upsert({"id": cliente_id}, on_conflict="id"), op="clientes.create")
+        return first(result)
+
+    def get_sync(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).select("*").eq("id", cliente_id), op="clientes.get")
+        return first(result)
+
+    def update_sync(self, cliente_id: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).update(data).eq("id", cliente_id), op="clientes.update")
+        return result.data or []
+
+
+class OrderRepository:
+    """Queries on `pedidos_activos` and `pedidos_finalizados`."""
+
+    table = "pedidos_activos"
+    finished_table = "pedidos_finalizados"
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get_active(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).select("*").eq("cliente_id", cliente_id).limit(1), op="pedidos.get_active")
+        return first(result)
+
+    async def create(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).insert(data), op="pedidos.create", retries=0)
+        return first(result)
+
+    def get_active_sync(self, cliente_id: str) -> Optional[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).select("*").eq("cliente_id", cliente_id).limit(1), op="pedidos.get_active")
+        return first(result)
+
+    def get_sync(self, order_id) -> Optional[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).select("*").eq("id", order_id), op="pedidos.get")
+        return first(result)
+
+    def create_sync(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).insert(data), op="pedidos.create", retries=0)
+        return first(result)
+
+    def update_sync(self, order_id, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).update(data).eq("id", order_id), op="pedidos.update")
+        return result.data or []
+
+    def delete_sync(self, order_id) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).delete().eq("id", order_id), op="pedidos.delete")
+        return result.data or []
+
+    def archive_sync(self, order_id, finalized_data: Dict[str, Any]):
+        """Copy the order to pedidos_finalizados and remove it from pedidos_activos."""
+        self.db.execute_sync(
+            lambda c: c.table(self.finished_table).insert(finalized_data), op="pedidos.archive", retries=0)
+        self.delete_sync(order_id)
+
+
+class ConversationRepository:
+    """Queries on the conversation memory table."""
+
+    table = "smart_conversation_memory"
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).select("*").eq("thread_id", thread_id).limit(1), op="memory.get")
+        return first(result)
+
+    async def upsert(self, data: Dict[str, Any]) -> bool:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).upsert(data, on_conflict="thread_id"), op="memory.upsert")
+        return bool(result.data)
+
+    async def delete_inactive(self, cutoff_iso: str) -> int:
+        result = await self.db.execute(
+            lambda c: c.table(self.table).delete().lt("last_activity", cutoff_iso), op="memory.cleanup")
+        return len(result.data or [])
+
+    async def delete_by(self, table: str, column: str, value: Any, op: str = "memory.delete") -> int:
+        """Delete rows of an auxiliary cache table (conversations, customer_cache...)."""
+        result = await self.db.execute(
+            lambda c: c.table(table).delete().eq(column, value), op=op)
+        return len(result.data or [])
+
+
+class AddressRepository:
+    """Queries on `direcciones_clientes`."""
+
+    table = "direcciones_clientes"
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def list_sync(self, cliente_id: str) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).select("*").eq("cliente_id", cliente_id), op="direcciones.list")
+        return result.data or []
+
+    def update_sync(self, cliente_id: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).update(data).eq("cliente_id", cliente_id), op="direcciones.update")
+        return result.data or []
+
+    def list_located_sync(self, with_distance: bool = True) -> List[Dict[str, Any]]:
+        """Geocoded addresses (delivery zone history); `with_distance=False` also returns those without a distance."""
+        def build(c):
+            query = c.table(self.table).select("direccion_id, cliente_id, lat, lon, distancia").not_.is_("lat", "null")
+            return query.not_.is_("distancia", "null") if with_distance else query
+        result = self.db.execute_sync(build, op="direcciones.list_located")
+        return result.data or []
+
+    def update_by_id_sync(self, direccion_id: int, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = self.db.execute_sync(
+            lambda c: c.table(self.table).update(data).eq("direccion_id", direccion_id), op="direcciones.update_by_id")
+        return result.data or []
+
+
+# Global instances
+database = Database()
+customers = CustomerRepository(database)
+orders = OrderRepository(database)
+conversations = ConversationRepository(database)
+addresses = AddressRepository(database)
@@ -0,0 +1,201 @@
+"""
+Offline delivery-zone engine.
+Precomputes, over a lat/lon grid covering the delivery bounding box, which fee
+band (<1 km, <2 km, <3 km or out of zone) each cell falls in from historical
+driving distances, so most fee lookups are an array read and the routing API
+is only needed for cells that straddle a band boundary.
+"""
+
+import bisect
+import logging
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.settings import (DELIVERY_ZONE_CELL_DEGREES, DELIVERY_ZONE_MARGIN,
+                             RESTAURANT_LAT, RESTAURANT_LON, max_lat, max_lon,
+                             min_lat, min_lon)
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (meters, exclusive) of the fee bands and their fees
+BAND_LIMITS = (1000, 2000, 3000)
+BAND_FEES = (10000, 15000, 20000)
+OUT_OF_ZONE = len(BAND_LIMITS)
+OUT_OF_ZONE_FEE = -1
+
+# Cell code for cells whose estimated distance range crosses a band limit
+BOUNDARY = 255
+
+# (lat, lon, driving distance in meters)
+Sample = Tuple[float, float, float]
+
+
+def straight_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance in meters (accurate to <0.1% at city scale)."""
+    phi = math.radians((lat1 + lat2) / 2.0)
+    x = math.radians(lon2 - lon1) * math.cos(phi)
+    y = math.radians(lat2 - lat1)
+    return 6_371_000 * math.hypot(x, y)
+
+
+def band_of(distance: float) -> int:
+    """Band index of a driving distance; OUT_OF_ZONE beyond the last band."""
+    return bisect.bisect_right(BAND_LIMITS, distance)
+
+
+def fee_of_band(band: int) -> int:
+    return BAND_FEES[band] if band < OUT_OF_ZONE else OUT_OF_ZONE_FEE
+
+
+class DeliveryZones:
+    """
+    Grid of fee bands over the delivery bounding box.
+
+    Driving distance is modelled as straight-line distance times a detour
+    ratio. For every cell the range of straight-line distances to the
+    restaurant (nearest point to farthest corner) is multiplied by the range
+    of detour ratios observed in historical samples around the cell (widened
+    by `margin`); when both ends of the product fall in the same band, the
+    cell is stored with that band, otherwise it is a BOUNDARY cell.
+
+    Since a driving distance is never shorter than the straight line, points
+    3 km or more away in a straight line are out of zone without a lookup.
+    Cells with too few nearby samples use the spread of all samples, or
+    `default_ratios` before any history exists.
+    """
+
+    def __init__(self, restaurant: Tuple[float, float] = (RESTAURANT_LAT, RESTAURANT_LON),
+                 bbox: Tuple[float, float, float, float] = (min_lat, max_lat, min_lon, max_lon),
+                 cell_degrees: float = DELIVERY_ZONE_CELL_DEGREES, margin: float = DELIVERY_ZONE_MARGIN,
+                 neighbourhood: int = 2, min_samples: int = 3,
+                 default_ratios: Tuple[float, float] = (1.0, 1.8)):
+        self.restaurant_lat, self.restaurant_lon = restaurant
+        self.min_lat, self.max_lat, self.min_lon, self.max_lon = bbox
+        self.cell_degrees = cell_degrees
+        self.margin = margin
+        self.neighbourhood = neighbourhood
+        self.min_samples = min_samples
+        self.default_ratios = default_ratios
+        self.rows = max(1, math.ceil((self.max_lat - self.min_lat) / cell_degrees))
+        self.cols = max(1, math.ceil((self.max_lon - self.min_lon) / cell_degrees))
+        self.cells = bytearray([BOUNDARY]) * (self.rows * self.cols)
+        # cell index -> detour ratios of the samples inside it
+        self._ratios: Dict[int, List[float]] = defaultdict(list)
+        self._global_ratios = default_ratios
+        self._lock = threading.Lock()
+        self.built = False
+        self.stats = {"lookups": 0, "offline": 0, "boundary": 0, "samples": 0}
+
+    # ------------------------------------------------------------------ #
+    # Lookups
+    # ------------------------------------------------------------------ #
+
+    def cell_of(self, lat: float, lon: float) -> Optional[int]:
+        row = int((lat - self.min_lat) / self.cell_degrees)
+        col = int((lon - self.min_lon) / self.cell_degrees)
+        if 0 <= row < self.rows and 0 <= col < self.cols and lat >= self.min_lat and lon >= self.min_lon:
+            return row * self.cols + col
+        return None
+
+    def band(self, lat: float, lon: float) -> Optional[int]:
+        """Band index of a point, or None when only a routing call can tell."""
+        self.stats["lookups"] += 1
+        if straight_distance(lat, lon, self.restaurant_lat, self.restaurant_lon) >= BAND_LIMITS[-1]:
+            self.stats["offline"] += 1
+            return OUT_OF_ZONE
+        cell = self.cell_of(lat, lon)
+        code = self.cells[cell] if cell is not None else BOUNDARY
+        if code == BOUNDARY:
+            self.stats["boundary"] += 1
+            return None
+        self.stats["offline"] += 1
+        return code
+
+    def fee(self, lat: float, lon: float) -> Optional[int]:
+        """Delivery fee of a point (-1 out of zone), or None when a routing call is needed."""
+        band = self.band(lat, lon)
+        return None if band is None else fee_of_band(band)
+
+    # ------------------------------------------------------------------ #
+    # Building
+    # ------------------------------------------------------------------ #
+
+    def build(self, samples: Iterable[Sample]) -> None:
+        """Recompute every cell from historical (lat, lon, driving distance) samples."""
+        with self._lock:
+            self._ratios = defaultdict(list)
+            for lat, lon, distance in samples:
+                self._add(lat, lon, distance)
+            ratios = sorted(r for values in self._ratios.values() for r in values)
+            if len(ratios) >= self.min_samples:
+                # 5th-95th percentile: one odd route should not widen every cell
+                lo = ratios[int(0.05 * (len(ratios) - 1))]
+                hi = ratios[int(math.ceil(0.95 * (len(ratios) - 1)))]
+                self._global_ratios = (lo, hi)
+            else:
+                self._global_ratios = self.default_ratios
+            for row in range(self.rows):
+                for col in range(self.cols):
+                    self.cells[row * self.cols + col] = self._cell_code(row, col)
+            self.built = True
+        boundary = self.cells.count(BOUNDARY)
+        logger.info(f"🗺️ Delivery zones built from {self.stats['samples']} samples: "
+                    f"{self.rows}x{self.cols} cells, {boundary} on band boundaries")
+
+    def add_sample(self, lat: float, lon: float, distance: float) -> None:
+        """Learn from a live routing result, recomputing only the cells around it."""
+        with self._lock:
+            cell = self._add(lat, lon, distance)
+            if cell is None:
+                return
+            row, col = divmod(cell, self.cols)
+            for r in range(max(0, row - self.neighbourhood), min(self.rows, row + self.neighbourhood + 1)):
+                for c in range(max(0, col - self.neighbourhood), min(self.cols, col + self.neighbourhood + 1)):
+                    self.cells[r * self.cols + c] = self._cell_code(r, c)
+
+    def _add(self, lat: float, lon: float, distance: float) -> Optional[int]:
+        cell = self.cell_of(lat, lon)
+        straight = straight_distance(lat, lon, self.restaurant_lat, self.restaurant_lon)
+        if cell is None or distance is None or straight < 50:
+            # Too close to the restaurant for a meaningful detour ratio
+            return cell
+        self._ratios[cell].append(max(1.0, distance / straight))
+        self.stats["samples"] += 1
+        return cell
+
+    def _ratio_range(self, row: int, col: int) -> Tuple[float, float]:
+        nearby: List[float] = []
+        for r in range(max(0, row - self.neighbourhood), min(self.rows, row + self.neighbourhood + 1)):
+            for c in range(max(0, col - self.neighbourhood), min(self.cols, col + self.neighbourhood + 1)):
+                nearby.extend(self._ratios.get(r * self.cols + c, ()))
+        lo, hi = (min(nearby), max(nearby)) if len(nearby) >= self.min_samples else self._global_ratios
+        return max(1.0, lo * (1 - self.margin)), hi * (1 + self.margin)
+
+    def _cell_code(self, row: int, col: int) -> int:
+        south = self.min_lat + row * self.cell_degrees
+        west = self.min_lon + col * self.cell_degrees
+        north, east = south + self.cell_degrees, west + self.cell_degrees
+        # Nearest point of the cell to the restaurant, and its farthest corner
+        near_lat = min(max(self.restaurant_lat, south), north)
+        near_lon = min(max(self.restaurant_lon, west), east)
+        nearest = straight_distance(near_lat, near_lon, self.restaurant_lat, self.restaurant_lon)
+        farthest = max(straight_distance(lat, lon, self.restaurant_lat, self.restaurant_lon)
+                       for lat in (south, north) for lon in (west, east))
+        lo, hi = self._ratio_range(row, col)
+        low_band, high_band = band_of(nearest * lo), band_of(farthest * hi)
+        return low_band if low_band == high_band else BOUNDARY
+
+    def info(self) -> Dict[str, object]:
+        return {
+            **self.stats,
+            "built": self.built,
+            "cells": len(self.cells),
+            "boundary_cells": self.cells.count(BOUNDARY),
+            "ratio_range": self._global_ratios,
+        }
+
+
+# Global instance (built from history on first use by DistanceCalculator)
+delivery_zones = DeliveryZones()
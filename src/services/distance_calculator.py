@@ -1,36 +1,51 @@
+import asyncio
+import logging
 import math
 import os
 import re
 import sys
 from dataclasses import asdict, dataclass
-from typing import Dict, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config.settings import (LOCATIONIQ_TOKEN, RESTAURANT_LAT, RESTAURANT_LON,
-                             max_lat, max_lon, min_lat, min_lon, supabase)
+from config.settings import (LOCATIONIQ_FALLBACK_DETOUR, LOCATIONIQ_TOKEN,
+                             RESTAURANT_LAT, RESTAURANT_LON, max_lat, max_lon,
+                             min_lat, min_lon)
+from src.services.database import addresses
+from src.services.delivery_zones import (DeliveryZones, band_of, delivery_zones,
+                                         fee_of_band)
+from src.services.geo_cache import GeoCache, geo_cache
+from src.services.locationiq import (LocationIQClient, LocationIQUnavailable,
+                                     locationiq)
+
+logger = logging.getLogger(__name__)
 
 # --- Normalización de abreviaturas comunes en Colombia ---
-_ABBR = [
-    (r"\bcl\b\.?", "calle"),
-    (r"\bcal\b\.?", "calle"),
-    (r"\bcra\b\.?", "carrera"),
-    (r"\bcr\b\.?", "carrera"),
-    (r"\bkr\b\.?", "carrera"),
-    (r"\bk\b\.?", "carrera"),
-    (r"\bav\b\.?", "avenida"),
-    (r"\bavda\b\.?", "avenida"),
-    (r"\bdg\b\.?", "diagonal"),
-    (r"\bdiag\b\.?", "diagonal"),
-    (r"\btv\b\.?", "transversal"),
-    (r"\btransv\b\.?", "transversal"),
-    (r"\btrv\b\.?", "transversal"),
-    (r"\baut\b\.?", "autopista"),
-    (r"\bn[º°o]\b\.?", "#"),    # n°, nº, no -> #
-    (r"\bnum\b\.?", "#"),
-]
+# palabra (sin punto final, en minúsculas) -> forma completa
+_ABBR = {
+    "cl": "calle",
+    "cal": "calle",
+    "cra": "carrera",
+    "cr": "carrera",
+    "kr": "carrera",
+    "k": "carrera",
+    "av": "avenida",
+    "avda": "avenida",
+    "dg": "diagonal",
+    "diag": "diagonal",
+    "tv": "transversal",
+    "transv": "transversal",
+    "trv": "transversal",
+    "aut": "autopista",
+    "nº": "#",    # n°, nº, no -> #
+    "n°": "#",
+    "no": "#",
+    "num": "#",
+}
 
 # Complementos (unidad) que NO deben ir a 'street' para el geocoder
 _COMPLEMENTS = {
@@ -95,60 +110,104 @@ class AddressParts:
                 s += f"-{self.tertiary.upper()}"
         return s
 
+# --- Normalizador compilado ---
+_SEPARATORS_RE = re.compile(r"[,\s]+")
+# todas las abreviaturas en una sola expresión (las más largas primero)
+_ABBR_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(map(re.escape, _ABBR), key=len, reverse=True)) + r")\b\.?",
+    re.IGNORECASE,
+)
+
+# Todos los complementos en una sola expresión: 'clave valor' (p. ej. 'torre 9', 'apto 1001')
+_COMPLEMENTS_RE = re.compile(
+    r"\b(?:" + "|".join(f"(?P<{key}>{pat})" for key, pat in _COMPLEMENTS.items()) + r")\s+(?P<value>[A-Za-z0-9\-]+)",
+    re.IGNORECASE,
+)
+
+# Direcciones recientes ya analizadas (los clientes repiten la suya en cada pedido)
+_PARSE_MEMO_SIZE = 4096
+
+
 def _normalize_text(s: str) -> str:
-    s = s.strip()
-    # normaliza separadores
-    s = re.sub(r"[,\s]+", " ", s)      # colapsa espacios y comas
-    # aplica abreviaturas
-    for pat, rep in _ABBR:
-        s = re.sub(pat, rep, s, flags=re.IGNORECASE)
-    return s
+    # colapsa espacios y comas, y luego aplica todas las abreviaturas en una sola pasada
+    s = _SEPARATORS_RE.sub(" ", s.strip())
+    return _ABBR_RE.sub(lambda m: _ABBR[m.group().rstrip(".").lower()], s)
 
 def _extract_complements(s: str) -> (Dict[str, str], str):
     """Extrae complementos definidos en _COMPLEMENTS y devuelve (dict, resto_sin_complementos)."""
     comps = {}
-    rest = s
-    for key, pat in _COMPLEMENTS.items():
-        # busca "clave valor" (p. ej. 'torre 9', 'apto 1001')
-        regex = re.compile(rf"\b{pat}\s+([A-Za-z0-9\-]+)", re.IGNORECASE)
-        while True:
-            m = regex.search(rest)
-            if not m:
-                break
-            value = m.group(1).strip().upper()
-            comps[key] = value
-            # elimina esa porción del string para no afectar otros match
-            start, end = m.span()
-            rest = (rest[:start] + " ").strip() + " " + rest[end:].strip()
-            rest = re.sub(r"\s{2,}", " ", rest).strip()
+    pieces = []
+    pos = 0
+    for m in _COMPLEMENTS_RE.finditer(s):
+        key = next(k for k in _COMPLEMENTS if m.group(k) is not None)
+        comps[key] = m.group("value").upper()
+        pieces.append(s[pos:m.start()])
+        pos = m.end()
+    if not comps:
+        return comps, s
+    pieces.append(s[pos:])
+    # une lo que queda sin la porción de cada complemento
+    rest = " ".join(piece.strip() for piece in pieces if piece.strip())
     return comps, rest
 
-def parse_colombian_address(address: str) -> AddressParts:
+def _parse_fields(address: str) -> Tuple:
     norm = _normalize_text(address)
     # 1) extrae complementos (interior/torre/apto/etc.)
     complements, base = _extract_complements(norm)
+    comps = tuple(complements.items())
 
     # 2) busca vía + numeración
     m = _STREET_RE.search(base)
-    ap = AddressParts(raw=address, complements=complements or {})
     if not m:
         # no encontró patrón de vía; deja solo complementos
-        return ap
+        return (None, None, False, None, None, None, comps)
 
-    ap.street_type = m.group("type").lower()
-    ap.street_number = m.group("num").upper()
-    ap.bis = bool(m.group("bis"))
-    ap.sector = (m.group("sector") or "").lower() or None
-    ap.secondary = (m.group("sec") or "").upper() or None
-    ap.tertiary = (m.group("ter") or "").upper() or None
-    return ap
+    return (
+        m.group("type").lower(),
+        m.group("num").upper(),
+        bool(m.group("bis")),
+        (m.group("sector") or "").lower() or None,
+        (m.group("sec") or "").upper() or None,
+        (m.group("ter") or "").upper() or None,
+        comps,
+    )
+
+_parse_memo = lru_cache(maxsize=_PARSE_MEMO_SIZE)(_parse_fields)
+
+def _to_parts(address: str, fields: Tuple) -> AddressParts:
+    street_type, number, bis, sector, secondary, tertiary, comps = fields
+    # instancia nueva en cada llamada: el memo guarda tuplas inmutables
+    return AddressParts(raw=address, street_type=street_type, street_number=number, bis=bis, sector=sector,
+                        secondary=secondary, tertiary=tertiary, complements=dict(comps))
+
+def parse_colombian_address(address: str) -> AddressParts:
+    return _to_parts(address, _parse_memo(address))
+
+def parse_colombian_addresses(addresses: Iterable[str]) -> List[AddressParts]:
+    """
+    Versión por lotes para limpieza masiva de direcciones.
+    Cada dirección distinta se analiza una vez, sin desplazar del memo las direcciones recientes del bot.
+    """
+    parsed: Dict[str, Tuple] = {}
+    result = []
+    for address in addresses:
+        fields = parsed.get(address)
+        if fields is None:
+            fields = parsed[address] = _parse_fields(address)
+        result.append(_to_parts(address, fields))
+    return result
 
 
 class DistanceCalculator:
-    def __init__(self):
+    def __init__(self, cache: GeoCache = None, zones: DeliveryZones = None, client: LocationIQClient = None):
         self.restaurant_lat = RESTAURANT_LAT
         self.restaurant_lon = RESTAURANT_LON
         self.BASE = "https://us1.locationiq.com/v1/search"
+        self.cache = cache or geo_cache
+        self.zones = zones or delivery_zones
+        # cliente asíncrono (pool, timeouts, hedging entre endpoints y circuit breaker)
+        self.client = client or locationiq
+        self.fallback_detour = LOCATIONIQ_FALLBACK_DETOUR
 
 
     def get_coordinates(self, address, limit=1):
@@ -186,45 +245,180 @@ class DistanceCalculator:
         return R * math.hypot(x, y)
     
 
+    def distances_many(self, lats, lons):
+        """Versión vectorizada de calculate_straight_distance: arreglo NumPy de metros al restaurante."""
+        from src.services.geo_batch import straight_distances
+        return straight_distances(lats, lons, self.restaurant_lat, self.restaurant_lon)
+
     def calculate_driving_distance(self, lat, lon):
         url = f"https://us1.locationiq.com/v1/directions/driving/{lon},{lat};{self.restaurant_lon},{self.restaurant_lat}?key={LOCATIONIQ_TOKEN}"
         headers = {"accept": "application/json"}
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
         data = response.json()
         return data['routes'][0]['distance']
     
     def calculate_delivery_fee(self, distance):
-        if distance < 1000:
-            return 10000
-        elif distance < 2000:
-            return 15000
-        elif distance < 3000:
-            return 20000
-        else:
-            return -1
+        # <1 km: 10000, <2 km: 15000, <3 km: 20000, más lejos: -1 (fuera de zona)
+        return fee_of_band(band_of(distance))
+
+    def fees_many(self, distances):
+        """Versión vectorizada de calculate_delivery_fee para muchas distancias en carro."""
+        from src.services.geo_batch import fees_many
+        return fees_many(distances)
         
+    def geocode(self, street):
+        """Coordenadas de la dirección normalizada, consultando primero la caché."""
+        entry = self.cache.get(street)
+        if entry is not None:
+            if not entry.found:
+                raise ValueError("Sin resultados para esa dirección")
+            return entry.lat, entry.lon
+        try:
+            lat, lon = self.get_coordinates(street)
+        except ValueError:
+            self.cache.put_not_found(street)
+            raise
+        except requests.HTTPError as e:
+            # LocationIQ responde 404 cuando no puede geocodificar la dirección
+            if e.response is not None and e.response.status_code == 404:
+                self.cache.put_not_found(street)
+                raise ValueError("Sin resultados para esa dirección") from e
+            raise
+        self.cache.put_location(street, lat, lon)
+        return lat, lon
+
+    def driving_distance(self, street, lat, lon):
+        """Distancia en carro desde la dirección, consultando primero la caché."""
+        entry = self.cache.get(street)
+        if entry is not None and entry.distance is not None:
+            return entry.distance
+        distance = self.calculate_driving_distance(lat, lon)
+        self.cache.put_distance(street, lat, lon, distance)
+        return distance
+
+    def ensure_zones(self):
+        """Construye las zonas de entrega con el historial de distancias la primera vez."""
+        if self.zones.built:
+            return
+        samples = list(self.cache.samples())
+        try:
+            samples += [(d["lat"], d["lon"], d["distancia"]) for d in addresses.list_located_sync()]
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el historial de direcciones: {e}")
+        self.zones.build(samples)
+
+    def delivery_fee(self, street, lat, lon):
+        """
+        Tarifa de domicilio y distancia en carro (None si no hizo falta calcularla).
+        Solo se consulta la API de rutas si el punto cae en el borde entre dos tarifas.
+        """
+        entry = self.cache.get(street)
+        if entry is not None and entry.distance is not None:
+            return self.calculate_delivery_fee(entry.distance), entry.distance
+        self.ensure_zones()
+        fee = self.zones.fee(lat, lon)
+        if fee is not None:
+            return fee, None
+        distance = self.driving_distance(street, lat, lon)
+        self.zones.add_sample(lat, lon, distance)
+        return self.calculate_delivery_fee(distance), distance
+
+    def _registered_fee(self, direcciones, street):
+        """Tarifa de una dirección que el cliente ya tiene registrada (None si no la tiene)."""
+        for direccion in direcciones:
+            if direccion["base_direccion"] == street and direccion.get("distancia") is not None:
+                return self.calculate_delivery_fee(direccion["distancia"])
+        return None
+
+    def _address_record(self, address, parts, street, lat, lon, distance):
+        return {"direccion_completa": address,
+                "base_direccion": street,
+                "detalles": parts.complements,
+                "ciudad": "Bogota",
+                "lat": lat,
+                "lon": lon,
+                "distancia": distance,
+                "is_default": True
+                }
+
     def run(self, address, cliente_id):
         parts = parse_colombian_address(address)
-        lat, lon = self.get_coordinates(parts.street_for_geocoder())
-        distance = self.calculate_driving_distance(lat, lon)
-        fee = self.calculate_delivery_fee(distance)
+        street = parts.street_for_geocoder()
+        if street is None:
+            raise ValueError("No se reconoce la dirección")
+        
+        # Dirección ya registrada por el cliente: no hace falta ninguna llamada externa
+        fee = self._registered_fee(addresses.list_sync(cliente_id), street)
+        if fee is not None:
+            return fee
+        
+        lat, lon = self.geocode(street)
+        fee, distance = self.delivery_fee(street, lat, lon)
+        
+        addresses.update_sync(cliente_id, self._address_record(address, parts, street, lat, lon, distance))
+        return fee
+
+    # --- Versión asíncrona para el workflow: no bloquea el event loop ---
+
+    async def ageocode(self, street):
+        """Como geocode; lanza LocationIQUnavailable si el servicio no responde a tiempo."""
+        entry = self.cache.get(street)
+        if entry is not None:
+            if not entry.found:
+                raise ValueError("Sin resultados para esa dirección")
+            return entry.lat, entry.lon
+        coords = await self.client.search(street)
+        if coords is None:
+            self.cache.put_not_found(street)
+            raise ValueError("Sin resultados para esa dirección")
+        self.cache.put_location(street, *coords)
+        return coords
+
+    async def aensure_zones(self):
+        if not self.zones.built:
+            await asyncio.to_thread(self.ensure_zones)
+
+    async def adelivery_fee(self, street, lat, lon):
+        """
+        Como delivery_fee. Si LocationIQ está lento o caído, la tarifa se estima con la
+        distancia en línea recta por un margen de seguridad (y no se guarda como ruta).
+        """
+        entry = self.cache.get(street)
+        if entry is not None and entry.distance is not None:
+            return self.calculate_delivery_fee(entry.distance), entry.distance
+        await self.aensure_zones()
+        fee = self.zones.fee(lat, lon)
+        if fee is not None:
+            return fee, None
+        try:
+            distance = await self.client.route_distance(lat, lon, self.restaurant_lat, self.restaurant_lon)
+        except LocationIQUnavailable as e:
+            estimate = self.calculate_straight_distance(lat, lon) * self.fallback_detour
+            logger.warning(f"Ruta no disponible ({e}); distancia estimada: {estimate:.0f} m")
+            return self.calculate_delivery_fee(estimate), None
+        self.cache.put_distance(street, lat, lon, distance)
+        self.zones.add_sample(lat, lon, distance)
+        return self.calculate_delivery_fee(distance), distance
+
+    async def arun(self, address, cliente_id):
+        parts = parse_colombian_address(address)
+        street = parts.street_for_geocoder()
+        if street is None:
+            raise ValueError("No se reconoce la dirección")
+        
+        # Direcciones del cliente y zonas de entrega en paralelo (ninguna usa LocationIQ)
+        direcciones, _ = await asyncio.gather(asyncio.to_thread(addresses.list_sync, cliente_id),
+                                              self.aensure_zones())
+        fee = self._registered_fee(direcciones, street)
+        if fee is not None:
+            return fee
         
-        client_direcciones = supabase.table("direcciones_clientes").select("*").eq("cliente_id", cliente_id).execute()
-        if client_direcciones.data:
-            for direccion in client_direcciones.data:
-                if direccion["base_direccion"] == parts.street_for_geocoder():
-                    return fee
+        lat, lon = await self.ageocode(street)
+        fee, distance = await self.adelivery_fee(street, lat, lon)
         
-        result = supabase.table("direcciones_clientes").update({"direccion_completa": address,
-                                                                    "base_direccion": parts.street_for_geocoder(),
-                                                                    "detalles": parts.complements,
-                                                                    "ciudad": "Bogota",
-                                                                    "lat": lat,
-                                                                    "lon": lon,
-                                                                    "distancia": distance,
-                                                                    "is_default": True
-                                                                    }).eq("cliente_id", cliente_id).execute()
-       
+        await asyncio.to_thread(addresses.update_sync, cliente_id,
+                                self._address_record(address, parts, street, lat, lon, distance))
         return fee
             
 
@@ -0,0 +1,65 @@
+"""
+Vectorized distance and fee computation for bulk address work.
+NumPy counterparts of the scalar helpers in delivery_zones, used to re-zone
+every stored address at once instead of row by row.
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from src.services.delivery_zones import (BAND_FEES, BAND_LIMITS, BOUNDARY,
+                                         OUT_OF_ZONE, OUT_OF_ZONE_FEE,
+                                         DeliveryZones)
+
+EARTH_RADIUS_M = 6_371_000
+
+_FEES = np.array(BAND_FEES + (OUT_OF_ZONE_FEE,), dtype=np.int64)
+_LIMITS = np.array(BAND_LIMITS, dtype=np.float64)
+
+
+def straight_distances(lats: Sequence[float], lons: Sequence[float], lat0: float, lon0: float) -> np.ndarray:
+    """Equirectangular distance in meters from every (lat, lon) to (lat0, lon0)."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    phi = np.radians((lats + lat0) / 2.0)
+    x = np.radians(lon0 - lons) * np.cos(phi)
+    y = np.radians(lat0 - lats)
+    return EARTH_RADIUS_M * np.hypot(x, y)
+
+
+def bands_many(distances: Sequence[float]) -> np.ndarray:
+    """Band index of every driving distance (OUT_OF_ZONE beyond the last band)."""
+    return np.searchsorted(_LIMITS, np.asarray(distances, dtype=np.float64), side="right")
+
+
+def fees_many(distances: Sequence[float]) -> np.ndarray:
+    """Delivery fee of every driving distance (-1 out of zone)."""
+    return _FEES[bands_many(distances)]
+
+
+def zone_bands_many(zones: DeliveryZones, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """
+    Grid band of every point, BOUNDARY where only a routing call can tell.
+    Same answers as DeliveryZones.band, without touching its lookup counters.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    cells = np.frombuffer(bytes(zones.cells), dtype=np.uint8)
+    rows = np.floor((lats - zones.min_lat) / zones.cell_degrees).astype(np.int64)
+    cols = np.floor((lons - zones.min_lon) / zones.cell_degrees).astype(np.int64)
+    inside = (rows >= 0) & (rows < zones.rows) & (cols >= 0) & (cols < zones.cols)
+    codes = np.full(lats.shape, BOUNDARY, dtype=np.int64)
+    codes[inside] = cells[rows[inside] * zones.cols + cols[inside]]
+    far = straight_distances(lats, lons, zones.restaurant_lat, zones.restaurant_lon) >= BAND_LIMITS[-1]
+    codes[far] = OUT_OF_ZONE
+    return codes
+
+
+def zone_fees_many(zones: DeliveryZones, lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """(fees, needs_route): fee of every point from the grid and a mask of boundary points (fee 0)."""
+    codes = zone_bands_many(zones, lats, lons)
+    needs_route = codes == BOUNDARY
+    fees = np.zeros(codes.shape, dtype=np.int64)
+    fees[~needs_route] = _FEES[codes[~needs_route]]
+    return fees, needs_route
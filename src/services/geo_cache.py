@@ -0,0 +1,123 @@
+"""
+Persistent geocoding and routing cache for the delivery distance calculator.
+Stores the coordinates and driving distance of each normalized street address
+in a local SQLite file, with a TTL for resolved addresses and a shorter one
+for addresses the geocoder could not resolve.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from config.settings import (GEOCODE_CACHE_NEGATIVE_TTL_SECONDS,
+                             GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GeoEntry:
+    """Cached result for one address; `found` is False for a cached geocoding miss."""
+    found: bool
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    distance: Optional[float] = None
+
+
+class GeoCache:
+    """
+    SQLite (WAL) cache keyed on `AddressParts.street_for_geocoder()`.
+
+    The key is the canonical street string lowercased, so "Cl 127a # 11b-76"
+    and "calle 127A #11B - 76" share one entry.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, ttl_seconds: float = GEOCODE_CACHE_TTL_SECONDS,
+                 negative_ttl_seconds: float = GEOCODE_CACHE_NEGATIVE_TTL_SECONDS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    address_key TEXT PRIMARY KEY,
+                    found INTEGER NOT NULL,
+                    lat REAL,
+                    lon REAL,
+                    distance REAL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    @staticmethod
+    def key(street: str) -> str:
+        return " ".join(street.lower().split())
+
+    def get(self, street: str) -> Optional[GeoEntry]:
+        """Live entry for the address, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT found, lat, lon, distance FROM geocode_cache WHERE address_key = ? AND expires_at > ?",
+                (self.key(street), time.time()),
+            ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        entry = GeoEntry(bool(row[0]), row[1], row[2], row[3])
+        self.stats["hits" if entry.found else "negative_hits"] += 1
+        return entry
+
+    def put_location(self, street: str, lat: float, lon: float) -> None:
+        self._write(street, True, lat, lon, self.ttl_seconds)
+
+    def put_distance(self, street: str, lat: float, lon: float, distance: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO geocode_cache (address_key, found, lat, lon, distance, expires_at) "
+                "VALUES (?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT(address_key) DO UPDATE SET distance = excluded.distance",
+                (self.key(street), lat, lon, distance, time.time() + self.ttl_seconds),
+            )
+
+    def put_not_found(self, street: str) -> None:
+        self._write(street, False, None, None, self.negative_ttl_seconds)
+
+    def _write(self, street: str, found: bool, lat: Optional[float], lon: Optional[float], ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (address_key, found, lat, lon, distance, expires_at) "
+                "VALUES (?, ?, ?, ?, NULL, ?)",
+                (self.key(street), int(found), lat, lon, time.time() + ttl),
+            )
+
+    def samples(self) -> List[Tuple[float, float, float]]:
+        """(lat, lon, driving distance) of every live entry with a known route."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT lat, lon, distance FROM geocode_cache WHERE found = 1 AND distance IS NOT NULL "
+                "AND expires_at > ?", (time.time(),)).fetchall()
+
+    def clear_distances(self) -> int:
+        """Forget every cached route (e.g. after the restaurant moved); coordinates stay valid."""
+        with self._lock:
+            return self._conn.execute("UPDATE geocode_cache SET distance = NULL WHERE distance IS NOT NULL").rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+# Global instance
+geo_cache = GeoCache()
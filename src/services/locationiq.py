@@ -0,0 +1,216 @@
+"""
+Async LocationIQ client for the distance pipeline.
+Pooled HTTP connections, strict timeouts, request hedging across the regional
+endpoints and a circuit breaker that fails fast while the service is down.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from config.settings import (LOCATIONIQ_BREAKER_FAILURES,
+                             LOCATIONIQ_BREAKER_RESET_SECONDS,
+                             LOCATIONIQ_ENDPOINTS, LOCATIONIQ_HEDGE_SECONDS,
+                             LOCATIONIQ_POOL_SIZE, LOCATIONIQ_TIMEOUT_SECONDS,
+                             LOCATIONIQ_TOKEN, max_lat, max_lon, min_lat,
+                             min_lon)
+
+logger = logging.getLogger(__name__)
+
+
+class LocationIQUnavailable(Exception):
+    """LocationIQ did not answer in time (or the circuit is open); callers should degrade."""
+
+
+class CircuitBreaker:
+    """
+    Closed while calls succeed; open after `failure_threshold` consecutive
+    failures, rejecting calls without trying. After `reset_seconds` one trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again for another period; a trial that ends without an outcome
+    (cancelled) is released so the next call can take it.
+    """
+
+    def __init__(self, failure_threshold: int = LOCATIONIQ_BREAKER_FAILURES,
+                 reset_seconds: float = LOCATIONIQ_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if not self._trial and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._trial = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """The call let through by allow() ended without an outcome (e.g. it was cancelled)."""
+        self._trial = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._opened_at is not None or self.failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning(f"⚡ LocationIQ circuit opened after {self.failures} failures")
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+
+class LocationIQClient:
+    """
+    Geocoding and routing over pooled async connections.
+
+    Each request goes to the first endpoint; if it has not answered after
+    `hedge_seconds` (or fails), the same request is sent to the next
+    endpoint and the first good answer wins, the others are cancelled. The
+    whole exchange is bounded by `timeout`. Timeouts, transport errors, 429
+    and 5xx responses count as failures of the circuit breaker; a 404 is a
+    valid "not found" answer.
+    """
+
+    def __init__(self, token: Optional[str] = LOCATIONIQ_TOKEN, endpoints: Sequence[str] = LOCATIONIQ_ENDPOINTS,
+                 timeout: float = LOCATIONIQ_TIMEOUT_SECONDS, hedge_seconds: float = LOCATIONIQ_HEDGE_SECONDS,
+                 pool_size: int = LOCATIONIQ_POOL_SIZE, breaker: Optional[CircuitBreaker] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.token = token
+        self.endpoints = [endpoint.rstrip("/") for endpoint in endpoints]
+        self.timeout = timeout
+        self.hedge_seconds = hedge_seconds
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "hedged": 0, "failures": 0, "short_circuited": 0}
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={"accept": "application/json"},
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=self._transport,
+            )
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    # ------------------------------------------------------------------ #
+    # API
+    # ------------------------------------------------------------------ #
+
+    async def search(self, address: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) of the best match in Colombia, or None if the address is not found."""
+        response = await self._request("/search", {
+            "q": address,
+            "limit": 1,
+            "format": "json",
+            "countrycodes": "co",
+            "accept-language": "es",
+            "viewbox": f"{max_lon},{max_lat},{min_lon},{min_lat}",
+        })
+        data = response.json() if response.status_code == 200 else None
+        if not data:
+            return None
+        return float(data[0]["lat"]), float(data[0]["lon"])
+
+    async def route_distance(self, lat: float, lon: float, dest_lat: float, dest_lon: float) -> float:
+        """Driving distance in meters from (lat, lon) to (dest_lat, dest_lon)."""
+        response = await self._request(f"/directions/driving/{lon},{lat};{dest_lon},{dest_lat}", {})
+        if response.status_code != 200:
+            raise LocationIQUnavailable(f"No route found ({response.status_code})")
+        return float(response.json()["routes"][0]["distance"])
+
+    # ------------------------------------------------------------------ #
+    # Transport
+    # ------------------------------------------------------------------ #
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise LocationIQUnavailable("LocationIQ circuit is open")
+        self.stats["requests"] += 1
+        try:
+            response = await asyncio.wait_for(self._hedged(path, {**params, "key": self.token}), self.timeout)
+        except (asyncio.TimeoutError, LocationIQUnavailable) as e:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise LocationIQUnavailable(f"LocationIQ {path.split('/')[1]} failed: {e!r}") from e
+        except BaseException:
+            # Cancelled by the caller: no verdict on the service, free a half-open trial
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return response
+
+    async def _get(self, endpoint: str, path: str, params: Dict[str, Any]) -> httpx.Response:
+        response = await self.client().get(endpoint + path, params=params)
+        if response.status_code not in (200, 404):
+            raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+        return response
+
+    async def _hedged(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        endpoints = iter(self.endpoints)
+        pending: set = set()
+        errors: List[BaseException] = []
+
+        def launch() -> bool:
+            endpoint = next(endpoints, None)
+            if endpoint is None:
+                return False
+            pending.add(asyncio.create_task(self._get(endpoint, path, params)))
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_seconds,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow endpoint: race the same request on the next one
+                    if launch():
+                        self.stats["hedged"] += 1
+                    continue
+                pending -= done
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+                # A failed endpoint hands over to the next one right away
+                launch()
+            raise LocationIQUnavailable(f"All endpoints failed: {errors!r}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "circuit": self.breaker.state, "consecutive_failures": self.breaker.failures}
+
+
+# Global instance
+locationiq = LocationIQClient()
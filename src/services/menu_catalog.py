@@ -0,0 +1,247 @@
+"""
+Menu catalog for the pizzeria chatbot.
+Loads the menu tables once into memory and serves every menu lookup from RAM,
+reloading the snapshot when its TTL expires or when it is invalidated.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import MENU_CATALOG_TTL_SECONDS, supabase
+from src.services.product_index import ProductIndex
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogTable:
+    """Describes how a Supabase menu table maps into the catalog."""
+    table: str
+    name_field: str
+    price_field: str
+    size_fields: Tuple[str, ...] = ()
+
+
+# kind -> table description
+CATALOG_TABLES: Dict[str, CatalogTable] = {
+    "pizza": CatalogTable("pizzas_armadas", "nombre", "precio", ("tamano",)),
+    "bebida": CatalogTable("bebidas", "nombre_producto", "precio", ("tamano",)),
+    "adicion": CatalogTable("adiciones", "nombre", "precio_adicional", ("tamano_pizza", "tamaño_pizza")),
+    "borde": CatalogTable("bordes", "nombre", "precio_adicional"),
+    "combo": CatalogTable("combos", "nombre", "precio"),
+}
+
+
+@dataclass
+class CatalogItem:
+    """A single menu row with the fields the tools need already parsed."""
+    kind: str
+    id: str
+    nombre: str
+    precio: float
+    tamano: Optional[str]
+    row: Dict[str, Any]
+
+    @classmethod
+    def from_row(cls, kind: str, row: Dict[str, Any]) -> "CatalogItem":
+        spec = CATALOG_TABLES[kind]
+        tamano = next((row[f] for f in spec.size_fields if row.get(f)), None)
+        return cls(
+            kind=kind,
+            id=str(row.get("id", "")),
+            nombre=row.get(spec.name_field) or "",
+            precio=float(row.get(spec.price_field) or 0),
+            tamano=tamano,
+            row=row,
+        )
+
+    @property
+    def aliases(self) -> List[str]:
+        """Name plus every alternative spelling stored in the row."""
+        names = [self.nombre, self.row.get("nombre_original") or ""]
+        names += [value for key, value in sorted(self.row.items())
+                  if key.startswith("variacion_nombre") and value]
+        return names
+
+    def matches_size(self, size: Optional[str]) -> bool:
+        if not size:
+            return True
+        return (self.tamano or "").lower() == size.lower()
+
+
+@dataclass
+class MenuSnapshot:
+    """Immutable view of the whole menu at a given version."""
+    items: Dict[str, List[CatalogItem]] = field(default_factory=dict)
+    by_id: Dict[Tuple[str, str], CatalogItem] = field(default_factory=dict)
+    indexes: Dict[str, ProductIndex] = field(default_factory=dict)
+    version: str = ""
+    loaded_at: float = 0.0
+
+    @classmethod
+    def build(cls, rows_by_kind: Dict[str, List[Dict[str, Any]]]) -> "MenuSnapshot":
+        snapshot = cls(loaded_at=time.monotonic())
+        for kind, rows in rows_by_kind.items():
+            items = [CatalogItem.from_row(kind, row) for row in rows]
+            snapshot.items[kind] = items
+            snapshot.indexes[kind] = ProductIndex([item.aliases for item in items])
+            for item in items:
+                snapshot.by_id[(kind, item.id)] = item
+        payload = json.dumps(rows_by_kind, sort_keys=True, default=str)
+        snapshot.version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+        return snapshot
+
+
+class MenuCatalog:
+    """
+    In-process cache of the menu tables.
+
+    The menu changes rarely, so every table is read once and kept in memory.
+    The snapshot is reloaded after `ttl_seconds`; if the reload fails the
+    previous snapshot keeps serving requests.
+    """
+
+    def __init__(self, client=None, ttl_seconds: float = MENU_CATALOG_TTL_SECONDS):
+        self.client = client or supabase
+        self.ttl_seconds = ttl_seconds
+        self.retry_after_error = 30.0
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Loading
+    # ------------------------------------------------------------------ #
+
+    def _fetch_rows(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Read every menu table (one query per table)."""
+        rows_by_kind = {}
+        for kind, spec in CATALOG_TABLES.items():
+            result = self.client.table(spec.table).select("*").execute()
+            rows_by_kind[kind] = result.data or []
+        return rows_by_kind
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the snapshot if it expired (or always when `force`).
+
+        Returns:
+            bool: True if the menu content changed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._snapshot is not None and now < self._next_refresh:
+                return False
+
+            previous_version = self._snapshot.version if self._snapshot else None
+            try:
+                snapshot = MenuSnapshot.build(self._fetch_rows())
+            except Exception as e:
+                logger.error(f"Error loading menu catalog: {e}")
+                if self._snapshot is None:
+                    raise
+                self._next_refresh = now + self.retry_after_error
+                return False
+
+            self._snapshot = snapshot
+            self._next_refresh = now + self.ttl_seconds
+            changed = snapshot.version != previous_version
+            if changed:
+                counts = {kind: len(items) for kind, items in snapshot.items.items()}
+                logger.info(f"Menu catalog loaded, version {snapshot.version}: {counts}")
+            return changed
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        with self._lock:
+            self._next_refresh = 0.0
+
+    @property
+    def expired(self) -> bool:
+        """True when the next lookup would reload the tables (blocking)."""
+        return self._snapshot is None or time.monotonic() >= self._next_refresh
+
+    def snapshot(self) -> MenuSnapshot:
+        """Current snapshot, reloading it first if the TTL expired."""
+        if self.expired:
+            self.refresh()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot().version
+
+    # ------------------------------------------------------------------ #
+    # Lookups
+    # ------------------------------------------------------------------ #
+
+    def all(self, kind: str) -> List[CatalogItem]:
+        """All items of a kind ("pizza", "bebida", "adicion", "borde", "combo")."""
+        return list(self.snapshot().items.get(kind, []))
+
+    def get(self, kind: str, item_id: str) -> Optional[CatalogItem]:
+        return self.snapshot().by_id.get((kind, str(item_id)))
+
+    def search(self, kind: str, query: str, size: Optional[str] = None,
+               limit: int = 5, min_score: float = 0.3) -> List[Tuple[CatalogItem, float]]:
+        """
+        Ranked fuzzy search (accent- and typo-tolerant) over names and variations.
+
+        Args:
+            kind: Catalog kind
+            query: Text written by the customer
+            size: Optional size filter
+            limit: Maximum number of results (0 for all)
+            min_score: Minimum similarity between 0 and 1
+
+        Returns:
+            List of (item, score) sorted by score, best first
+        """
+        snapshot = self.snapshot()
+        index = snapshot.indexes.get(kind)
+        if index is None:
+            return []
+        items = snapshot.items[kind]
+        ranked = [
+            (items[match.key], match.score)
+            for match in index.search(query, limit=0, min_score=min_score)
+            if items[match.key].matches_size(size)
+        ]
+        return ranked[:limit] if limit else ranked
+
+    def find(self, kind: str, name: str, size: Optional[str] = None) -> List[CatalogItem]:
+        """
+        Find items by name: exact match (ignoring case and accents) first,
+        then fuzzy matches ranked by similarity.
+
+        Args:
+            kind: Catalog kind
+            name: Name to search for
+            size: Optional size filter
+
+        Returns:
+            List of matching items (empty if none)
+        """
+        snapshot = self.snapshot()
+        index = snapshot.indexes.get(kind)
+        if index is None or not (name or "").strip():
+            return []
+
+        items = snapshot.items[kind]
+        exact = [items[key] for key in index.exact(name) if items[key].matches_size(size)]
+        if exact:
+            return exact
+        return [item for item, _ in self.search(kind, name, size, limit=0)]
+
+    def find_one(self, kind: str, name: str, size: Optional[str] = None) -> Optional[CatalogItem]:
+        matches = self.find(kind, name, size)
+        return matches[0] if matches else None
+
+
+# Global instance
+menu_catalog = MenuCatalog()
@@ -0,0 +1,173 @@
+"""
+Pricing engine for the pizzeria chatbot.
+Compiles the menu catalog into a price table keyed by
+(product id, size, border id, addition ids) so order items are priced with
+dictionary lookups, and keeps order totals up to date incrementally.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from src.services.menu_catalog import MenuCatalog, menu_catalog
+
+logger = logging.getLogger(__name__)
+
+# (product id, size, border id, sorted addition ids)
+PriceKey = Tuple[str, str, Optional[str], Tuple[str, ...]]
+
+
+def _size_key(size: Optional[str]) -> str:
+    return (size or "").lower()
+
+
+class PricingEngine:
+    """
+    Price table compiled from the menu catalog.
+
+    The pizza x size x border matrix is precomputed when the catalog version
+    changes; keys with additions are composed from the addition price vector
+    and memoized on first use, so repeated items cost a single lookup.
+    """
+
+    def __init__(self, catalog: MenuCatalog = menu_catalog):
+        self.catalog = catalog
+        self._version: Optional[str] = None
+        self._base: Dict[Tuple[str, str], float] = {}
+        self._borders: Dict[str, float] = {}
+        self._additions: Dict[str, float] = {}
+        self._table: Dict[PriceKey, float] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Compilation
+    # ------------------------------------------------------------------ #
+
+    def _ensure_compiled(self):
+        version = self.catalog.version
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            self._compile()
+            self._version = version
+
+    def _compile(self):
+        base = {}
+        for kind in ("pizza", "bebida", "combo"):
+            for item in self.catalog.all(kind):
+                base[(item.id, _size_key(item.tamano))] = item.precio
+        borders = {item.id: item.precio for item in self.catalog.all("borde")}
+        additions = {item.id: item.precio for item in self.catalog.all("adicion")}
+
+        table: Dict[PriceKey, float] = {}
+        for pizza in self.catalog.all("pizza"):
+            size = _size_key(pizza.tamano)
+            table[(pizza.id, size, None, ())] = pizza.precio
+            for border_id, border_price in borders.items():
+                table[(pizza.id, size, border_id, ())] = pizza.precio + border_price
+        for (product_id, size), price in base.items():
+            table.setdefault((product_id, size, None, ()), price)
+
+        self._base, self._borders, self._additions, self._table = base, borders, additions, table
+        logger.info(f"Price table compiled: {len(table)} entries")
+
+    # ------------------------------------------------------------------ #
+    # Keys
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def make_key(product_id: str, size: Optional[str] = None, border_id: Optional[str] = None,
+                 addition_ids: Iterable[str] = ()) -> PriceKey:
+        return (str(product_id), _size_key(size), str(border_id) if border_id else None,
+                tuple(sorted(str(a) for a in addition_ids)))
+
+    @classmethod
+    def item_key(cls, item: Dict[str, Any]) -> Optional[PriceKey]:
+        """Build the price key of a stored order item (None if it has no product id)."""
+        product_id = item.get("id_producto") or item.get("product_id")
+        if not product_id:
+            return None
+        border = item.get("borde") or {}
+        additions = [a.get("id") for a in item.get("adiciones") or []]
+        if any(a is None for a in additions):
+            return None
+        return cls.make_key(product_id, item.get("tamaño") or item.get("tamano"), border.get("id"), additions)
+
+    # ------------------------------------------------------------------ #
+    # Pricing
+    # ------------------------------------------------------------------ #
+
+    def price(self, key: PriceKey) -> Optional[float]:
+        """Price of a key, or None if any component is not on the menu."""
+        self._ensure_compiled()
+        cached = self._table.get(key)
+        if cached is not None:
+            return cached
+
+        product_id, size, border_id, addition_ids = key
+        base = self._table.get((product_id, size, border_id, ()))
+        if base is None:
+            return None
+        total = base
+        for addition_id in addition_ids:
+            addition_price = self._additions.get(addition_id)
+            if addition_price is None:
+                return None
+            total += addition_price
+        self._table[key] = total
+        return total
+
+    def price_item(self, item: Dict[str, Any]) -> float:
+        """
+        Price of a stored order item.
+
+        Uses the price table when every component is still on the menu, and
+        falls back to the price stored in the item otherwise.
+        """
+        key = self.item_key(item)
+        price = self.price(key) if key else None
+        if price is not None:
+            return price
+        return stored_item_price(item)
+
+    def price_many(self, entries: Sequence[Union[PriceKey, Dict[str, Any]]]) -> List[float]:
+        """
+        Price a batch of keys or stored order items in one pass.
+
+        Intended for bulk repricing (e.g. every active order after a menu
+        change): the table is compiled once and each entry is a lookup.
+        """
+        self._ensure_compiled()
+        prices = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                prices.append(self.price_item(entry))
+            else:
+                price = self.price(entry)
+                prices.append(price if price is not None else 0.0)
+        return prices
+
+    def reprice_items(self, items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+        """Return copies of `items` with refreshed `precio_total`, plus the order total."""
+        prices = self.price_many(items)
+        repriced = [dict(item, precio_total=price) for item, price in zip(items, prices)]
+        return repriced, round(sum(prices), 2)
+
+
+def stored_item_price(item: Dict[str, Any]) -> float:
+    """Price saved in an order item (current and legacy field names)."""
+    for field_name in ("precio_total", "total_price", "precio", "precio_base", "base_price"):
+        if item.get(field_name) is not None:
+            return float(item[field_name])
+    return 0.0
+
+
+def adjust_total(total: Optional[float], added: Iterable[float] = (), removed: Iterable[float] = ()) -> float:
+    """Incrementally update an order total instead of recomputing it from every item."""
+    return round(float(total or 0) + sum(added) - sum(removed), 2)
+
+
+# Global instance
+pricing_engine = PricingEngine()
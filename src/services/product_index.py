@@ -0,0 +1,120 @@
+"""
+Fuzzy product name index for the menu catalog.
+Accent- and typo-tolerant trigram search over product names and their
+variations, computed once per catalog snapshot and queried locally.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation ("Jamón-Queso" -> "jamon queso")."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM_RE.sub(" ", without_accents.lower()).strip()
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Word trigrams padded like pg_trgm ("  pizza " -> "  p", " pi", "piz", ...)."""
+    grams = set()
+    for token in normalized.split():
+        padded = f"  {token} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+@dataclass(frozen=True)
+class IndexMatch:
+    """A ranked search hit."""
+    key: int
+    score: float
+    alias: str
+
+
+class ProductIndex:
+    """
+    Trigram inverted index over a list of documents.
+
+    Each document is identified by an integer key (its position in the list
+    passed to the constructor) and can have several aliases (name, original
+    name, `variacion_nombre_*` columns). A query is scored against the best
+    alias of each document.
+    """
+
+    def __init__(self, documents: Sequence[Iterable[str]]):
+        self._aliases: List[Tuple[int, str, Set[str], Set[str]]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+
+        for key, names in enumerate(documents):
+            seen = set()
+            for name in names:
+                normalized = normalize_text(name)
+                if not normalized or normalized in seen:
+                    continue
+                seen.add(normalized)
+                alias_id = len(self._aliases)
+                grams = trigrams(normalized)
+                self._aliases.append((key, normalized, grams, set(normalized.split())))
+                self._exact[normalized].append(key)
+                for gram in grams:
+                    self._postings[gram].append(alias_id)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def exact(self, query: str) -> List[int]:
+        """Keys whose normalized alias equals the normalized query."""
+        return list(dict.fromkeys(self._exact.get(normalize_text(query), [])))
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.3) -> List[IndexMatch]:
+        """
+        Rank documents by trigram similarity to the query.
+
+        The score is the best of the Jaccard similarity and the fraction of the
+        query covered by the alias (so "coca" still finds "coca cola 400ml").
+        Exact normalized matches always score 1.0, and numbers in the query
+        must appear in the alias.
+
+        Returns:
+            List of IndexMatch sorted by score (best first), one per key
+        """
+        normalized = normalize_text(query)
+        if not normalized:
+            return []
+
+        query_grams = trigrams(normalized)
+        query_tokens = set(normalized.split())
+        query_numbers = {token for token in query_tokens if token.isdigit()}
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for alias_id in self._postings.get(gram, ()):
+                shared[alias_id] += 1
+
+        best: Dict[int, IndexMatch] = {}
+        for alias_id, count in shared.items():
+            key, alias, alias_grams, alias_tokens = self._aliases[alias_id]
+            if not query_numbers <= alias_tokens:
+                # "combo 2" must never match "combo 1"
+                continue
+            if alias == normalized:
+                score = 1.0
+            else:
+                jaccard = count / (len(query_grams) + len(alias_grams) - count)
+                coverage = count / len(query_grams)
+                score = max(jaccard, 0.9 * coverage if query_tokens <= alias_tokens else 0.8 * coverage)
+                score = min(score, 0.99)
+            if score >= min_score and (key not in best or score > best[key].score):
+                best[key] = IndexMatch(key=key, score=score, alias=alias)
+
+        ranked = sorted(best.values(), key=lambda match: (-match.score, match.key))
+        return ranked[:limit] if limit else ranked
@@ -4,7 +4,9 @@ from typing import List
 from langchain_core.tools import tool
 from pydantic.v1.errors import NoneIsAllowedError
 
-from config.settings import supabase
+from src.services.database import customers, orders
+from src.services.menu_catalog import menu_catalog
+from src.services.pricing import adjust_total, pricing_engine, stored_item_price
 
 #=========================================================#
 #---------------------- ORDER TOOLS ----------------------#
@@ -22,9 +24,9 @@ def get_order_by_id(cliente_id: str) -> dict:
         dict: Datos del pedido si existe
     """
     try:
-        result = supabase.table("pedidos_activos").select("*").eq("cliente_id", cliente_id).execute()
-        if result.data:
-            return {"success": "Pedido encontrado", "data": result.data[0]}
+        order = orders.get_active_sync(cliente_id)
+        if order:
+            return {"success": "Pedido encontrado", "data": order}
         else:
             return {"fail": f"Pedido con ID {cliente_id} no encontrado"}
     except Exception as e:
@@ -47,13 +49,9 @@ def update_order_info(id: int, direccion_entrega: str = None, metodo_pago: str =
     """
     try:
         # Primero obtener el pedido actual para preservar los datos existentes
-        current_order = supabase.table("pedidos_activos").select("*").eq("id", id).execute()
-        if not current_order.data:
+        if not orders.get_sync(id):
             return {"error": "Pedido no encontrado"}
         
-        current_data = current_order.data[0]
-        current_pedido = current_data.get("pedido", {})
-        
         update_data = {}
         
         # Actualizar campos directos
@@ -67,8 +65,8 @@ def update_order_info(id: int, direccion_entrega: str = None, metodo_pago: str =
         if not update_data:
             return {"error": "No se proporcionaron datos para actualizar"}
         
-        result = supabase.table("pedidos_activos").update(update_data).eq("id", id).execute()
-        return {"success": "Pedido actualizado exitosamente", "data": result.data}
+        updated = orders.update_sync(id, update_data)
+        return {"success": "Pedido actualizado exitosamente", "data": updated}
     except Exception as e:
         return {"error": f"Error al actualizar pedido: {str(e)}"}
 
@@ -77,12 +75,26 @@ def update_order_info(id: int, direccion_entrega: str = None, metodo_pago: str =
 def delete_order(id: int) -> dict:
     """Elimina un pedido activo"""
     try:
-        result = supabase.table("pedidos_activos").delete().eq("id", id).execute()
+        orders.delete_sync(id)
         return {"success": "Pedido eliminado exitosamente"}
     except Exception as e:
         return {"error": f"Error al eliminar pedido: {str(e)}"}
 
 
+def _order_items(order: dict) -> list:
+    """Productos de un pedido activo (formato actual o formato legado en pedido.items)."""
+    if order.get("productos") is not None:
+        return order.get("productos") or []
+    return (order.get("pedido") or {}).get("items", [])
+
+
+def _order_total(order: dict, items: list) -> float:
+    """Total guardado del pedido; solo se recalcula si el pedido no lo tiene."""
+    if order.get("total") is not None:
+        return float(order["total"])
+    return round(sum(pricing_engine.price_many(items)), 2)
+
+
 @tool
 def get_order_total(id: int, items: list = None) -> dict:
     """
@@ -96,28 +108,118 @@ def get_order_total(id: int, items: list = None) -> dict:
         dict: Resultado con el total del pedido
     """
     try:
-        result = supabase.table("pedidos_activos").select("*").eq("id", id).execute()
-        if not result.data:
+        order_data = orders.get_sync(id)
+        if not order_data:
             return {"error": f"Pedido con ID {id} no encontrado"}
             
-        order_data = result.data[0]
-        order_items = order_data.get("pedido", {}).get("items", [])
-        
-        total = 0
-        for item in order_items:
-            # Use total_price if available, otherwise use precio or base_price
-            item_price = item.get("total_price", item.get("precio", item.get("base_price", 0)))
-            total += float(item_price)
+        total = _order_total(order_data, _order_items(order_data))
             
         return {"success": "Total del pedido obtenido exitosamente", "data": total}
     except Exception as e:
         return {"error": f"Error al obtener total del pedido: {str(e)}"}
 
 
+def resolve_products(product_data: list[dict]) -> tuple[list, list[dict]]:
+    """
+    Resuelve en una sola pasada todos los productos de una solicitud contra el
+    catálogo del menú en memoria (sin consultas a la base de datos).
+    
+    Args:
+        product_data: Lista de diccionarios con tipo_producto, nombre, tamaño (pizzas),
+                      borde (opcional) y adiciones (opcional, string o lista)
+        
+    Returns:
+        tuple: (productos resueltos como ProductDetails, errores por producto)
+    """
+    from src.core.state import ProductDetails
+
+    resolved = []
+    errors = []
+    
+    for new_product in product_data:
+        tipo = new_product.get("tipo_producto")
+        nombre = new_product.get("nombre", "")
+        
+        if tipo == "pizza":
+            tamaño = new_product.get("tamaño")
+            if not tamaño:
+                errors.append({"error": f"No se proporcionó el tamaño de la pizza '{nombre}'"})
+                continue
+            
+            pizza = menu_catalog.find_one("pizza", nombre, tamaño)
+            if not pizza:
+                errors.append({"error": f"Pizza '{nombre}' ({tamaño}) no encontrada"})
+                continue
+            
+            product = ProductDetails(
+                id_producto=pizza.id,
+                nombre=pizza.nombre,
+                tipo=pizza.row.get("tipo") or "pizza",
+                tamaño=pizza.tamano or tamaño,
+                precio_base=pizza.precio,
+                precio_total=pizza.precio
+            )
+            
+            if new_product.get("borde"):
+                borde = menu_catalog.find_one("borde", new_product["borde"])
+                if not borde:
+                    errors.append({"error": f"Borde '{new_product['borde']}' no encontrado"})
+                    continue
+                product.borde = {
+                    "id": borde.id,
+                    "nombre": borde.nombre,
+                    "precio_adicional": borde.precio
+                }
+                product.precio_total += borde.precio
+            
+            adiciones = new_product.get("adiciones") or []
+            if isinstance(adiciones, str):
+                adiciones = [adiciones]
+            missing = None
+            for nombre_adicion in adiciones:
+                adicion = menu_catalog.find_one("adicion", nombre_adicion, tamaño)
+                if not adicion:
+                    missing = nombre_adicion
+                    break
+                product.adiciones.append({
+                    "id": adicion.id,
+                    "nombre": adicion.nombre,
+                    "ingrediente_id": adicion.row.get("ingrediente_id"),
+                    "tamaño_pizza": adicion.tamano,
+                    "precio_adicional": adicion.precio
+                })
+                product.precio_total += adicion.precio
+            if missing is not None:
+                errors.append({"error": f"Adición '{missing}' no encontrada para tamaño {tamaño}"})
+                continue
+        
+        elif tipo == "bebida":
+            bebida = menu_catalog.find_one("bebida", nombre, new_product.get("tamaño"))
+            if not bebida:
+                errors.append({"error": f"Bebida '{nombre}' no encontrada"})
+                continue
+            product = ProductDetails(
+                id_producto=bebida.id,
+                nombre=bebida.nombre,
+                tipo="bebida",
+                tamaño=bebida.tamano or "",
+                precio_base=bebida.precio,
+                precio_total=bebida.precio
+            )
+        
+        else:
+            errors.append({"error": f"Tipo de producto no válido: {tipo}"})
+            continue
+        
+        resolved.append(product)
+    
+    return resolved, errors
+
+
 @tool
 def add_products_to_order(cliente_id: str, product_data: list[dict]) -> dict:
     """
-    Agrega un producto estructurado al pedido activo de un cliente.
+    Agrega uno o varios productos estructurados al pedido activo de un cliente.
     
     Args:
         cliente_id: ID del cliente (string)
@@ -127,106 +229,50 @@ def add_products_to_order(cliente_id: str, product_data: list[dict]) -> dict:
         dict: Resultado de la operación
         
     Example:
-        add_product_to_order(
+        add_products_to_order(
             "7315133184",
             [{"tipo_producto": "pizza", "nombre": "pepperoni", "tamaño": "large", "borde": "pesto", "adiciones": []},
              {"tipo_producto": "bebida", "nombre": "coca cola"}]
         )
     """
     try:
-        from src.core.state import ProductDetails
-
-        # Get or create active order
+        # Resolver todos los productos contra el catálogo antes de tocar la base de datos
+        new_products, errors = resolve_products(product_data)
+        if not new_products:
+            return {"error": "No se pudo agregar ningún producto al pedido", "data": errors}
+        
+        new_items = [product.model_dump() for product in new_products]
+        added_total = sum(product.precio_total for product in new_products)
+        
+        # Get or create active order (una sola escritura final)
         pedido_activo = get_order_by_id.invoke({"cliente_id": cliente_id})
         
-        if "fail" in pedido_activo or "error" in pedido_activo:
-            # Create new order if none exists   
-            pedido_activo = supabase.table("pedidos_activos").insert({"cliente_id": cliente_id, "productos": [], "total": 0.0}).execute().data[0]
-
-        order_id = pedido_activo["id"]
-        productos_actual= pedido_activo.get("productos", [])
-        answer_message = []
+        if "success" in pedido_activo:
+            current_order = pedido_activo["data"]
+            productos_actual = (current_order.get("productos") or []) + new_items
+            total = adjust_total(current_order.get("total"), added=[added_total])
+            saved = orders.update_sync(current_order["id"], {"productos": productos_actual, "total": total})
+        elif "fail" in pedido_activo:
+            saved = orders.create_sync({"cliente_id": cliente_id, "productos": new_items, "total": added_total})
+            saved = [saved] if saved else []
+        else:
+            return pedido_activo
         
-        for new_product in product_data:
-    
-                if new_product["tipo_producto"] == "pizza":
-                    
-                    if "tamaño" in new_product:
-                        pizza = get_pizza_by_name_and_size.invoke({"nombre": new_product["nombre"], "tamaño": new_product["tamaño"]})
-                        if "error" in pizza:
-                            answer_message.append({"error": f"Error al obtener pizza: {str(pizza['error'])}"})
-                            continue
-                    else:
-                        answer_message.append({"error": "No se proporcionó el tamaño de la pizza"})
-                        continue
-                    
-                    add_product=ProductDetails(
-                        id_producto=pizza.get("data").get("id"),
-                        nombre=pizza.get("data").get("nombre"),
-                        tipo=pizza.get("data").get("tipo"),
-                        precio_base=pizza.get("data").get("precio"),
-                        precio_total=pizza.get("data").get("precio")
-                    )
-                    
-                    if "borde" in new_product:
-                        borde = get_border_by_name.invoke({"nombre": new_product["borde"]})
-                        if "error" in borde:
-                            answer_message.append({"error": f"Error al obtener borde: {str(borde['error'])}"})
-                            continue
-                        add_product.borde = {
-                            "id": borde.get("data").get("id"),
-                            "nombre": borde.get("data").get("nombre"),
-                            "precio_adicional": borde.get("data").get("precio_adicional")
-                        }
-                        add_product.precio_total += borde.get("data").get("precio_adicional")   
-                    
-                    if "adiciones" in new_product:
-                        adiciones = get_adition_by_name_and_size.invoke({"nombre": new_product["adiciones"], "tamaño": new_product["tamaño"]})
-                        if "error" in adiciones:
-                            answer_message.append({"error": f"Error al obtener adiciones: {str(adiciones['error'])}"})
-                            continue
-                        add_product.adiciones.append({
-                            "id": adiciones.get("data").get("id"),
-                            "nombre": adiciones.get("data").get("nombre"),
-                            "ingrediente_id": adiciones.get("data").get("ingrediente_id"),
-                            "tamaño_pizza": adiciones.get("data").get("tamaño_pizza"),
-                            "precio_adicional": adiciones.get("data").get("precio_adicional")
-                        })
-                        add_product.precio_total += adiciones.get("data").get("precio_adicional")   
-                
-                elif new_product["tipo_producto"] == "bebida":
-                    bebida = get_beverage_by_name.invoke({"nombre": new_product["nombre"]})
-                    if "error" in bebida:
-                        answer_message.append({"error": f"Error al obtener bebida: {str(bebida['error'])}"})
-                        continue
-                    add_product=ProductDetails(
-                        id_producto=bebida.get("data").get("id"),
-                        nombre=bebida.get("data").get("nombre"),
-                        tipo=bebida.get("data").get("tipo"),
-                        precio_base=bebida.get("data").get("precio"),
-                        precio_total=bebida.get("data").get("precio")
-                    )
-                else:
-                    answer_message.append({"error": f"Tipo de producto no válido: {new_product['tipo_producto']}"})
-                    continue
-                
-                # Agregar a productos del pedido actual
-                productos_actual.append(add_product)
-                
-                # Actualizar pedido en base de datos
-                pedido_actualizado = supabase.table("pedidos_activos").update({"productos": productos_actual}).eq("id", order_id).execute()
-                if "error" in pedido_actualizado:
-                    answer_message.append({"error": f"Error al actualizar pedido: {str(pedido_actualizado['error'])}"})
-                    continue
-                elif "success" in pedido_actualizado:
-                    answer_message.append({"success": f"Producto '{add_product.nombre}' agregado exitosamente al pedido", "data": pedido_actualizado.data[0]})
-                else:
-                    answer_message.append({"error": f"Error al actualizar pedido: {str(pedido_actualizado['error'])}"})
-                    continue
-        return answer_message
+        if not saved:
+            return {"error": "Error al actualizar pedido", "data": errors}
+        
+        nombres = ", ".join(product.nombre for product in new_products)
+        return {
+            "success": f"Productos agregados exitosamente al pedido: {nombres}",
+            "data": {
+                "pedido": saved[0],
+                "productos_agregados": new_items,
+                "errores": errors
+            }
+        }
             
     except Exception as e:
-        return {"error": f"Error al obtener producto: {str(e)}"}
+        return {"error": f"Error al agregar productos: {str(e)}"}
 
 
 @tool
@@ -245,35 +291,37 @@ def remove_product_from_order(cliente_id: str, product_id: str) -> dict:
         # Get active order
         active_order = get_order_by_id.invoke({"cliente_id": cliente_id})
         
-        if "error" in active_order:
+        if "success" not in active_order:
             return {"error": "No hay pedido activo para este cliente"}
         
+        active_order = active_order["data"]
         order_id = active_order["id"]
-        current_pedido = active_order.get("pedido", {})
-        current_items = current_pedido.get("items", [])
+        current_items = _order_items(active_order)
         
-        # Find and remove the product
-        updated_items = []
+        # Find and remove the product (only the first match)
+        updated_items = list(current_items)
         removed_product = None
         
-        for item in current_items:
-            if str(item.get("product_id", item.get("id", ""))) == str(product_id):
-                removed_product = item
-            else:
-                updated_items.append(item)
+        for index, item in enumerate(current_items):
+            if str(item.get("id_producto", item.get("product_id", item.get("id", "")))) == str(product_id):
+                removed_product = updated_items.pop(index)
+                break
         
         if not removed_product:
             return {"error": f"Producto con ID {product_id} no encontrado en el pedido"}
         
-        # Calculate new total
-        new_total = sum(item.get("total_price", item.get("precio", 0)) for item in updated_items)
+        # Update the total incrementally
+        new_total = adjust_total(
+            _order_total(active_order, current_items),
+            removed=[stored_item_price(removed_product)]
+        )
         
         # Update the order
-        update_result = supabase.table("pedidos_activos").update({"id": order_id, "productos": updated_items, "total": new_total}).eq("id", order_id).execute()
+        updated = orders.update_sync(order_id, {"productos": updated_items, "total": new_total})
         
-        if update_result.data:
+        if updated:
             return {
-                "success": f"Producto '{removed_product.get('product_name', removed_product.get('nombre', 'Unknown'))}' removido exitosamente del pedido",
+                "success": f"Producto '{removed_product.get('nombre', removed_product.get('product_name', 'Unknown'))}' removido exitosamente del pedido",
                 "data": {
                     "removed_product": removed_product,
                     "order_total": new_total,
@@ -281,7 +329,7 @@ def remove_product_from_order(cliente_id: str, product_id: str) -> dict:
                 }
             }
         else:
-            return update_result
+            return {"error": "Error al actualizar pedido"}
             
     except Exception as e:
         return {"error": f"Error al remover producto del pedido: {str(e)}"}
@@ -305,88 +353,94 @@ def modify_product_from_order(cliente_id: str, product_id: str, new_borde: dict
         # Get active order
         active_order = get_order_by_id.invoke({"cliente_id": cliente_id})
         
-        if "error" in active_order:
+        if "success" not in active_order:
             return {"error": "No hay pedido activo para este cliente"}
         
+        active_order = active_order["data"]
         order_id = active_order["id"]
-        current_pedido = active_order.get("pedido", {})
-        current_items = current_pedido.get("items", [])
+        current_items = _order_items(active_order)
         
-        # Find and update the product
-        updated_items = []
-        updated_product = None
-        
-        for item in current_items:
-            if str(item.get("product_id", item.get("id", ""))) == str(product_id):
-                # This is the product to update
-                updated_item = item.copy()
-                
-                # Recalculate price starting from base price
-                base_price = float(updated_item.get("base_price", updated_item.get("precio", 0)))
-                new_total_price = base_price
-                
-                # Update borde if provided and product is pizza
-                if new_borde is not None and updated_item.get("product_type", updated_item.get("tipo", "")).lower() == "pizza":
-                    updated_item["borde"] = {
-                        "nombre": new_borde.get("nombre", ""),
-                        "precio_adicional": float(new_borde.get("precio_adicional", 0))
-                    }
-                    new_total_price += updated_item["borde"]["precio_adicional"]
-                else:
-                    # Keep existing borde if not updating
-                    existing_borde = updated_item.get("borde", {})
-                    if existing_borde and existing_borde.get("precio_adicional"):
-                        new_total_price += float(existing_borde["precio_adicional"])
-                
-                # Update adiciones if provided and product is pizza
-                if new_adiciones is not None and updated_item.get("product_type", updated_item.get("tipo", "")).lower() == "pizza":
-                    updated_item["adiciones"] = []
-                    for adicion in new_adiciones:
-                        adicion_data = {
-                            "nombre": adicion.get("nombre", ""),
-                            "precio_adicional": float(adicion.get("precio_adicional", 0))
-                        }
-                        updated_item["adiciones"].append(adicion_data)
-                        new_total_price += adicion_data["precio_adicional"]
-                else:
-                    # Keep existing adiciones if not updating
-                    existing_adiciones = updated_item.get("adiciones", [])
-                    for adicion in existing_adiciones:
-                        if adicion.get("precio_adicional"):
-                            new_total_price += float(adicion["precio_adicional"])
-                
-                # Update prices
-                updated_item["total_price"] = new_total_price
-                updated_item["precio"] = new_total_price  # For compatibility
-                
-                updated_items.append(updated_item)
-                updated_product = updated_item
-            else:
-                updated_items.append(item)
-        
-        if not updated_product:
+        # Find the product to update (only the first match)
+        index = next(
+            (i for i, item in enumerate(current_items)
+             if str(item.get("id_producto", item.get("product_id", item.get("id", "")))) == str(product_id)),
+            None
+        )
+        if index is None:
             return {"error": f"Producto con ID {product_id} no encontrado en el pedido"}
         
-        # Calculate new order total
-        new_total = sum(item.get("total_price", item.get("precio", 0)) for item in updated_items)
+        original_item = current_items[index]
+        updated_item = dict(original_item)
+        is_pizza = updated_item.get("tipo", updated_item.get("product_type", "")).lower() == "pizza"
+        tamaño = updated_item.get("tamaño", updated_item.get("tamano"))
+        
+        # Update borde if provided and product is pizza
+        if new_borde is not None and is_pizza:
+            borde = menu_catalog.find_one("borde", new_borde.get("nombre", "")) if new_borde.get("nombre") else None
+            if borde:
+                updated_item["borde"] = {"id": borde.id, "nombre": borde.nombre, "precio_adicional": borde.precio}
+            elif new_borde.get("nombre"):
+                updated_item["borde"] = {
+                    "nombre": new_borde.get("nombre", ""),
+                    "precio_adicional": float(new_borde.get("precio_adicional", 0))
+                }
+            else:
+                updated_item["borde"] = {}
+        
+        # Update adiciones if provided and product is pizza
+        if new_adiciones is not None and is_pizza:
+            updated_item["adiciones"] = []
+            for adicion in new_adiciones:
+                found = menu_catalog.find_one("adicion", adicion.get("nombre", ""), tamaño)
+                if found:
+                    updated_item["adiciones"].append({
+                        "id": found.id,
+                        "nombre": found.nombre,
+                        "ingrediente_id": found.row.get("ingrediente_id"),
+                        "tamaño_pizza": found.tamano,
+                        "precio_adicional": found.precio
+                    })
+                else:
+                    updated_item["adiciones"].append({
+                        "nombre": adicion.get("nombre", ""),
+                        "precio_adicional": float(adicion.get("precio_adicional", 0))
+                    })
+        
+        # Price from the compiled table; manual sum only for components off the menu
+        key = pricing_engine.item_key(updated_item)
+        new_item_price = pricing_engine.price(key) if key else None
+        if new_item_price is None:
+            new_item_price = float(updated_item.get("precio_base", updated_item.get("base_price", 0)))
+            new_item_price += float((updated_item.get("borde") or {}).get("precio_adicional") or 0)
+            new_item_price += sum(float(a.get("precio_adicional") or 0) for a in updated_item.get("adiciones") or [])
+        updated_item["precio_total"] = new_item_price
+        
+        updated_items = list(current_items)
+        updated_items[index] = updated_item
+        
+        # Update the total incrementally
+        new_total = adjust_total(
+            _order_total(active_order, current_items),
+            added=[new_item_price],
+            removed=[stored_item_price(original_item)]
+        )
         
         # Update the order
-        update_result = supabase.table("pedidos_activos").update({
-            "id": order_id,
-            "items": updated_items,
+        updated = orders.update_sync(order_id, {
+            "productos": updated_items,
             "total": new_total
-        }).eq("id", order_id).execute()
+        })
         
-        if update_result.data:
+        if updated:
             return {
-                "success": f"Producto '{updated_product.data[0].get('product_name', updated_product.data[0].get('nombre', 'Unknown'))}' actualizado exitosamente",
+                "success": f"Producto '{updated_item.get('nombre', updated_item.get('product_name', 'Unknown'))}' actualizado exitosamente",
                 "data": {
-                    "updated_product": updated_product.data[0],
+                    "updated_product": updated_item,
                     "order_total": new_total
                 }
             }
         else:
-            return update_result
+            return {"error": "Error al actualizar pedido"}
             
     except Exception as e:
         return {"error": f"Error al actualizar producto en el pedido: {str(e)}"}
@@ -407,23 +461,25 @@ def calculate_order_total(cliente_id: str) -> dict:
         # Get active order
         active_order = get_order_by_id.invoke({"cliente_id": cliente_id})
         
-        if "error" in active_order:
+        if "success" not in active_order:
             return {"error": "No hay pedido activo para este cliente"}
         
-        current_pedido = active_order.get("pedido", {})
-        current_items = current_pedido.get("items", [])
+        active_order = active_order["data"]
+        current_items = _order_items(active_order)
+        repriced_items, total = pricing_engine.reprice_items(current_items)
         
-        total = 0
-        items_breakdown = []
+        # Persist the repriced total so get_order_total/get_order_details report the same amount
+        if total != _order_total(active_order, current_items) or repriced_items != current_items:
+            if not orders.update_sync(active_order["id"], {"productos": repriced_items, "total": total}):
+                return {"error": "Error al actualizar el total del pedido"}
         
-        for item in current_items:
-            item_total = float(item.get("total_price", item.get("precio", item.get("base_price", 0))))
-            total += item_total
-            
+        items_breakdown = []
+        for item in repriced_items:
+            item_total = item["precio_total"]
             # Create breakdown for this item
             breakdown = {
-                "product_name": item.get("product_name", item.get("nombre", "Unknown")),
-                "base_price": float(item.get("base_price", item.get("precio", 0))),
+                "product_name": item.get("nombre", item.get("product_name", "Unknown")),
+                "base_price": float(item.get("precio_base", item.get("base_price", item.get("precio", 0)))),
                 "total_price": item_total,
                 "borde": item.get("borde", {}),
                 "adiciones": item.get("adiciones", [])
@@ -434,7 +490,7 @@ def calculate_order_total(cliente_id: str) -> dict:
             "success": "Total del pedido calculado exitosamente",
             "data": {
                 "total": total,
-                "items_count": len(current_items),
+                "items_count": len(repriced_items),
                 "items_breakdown": items_breakdown,
                 "order_id": active_order["id"]
             }
@@ -459,30 +515,30 @@ def get_order_details(cliente_id: str) -> dict:
         # Get active order
         active_order = get_order_by_id.invoke({"cliente_id": cliente_id})
         
-        if "error" in active_order:
+        if "success" not in active_order:
             return {"error": "No hay pedido activo para este cliente"}
         
-        current_pedido = active_order.get("pedido", {})
-        current_items = current_pedido.get("items", [])
+        active_order = active_order["data"]
+        current_items = _order_items(active_order)
         
-        # Calculate total
-        total = sum(float(item.get("total_price", item.get("precio", 0))) for item in current_items)
+        # Stored total (maintained incrementally by the order tools)
+        total = _order_total(active_order, current_items)
         
         # Format products for display
         formatted_products = []
         for item in current_items:
             product_info = {
-                "id": item.get("product_id", item.get("id", "")),
-                "name": item.get("product_name", item.get("nombre", "")),
-                "type": item.get("product_type", item.get("tipo", "")),
-                "base_price": float(item.get("base_price", 0)),
-                "total_price": float(item.get("total_price", item.get("precio", 0))),
+                "id": item.get("id_producto", item.get("product_id", item.get("id", ""))),
+                "name": item.get("nombre", item.get("product_name", "")),
+                "type": item.get("tipo", item.get("product_type", "")),
+                "base_price": float(item.get("precio_base", item.get("base_price", 0))),
+                "total_price": stored_item_price(item),
                 "customizations": {
                     "borde": item.get("borde", {}),
                     "adiciones": item.get("adiciones", [])
                 },
                 "details": {
-                    "tamano": item.get("tamano", ""),
+                    "tamano": item.get("tamaño", item.get("tamano", "")),
                     "categoria": item.get("categoria", ""),
                     "descripcion": item.get("descripcion", "")
                 }
@@ -521,11 +577,10 @@ def finish_order(cliente_id: str) -> dict:
     """
     try:
         # Primero obtener el pedido activo del cliente
-        current_order = supabase.table("pedidos_activos").select("*").eq("cliente_id", cliente_id).execute()
-        if not current_order.data:
+        order_data = orders.get_active_sync(cliente_id)
+        if not order_data:
             return {"error": "No hay pedido activo para este cliente"}
         
-        order_data = current_order.data[0]
         order_id = order_data["id"]
         
         # Preparar datos para pedidos_finalizados (sin el ID auto-increment)
@@ -539,8 +594,7 @@ def finish_order(cliente_id: str) -> dict:
         }
         
         # Mover a pedidos finalizados y eliminar de activos
-        supabase.table("pedidos_finalizados").insert(finalized_data).execute()
-        supabase.table("pedidos_activos").delete().eq("id", order_id).execute()
+        orders.archive_sync(order_id, finalized_data)
         
         return {"success": "Pedido finalizado exitosamente"}
     except Exception as e:
@@ -567,9 +621,9 @@ def get_client_by_id(cliente_id: str) -> dict:
         get_client_by_id("7315133184")
     """
     try:
-        result = supabase.table("clientes").select("*").eq("id", cliente_id).execute()
-        if result.data:
-            return result.data[0]
+        customer = customers.get_sync(cliente_id)
+        if customer:
+            return customer
         else:
             return {"error": f"Cliente con ID {cliente_id} no encontrado"}
     except Exception as e:
@@ -608,8 +662,8 @@ def update_client(id: str, nombre:str = None, apellido: str = None, telefono: st
         if not update_data:
             return {"error": "No se proporcionaron datos para actualizar"}
         
-        result = supabase.table("clientes").update(update_data).eq("id", id).execute()
-        return {"success": "Cliente actualizado exitosamente", "data": result.data}
+        updated = customers.update_sync(id, update_data)
+        return {"success": "Cliente actualizado exitosamente", "data": updated}
     except Exception as e:
         return {"error": f"Error al actualizar cliente: {str(e)}"}
 
@@ -621,7 +675,7 @@ def update_client(id: str, nombre:str = None, apellido: str = None, telefono: st
 @tool
 def get_pizza_by_name(name: str) -> dict:
     """
-    Obtiene una pizza por su nombre desde la base de datos.
+    Obtiene una pizza por su nombre desde el catálogo del menú.
     
     Args:
         name: Nombre de la pizza a buscar (ej: "pepperoni", "hawaiana", "margherita")
@@ -633,15 +687,10 @@ def get_pizza_by_name(name: str) -> dict:
         get_pizza_by_name("pepperoni")
     """
     try:
-        # Buscar con nombre exacto primero
-        result = supabase.table("pizzas_armadas").select("*").eq("nombre", name).execute()
-        
-        if not result.data:
-            # Buscar con ilike para mayor flexibilidad
-            result = supabase.table("pizzas_armadas").select("*").ilike("nombre", f"%{name}%").execute()
+        result = menu_catalog.find("pizza", name)
         
-        if result.data:
-            return {"success": "Pizza encontrada", "data": result.data}
+        if result:
+            return {"success": "Pizza encontrada", "data": [item.row for item in result]}
         else:
             return {"error": f"Pizza '{name}' no encontrada"}
     except Exception as e:
@@ -651,7 +700,7 @@ def get_pizza_by_name(name: str) -> dict:
 @tool
 def get_pizza_by_name_and_size(name: str, size: str) -> dict:
     """
-    Obtiene una pizza por su nombre desde la base de datos.
+    Obtiene una pizza por su nombre y tamaño desde el catálogo del menú.
     
     Args:
         name: Nombre de la pizza a buscar (ej: "pepperoni", "hawaiana", "margherita")
@@ -663,15 +712,10 @@ def get_pizza_by_name_and_size(name: str, size: str) -> dict:
         get_pizza_by_name_and_size("pepperoni", "Small")
     """
     try:
-        # Buscar con nombre exacto primero
-        result = supabase.table("pizzas_armadas").select("*").eq("nombre", name).eq("tamano", size).execute()
-        
-        if not result.data:
-            # Buscar con ilike para mayor flexibilidad
-            result = supabase.table("pizzas_armadas").select("*").ilike("nombre", f"%{name}%").eq("tamano", size).execute()
+        result = menu_catalog.find("pizza", name, size)
         
-        if result.data:
-            return {"success": "Pizza encontrada", "data": result.data}
+        if result:
+            return {"success": "Pizza encontrada", "data": [item.row for item in result]}
         else:
             return {"error": f"Pizza '{name}' no encontrada"}
     except Exception as e:
@@ -681,7 +725,7 @@ def get_pizza_by_name_and_size(name: str, size: str) -> dict:
 @tool
 def get_combos(self) -> list[dict]:
     """
-    Obtiene todos los combos disponibles en la base de datos.
+    Obtiene todos los combos disponibles en el menú.
     
     Returns:
         dict: Datos de los combos disponibles
@@ -690,9 +734,9 @@ def get_combos(self) -> list[dict]:
         get_combos()
     """
     try:
-        result = supabase.table("combos").select("*").execute().data
+        result = menu_catalog.all("combo")
         if result:
-            return {"success": "Combos encontrados", "data": result.data}
+            return {"success": "Combos encontrados", "data": [item.row for item in result]}
         else:
             return {"error": "No se encontraron combos"}
     except Exception as e:
@@ -701,7 +745,7 @@ def get_combos(self) -> list[dict]:
 @tool
 def get_combo_by_name(name: str) -> dict:
     """
-    Obtiene información de un combo por su nombre desde la base de datos.
+    Obtiene información de un combo por su nombre desde el catálogo del menú.
     
     Args:
         name: Nombre del combo a buscar (ej: "combo 1", "combo 2", "combo 3")
@@ -712,15 +756,10 @@ def get_combo_by_name(name: str) -> dict:
         get_combo_by_name("combo 1")
     """
     try:
-        # Buscar con nombre exacto primero
-        result = supabase.table("combos").select("*").eq("nombre", name).execute()
-
-        if not result.data:
-            # Buscar con ilike para mayor flexibilidad
-            result = supabase.table("combos").select("*").ilike("nombre", f"%{name}%").execute()
+        result = menu_catalog.find("combo", name)
         
-        if result.data:
-            return {"success": "Combo encontrado", "data": result.data}
+        if result:
+            return {"success": "Combo encontrado", "data": [item.row for item in result]}
         else:
             return {"error": f"Combo '{name}' no encontrado"}
         
@@ -731,7 +770,7 @@ def get_combo_by_name(name: str) -> dict:
 @tool
 def get_beverages(self) -> list[dict]:
     """
-    Obtiene todas las bebidas disponibles en la base de datos.
+    Obtiene todas las bebidas disponibles en el menú.
     
     Returns:
         dict: Datos de las bebidas disponibles
@@ -740,9 +779,9 @@ def get_beverages(self) -> list[dict]:
         get_beverages()
     """
     try:
-        result = supabase.table("bebidas").select("*").execute().data
+        result = menu_catalog.all("bebida")
         if result:
-            return {"success": "Bebidas encontradas", "data": result.data}
+            return {"success": "Bebidas encontradas", "data": [item.row for item in result]}
         else:
             return {"error": "No se encontraron bebidas"}
     except Exception as e:
@@ -751,7 +790,7 @@ def get_beverages(self) -> list[dict]:
 @tool
 def get_beverage_by_name(name: str) -> dict:
     """
-    Obtiene una bebida por su nombre desde la base de datos.
+    Obtiene una bebida por su nombre desde el catálogo del menú.
     
     Args:
         name: Nombre de la bebida a buscar (ej: "coca cola", "agua", "jugo")
@@ -763,15 +802,10 @@ def get_beverage_by_name(name: str) -> dict:
         get_beverage_by_name("coca cola")
     """
     try:
-        # Buscar con nombre exacto primero
-        result = supabase.table("bebidas").select("*").eq("nombre_producto", name).execute()
-        
-        if not result.data:
-            # Buscar con ilike para mayor flexibilidad
-            result = supabase.table("bebidas").select("*").ilike("nombre_producto", f"%{name}%").execute()
+        result = menu_catalog.find_one("bebida", name)
         
-        if result.data:
-            return result.data[0]
+        if result:
+            return result.row
         else:
             return {"error": f"Bebida '{name}' no encontrada"}
     except Exception as e:
@@ -780,7 +814,7 @@ def get_beverage_by_name(name: str) -> dict:
 @tool
 def get_aditions(self) -> list[dict]:
     """
-    Obtiene todas las adiciones disponibles en la base de datos.
+    Obtiene todas las adiciones disponibles en el menú.
     
     Returns:
         dict: Datos de las adiciones disponibles
@@ -789,9 +823,9 @@ def get_aditions(self) -> list[dict]:
         get_aditions()
     """
     try:
-        result = supabase.table("adiciones").select("*").execute().data
+        result = menu_catalog.all("adicion")
         if result:
-            return {"success": "Adiciones encontradas", "data": result.data}
+            return {"success": "Adiciones encontradas", "data": [item.row for item in result]}
         else:
             return {"error": "No se encontraron adiciones"}
     except Exception as e:
@@ -800,7 +834,7 @@ def get_aditions(self) -> list[dict]:
 @tool
 def get_adition_by_name( name: str) -> dict:
     """
-    Obtiene una adición por su nombre desde la base de datos.
+    Obtiene una adición por su nombre desde el catálogo del menú.
     
     Args:
         name: Nombre de la adición a buscar (ej: "cebolla", "queso", "huevo")
@@ -812,12 +846,10 @@ def get_adition_by_name( name: str) -> dict:
         get_adition_by_name("cebolla")
     """
     try:
-        result = supabase.table("adiciones").select("*").eq("nombre", name).execute().data[0]
-        if not result:
-            result = supabase.table("adiciones").select("*").ilike("nombre", f"%{name}%").execute().data[0]
+        result = menu_catalog.find_one("adicion", name)
         
         if result:
-            return {"success": "Adición encontrada", "data": result}
+            return {"success": "Adición encontrada", "data": result.row}
         else:
             return {"error": f"Adición '{name}' no encontrada"}
     except Exception as e:
@@ -827,7 +859,7 @@ def get_adition_by_name( name: str) -> dict:
 @tool
 def get_adition_by_name_and_size( name: str, size: str) -> dict:
     """
-    Obtiene una adición por su nombre desde la base de datos.
+    Obtiene una adición por su nombre y tamaño de pizza desde el catálogo del menú.
     
     Args:
         name: Nombre de la adición a buscar (ej: "cebolla", "queso", "huevo")
@@ -837,15 +869,13 @@ def get_adition_by_name_and_size( name: str, size: str) -> dict:
         dict: Datos de la adición si existe
         
     Example:
-        get_adition_by_name("cebolla")
+        get_adition_by_name_and_size("cebolla", "Large")
     """
     try:
-        result = supabase.table("adiciones").select("*").eq("nombre", name).eq("tamaño_pizza", size).execute().data[0]
-        if not result:
-            result = supabase.table("adiciones").select("*").ilike("nombre", f"%{name}%").eq("tamaño_pizza", size).execute().data[0]
+        result = menu_catalog.find_one("adicion", name, size)
         
         if result:
-            return {"success": "Adición encontrada", "data": result}
+            return {"success": "Adición encontrada", "data": result.row}
         else:
             return {"error": f"Adición '{name}' no encontrada"}
     except Exception as e:
@@ -854,7 +884,7 @@ def get_adition_by_name_and_size( name: str, size: str) -> dict:
 @tool
 def get_borders(self) -> list[dict]:
     """
-    Obtiene todos los bordes disponibles en la base de datos.
+    Obtiene todos los bordes disponibles en el menú.
     
     Returns:
         dict: Datos de los bordes disponibles
@@ -863,9 +893,9 @@ def get_borders(self) -> list[dict]:
         get_borders()
     """
     try:
-        result = supabase.table("bordes").select("*").execute().data
+        result = menu_catalog.all("borde")
         if result:
-            return {"success": "Bordes encontrados", "data": result.data}
+            return {"success": "Bordes encontrados", "data": [item.row for item in result]}
         else:
             return {"error": "No se encontraron bordes"}
     except Exception as e:
@@ -874,7 +904,7 @@ def get_borders(self) -> list[dict]:
 @tool
 def get_border_by_name( name: str) -> dict:
     """
-    Obtiene un borde por su nombre desde la base de datos.
+    Obtiene un borde por su nombre desde el catálogo del menú.
     
     Args:
         name: Nombre del borde a buscar (ej: "cebolla", "queso", "huevo")
@@ -886,15 +916,11 @@ def get_border_by_name( name: str) -> dict:
         get_border_by_name("cebolla")
     """
     try:
-        # Buscar con nombre exacto primero
-        result = supabase.table("bordes").select("*").eq("nombre", name).execute().data[0]
-        if not result:
-            # Buscar con ilike para mayor flexibilidad
-            result = supabase.table("bordes").select("*").ilike("nombre", f"%{name}%").execute().data[0]
+        result = menu_catalog.find_one("borde", name)
         
         # Retornar el resultado si existe
         if result:
-            return {"success": "Borde encontrado", "data": result}
+            return {"success": "Borde encontrado", "data": result.row}
         else:
             return {"error": f"Borde '{name}' no encontrado"}
     except Exception as e:
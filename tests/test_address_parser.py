@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test del analizador de direcciones colombianas: mismo resultado que la versión anterior, memo y lotes
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from scripts.bench_address_parser import SAMPLES, legacy_parse
+from src.services import distance_calculator as dc
+from src.services.distance_calculator import (parse_colombian_address,
+                                              parse_colombian_addresses)
+
+EXTRA = [
+    "N° 5 calle 3", "NO 7", "Nº12-30", "CL. 80 # 11-20 INT. 4 APT 302", "Kra 10 # 20-30",
+    "avenida boyacá # 12-3", "calle 26 sur # 3-10 apartamento 5 manzana B", "", "   ",
+    "Carrera 7, # 123 - 45, torre 2, apto 1001", "transv. 5 # 6-7 blq 2 lt 9 ps 3",
+]
+
+
+def test_matches_the_previous_implementation():
+    for address in SAMPLES + EXTRA:
+        assert parse_colombian_address(address) == legacy_parse(address), address
+
+
+def test_memo_returns_independent_results():
+    dc._parse_memo.cache_clear()
+    first = parse_colombian_address("Cl 127a # 11b-76 apto 301")
+    first.complements["apto"] = "999"
+    second = parse_colombian_address("Cl 127a # 11b-76 apto 301")
+
+    assert second.complements == {"apto": "301"}
+    assert second.street_for_geocoder() == "Calle 127A # 11B-76"
+    assert dc._parse_memo.cache_info().hits == 1
+
+
+def test_batch_api_parses_each_distinct_address_once():
+    dc._parse_memo.cache_clear()
+    batch = SAMPLES * 3
+    parsed = parse_colombian_addresses(batch)
+
+    assert [p.raw for p in parsed] == batch
+    assert parsed == [legacy_parse(address) for address in batch]
+    assert parsed[0] is not parsed[len(SAMPLES)]
+    # El lote no llena el memo del bot
+    assert dc._parse_memo.cache_info().currsize == 0
+
+
+def test_repeated_addresses_are_served_from_the_memo():
+    dc._parse_memo.cache_clear()
+    for _ in range(3):
+        for address in SAMPLES[:4]:
+            parse_colombian_address(address)
+
+    info = dc._parse_memo.cache_info()
+    assert info.misses == 4 and info.hits == 8
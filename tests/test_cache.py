@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test de la caché LRU/TTL acotada usada por la memoria de conversaciones
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.core.cache import LRUTTLCache
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = LRUTTLCache(max_entries=2, max_bytes=100, sizeof=len, sweep_interval=0)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    assert cache.get("a") is not None  # "b" pasa a ser el menos usado
+    cache.put("c", "x" * 10)
+
+    assert "b" not in cache and "a" in cache and "c" in cache
+    cache.put("d", "x" * 95)  # supera el límite de bytes
+    assert len(cache) == 1 and "d" in cache
+
+    stats = cache.stats()
+    assert stats["evictions"] == 3
+    assert stats["bytes"] == 95
+
+
+def test_ttl_expiry_and_counters():
+    cache = LRUTTLCache(ttl_seconds=0.05, sweep_interval=0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    assert cache.get("zzz") is None
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.sweep() == 1  # "b" nunca se volvió a leer
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 2)
+    assert stats["entries"] == 0
+
+
+def test_background_sweeper_drops_expired_entries():
+    cache = LRUTTLCache(ttl_seconds=0.02, sweep_interval=0.02)
+    cache.put("a", 1)
+    time.sleep(0.15)
+    cache.stop()
+    assert len(cache) == 0
+
+
+def test_memory_stats_expose_cache_counters(monkeypatch):
+    import src.core.memory as memory_module
+
+    class FakeConversations:
+        async def get(self, thread_id):
+            return {"thread_id": thread_id, "recent_messages": [{"role": "human", "content": "hola"}]}
+
+    monkeypatch.setattr(memory_module, "conversations", FakeConversations())
+    manager = memory_module.MemoryManager()
+
+    asyncio.run(manager.get_conversation("u1"))
+    stats = asyncio.run(manager.get_conversation_stats("u1"))
+
+    assert stats["cache_hit"] is True
+    assert stats["cache"]["hits"] == 1 and stats["cache"]["misses"] == 1
+    assert stats["cache"]["bytes"] > 0
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test del checkpointer persistente (SQLite/WAL) y de la reanudación de conversaciones
+"""
+import asyncio
+import operator
+import os
+import sys
+from typing import Annotated, TypedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, StateGraph
+
+import src.core.checkpointer as checkpointer_module
+from src.core.checkpoint_backends import SQLiteCheckpointBackend
+from src.core.checkpointer import ChatStateManager, Checkpointer
+from src.core.memory import ConversationContext
+
+
+class FakeOrders:
+    """pedidos_activos en memoria; las herramientas de pedido lo modifican directamente."""
+
+    def __init__(self, order=None):
+        self.order = order
+
+    async def get_active(self, cliente_id):
+        return self.order
+
+
+def make_saver(tmp_path, keep_last=3):
+    return Checkpointer(SQLiteCheckpointBackend(str(tmp_path / "checkpoints.sqlite3")), keep_last=keep_last)
+
+
+class CounterState(TypedDict):
+    total: Annotated[int, operator.add]
+
+
+def test_graph_resumes_from_sqlite_checkpoint(tmp_path):
+    graph = StateGraph(CounterState)
+    graph.add_node("add", lambda state: {"total": 1})
+    graph.set_entry_point("add")
+    graph.add_edge("add", END)
+
+    config = {"configurable": {"thread_id": "u1"}}
+    saver = make_saver(tmp_path, keep_last=0)
+    assert graph.compile(checkpointer=saver).invoke({"total": 1}, config)["total"] == 2
+
+    # Otro proceso abre el mismo archivo y continúa desde el último checkpoint
+    reopened = graph.compile(checkpointer=make_saver(tmp_path, keep_last=0))
+    assert reopened.invoke({"total": 1}, config)["total"] == 4
+    assert reopened.get_state(config).values["total"] == 4
+    assert len(list(saver.list(config))) > 2
+
+    saver.delete_thread("u1")
+    assert saver.get_tuple(config) is None
+
+
+def test_keep_last_prunes_old_checkpoints(tmp_path):
+    saver = make_saver(tmp_path, keep_last=2)
+    manager = ChatStateManager(saver=saver)
+
+    for turn in range(4):
+        asyncio.run(manager.save_state_for_user({"cliente_id": "u1", "messages": [HumanMessage(content=f"m{turn}")]}))
+
+    history = list(saver.list({"configurable": {"thread_id": "u1"}}))
+    assert len(history) == 2
+    assert history[0].metadata["step"] == 3
+    assert history[0].parent_config["configurable"]["checkpoint_id"] == history[1].config["configurable"]["checkpoint_id"]
+
+
+def test_resume_reads_only_the_local_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpointer_module, "orders", FakeOrders({"productos": [{"nombre": "Pepperoni"}]}))
+    manager = ChatStateManager(saver=make_saver(tmp_path), message_window=2)
+    state = {
+        "cliente_id": "u1",
+        "messages": [HumanMessage(content="hola"), AIMessage(content="¡Hola!"),
+                     HumanMessage(content="una pepperoni"),
+                     AIMessage(content="", tool_calls=[{"name": "x", "args": {}, "id": "t1"}]),
+                     ToolMessage(content="{}", tool_call_id="t1"), AIMessage(content="¿De qué tamaño?")],
+        "customer": {"id": "u1", "nombre_completo": "Ana"},
+        "active_order": {"productos": [{"nombre": "Pepperoni"}]},
+        "order_steps": {"saludo": 2, "seleccion_productos": 1},
+    }
+    asyncio.run(manager.save_state_for_user(state))
+
+    class NoRemote:
+        async def get_conversation(self, cliente_id):
+            raise AssertionError("no debería consultar la memoria remota")
+
+    manager.memory_manager = NoRemote()
+    loaded = asyncio.run(manager.load_state_for_user("u1", HumanMessage(content="grande")))
+
+    assert [m.content for m in loaded["messages"]] == ["una pepperoni", "¿De qué tamaño?"]
+    assert loaded["customer"]["nombre_completo"] == "Ana"
+    assert loaded["active_order"]["productos"][0]["nombre"] == "Pepperoni"
+    assert loaded["order_steps"] == {"saludo": 2, "seleccion_productos": 1}
+
+
+def test_missing_checkpoint_falls_back_to_remote_hydration(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpointer_module, "orders", FakeOrders())
+    manager = ChatStateManager(saver=make_saver(tmp_path))
+    calls = []
+
+    async def fake_remote(cliente_id, new_message, active_order_query=None):
+        calls.append(cliente_id)
+        return {"cliente_id": cliente_id, "messages": []}
+
+    manager._load_remote_state = fake_remote
+    asyncio.run(manager.load_state_for_user("nuevo", HumanMessage(content="hola")))
+    assert calls == ["nuevo"]
+    assert checkpointer_module.state_manager.saver is checkpointer_module.checkpointer
+
+
+def test_turns_append_deltas_and_compact_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpointer_module, "orders", FakeOrders())
+    saver = make_saver(tmp_path)
+    manager = ChatStateManager(saver=saver, message_window=4, compact_every=2)
+    config = {"configurable": {"thread_id": "u1"}}
+    state = {"cliente_id": "u1", "messages": [], "customer": {"id": "u1"}, "order_steps": {"saludo": 0}}
+
+    def turn(text, **changes):
+        loaded = asyncio.run(manager.load_state_for_user("u1", HumanMessage(content=text)))
+        state.update(changes, messages=list(loaded["messages"]) + [HumanMessage(content=text), AIMessage(content=f"re: {text}")])
+        asyncio.run(manager.save_state_for_user(state))
+        return saver.get_tuple(config)
+
+    first = turn("hola", order_steps={"saludo": 2, "consulta_menu": 0})  # sin checkpoint previo: snapshot
+    assert first.pending_writes == []
+
+    second = turn("menú", order_steps={"saludo": 2, "consulta_menu": 1})
+    assert second.config == first.config
+    # Solo lo que cambió: los mensajes nuevos y la clave de order_steps modificada
+    assert [(channel, value) for _, channel, value in second.pending_writes if channel == "order_steps"] == [
+        ("order_steps", {"consulta_menu": 1})]
+    appended = [value for _, channel, value in second.pending_writes if channel == "messages"][0]
+    assert [m.content for m in appended] == ["menú", "re: menú"]
+    assert not any(channel == "customer" for _, channel, _ in second.pending_writes)
+
+    third = turn("pepperoni", active_order={"productos": [{"nombre": "Pepperoni"}]})
+    assert third.config == first.config and len({t for t, _, _ in third.pending_writes}) == 2
+
+    # Tras compact_every deltas se escribe un snapshot nuevo con el estado plegado
+    fourth = turn("grande")
+    assert fourth.config != first.config and fourth.pending_writes == []
+    values = fourth.checkpoint["channel_values"]
+    assert [m.content for m in values["messages"]] == ["pepperoni", "re: pepperoni", "grande", "re: grande"]
+    assert values["order_steps"] == {"saludo": 2, "consulta_menu": 1}
+    assert values["active_order"]["productos"][0]["nombre"] == "Pepperoni"
+
+
+def test_resume_sees_order_changes_made_by_the_tools(tmp_path, monkeypatch):
+    orders = FakeOrders({"id": 7, "productos": [{"nombre": "Pepperoni"}], "total": 42000})
+    monkeypatch.setattr(checkpointer_module, "orders", orders)
+    manager = ChatStateManager(saver=make_saver(tmp_path))
+
+    first = asyncio.run(manager.load_state_for_user("u1", HumanMessage(content="una pepperoni")))
+    first["messages"] = [HumanMessage(content="una pepperoni"), AIMessage(content="Listo, agregada")]
+    asyncio.run(manager.save_state_for_user(first))
+
+    # Entre turnos add_products_to_order escribe pedidos_activos sin pasar por el estado
+    orders.order = {"id": 7, "productos": [{"nombre": "Pepperoni"}, {"nombre": "Coca-Cola"}], "total": 47000}
+    second = asyncio.run(manager.load_state_for_user("u1", HumanMessage(content="¿cuánto es?")))
+    assert [p["nombre"] for p in second["active_order"]["productos"]] == ["Pepperoni", "Coca-Cola"]
+    assert second["active_order"]["total"] == 47000
+
+    # Pedido finalizado: ya no hay pedido activo
+    orders.order = None
+    assert asyncio.run(manager.load_state_for_user("u1", HumanMessage(content="gracias")))["active_order"] is None
+
+    # Si Supabase no responde se usa el pedido del checkpoint
+    class DownOrders:
+        async def get_active(self, cliente_id):
+            raise ConnectionError("supabase caído")
+
+    monkeypatch.setattr(checkpointer_module, "orders", DownOrders())
+    third = asyncio.run(manager.load_state_for_user("u1", HumanMessage(content="hola")))
+    assert third["active_order"]["total"] == 42000
+
+
+def test_remote_hydration_is_concurrent_and_shares_the_customer(tmp_path, monkeypatch):
+    import time
+
+    import src.core.workflow as workflow_module
+
+    delay = 0.2
+    lookups = []
+
+    class SlowMemory:
+        async def get_conversation(self, cliente_id):
+            await asyncio.sleep(delay)
+            return ConversationContext(cliente_id)
+
+    class SlowCustomers:
+        async def get(self, cliente_id):
+            await asyncio.sleep(delay)
+            return {"id": cliente_id, "nombre_completo": "Ana"}
+
+        async def get_or_create(self, cliente_id):
+            lookups.append(cliente_id)
+            return {"id": cliente_id}
+
+    class SlowOrders:
+        async def get_active(self, cliente_id):
+            await asyncio.sleep(delay)
+            return {"id": 7, "productos": []}
+
+    monkeypatch.setattr(checkpointer_module, "customers", SlowCustomers())
+    monkeypatch.setattr(checkpointer_module, "orders", SlowOrders())
+    monkeypatch.setattr(workflow_module, "customers", SlowCustomers())
+    manager = ChatStateManager(saver=make_saver(tmp_path))
+    manager.memory_manager = SlowMemory()
+    workflow = workflow_module.Workflow.__new__(workflow_module.Workflow)
+
+    async def request():
+        start = time.perf_counter()
+        state = await manager.load_state_for_user("u1", HumanMessage(content="hola"))
+        elapsed = time.perf_counter() - start
+        # Los nodos del grafo corren en otras tareas y ven la misma caché
+        customer = await asyncio.create_task(workflow._get_or_create_customer("u1"))
+        return state, elapsed, customer
+
+    state, elapsed, customer = asyncio.run(request())
+
+    assert elapsed < delay * 1.8
+    assert state["active_order"]["id"] == 7
+    assert customer["nombre_completo"] == "Ana"
+    assert lookups == []
+    # Fuera de esa petición no queda nada en caché
+    asyncio.run(workflow._get_or_create_customer("u1"))
+    assert lookups == ["u1"]
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test de la capa de acceso a datos: reintentos, timeouts y clientes por event loop
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+import src.services.database as database_module
+from src.services.database import CustomerRepository, Database
+
+
+class FlakyQuery:
+    """Falla con errores de red las primeras `failures` veces."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def _result(self):
+        self.client.calls += 1
+        if self.client.calls <= self.client.failures:
+            raise httpx.ConnectError("connection reset")
+        return type("Result", (), {"data": [{"id": "u1", "nombre_completo": "Ana"}]})()
+
+    def execute(self):
+        if self.client.is_async:
+            return self._async_result()
+        return self._result()
+
+    async def _async_result(self):
+        await asyncio.sleep(self.client.delay)
+        return self._result()
+
+
+class FlakyClient:
+    def __init__(self, failures=0, is_async=False, delay=0.0):
+        self.failures = failures
+        self.is_async = is_async
+        self.delay = delay
+        self.calls = 0
+
+    def table(self, name):
+        return FlakyQuery(self)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(database_module, "_backoff", lambda attempt: 0)
+
+
+def test_sync_calls_retry_transient_errors():
+    db = Database(sync_client=FlakyClient(failures=2), max_retries=2)
+
+    assert CustomerRepository(db).get_sync("u1")["nombre_completo"] == "Ana"
+    assert db.stats == {"queries": 1, "retries": 2, "failures": 0}
+
+    db = Database(sync_client=FlakyClient(failures=5), max_retries=1)
+    with pytest.raises(httpx.ConnectError):
+        CustomerRepository(db).get_sync("u1")
+    assert db.stats["failures"] == 1
+
+
+def test_async_calls_use_timeout_and_one_client_per_loop():
+    created = []
+
+    def factory():
+        created.append(FlakyClient(failures=1, is_async=True))
+        return created[-1]
+
+    db = Database(sync_client=FlakyClient(), max_retries=1, async_client_factory=factory)
+    customers = CustomerRepository(db)
+
+    async def two_lookups():
+        return [await customers.get("u1"), await customers.get("u1")]
+
+    assert all(row["id"] == "u1" for row in asyncio.run(two_lookups()))
+    asyncio.run(customers.get("u1"))
+    # Un cliente (y su pool) por event loop, reutilizado dentro del loop
+    assert len(created) == 2
+
+    slow_db = Database(sync_client=FlakyClient(), timeout=0.05, max_retries=0,
+                       async_client_factory=lambda: FlakyClient(is_async=True, delay=1))
+    with pytest.raises(TimeoutError):
+        asyncio.run(CustomerRepository(slow_db).get("u1"))
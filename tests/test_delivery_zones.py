@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test de las zonas de entrega precalculadas: tarifas sin llamadas a la API salvo en los bordes
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from config.settings import RESTAURANT_LAT, RESTAURANT_LON
+from src.services import distance_calculator as calculator_module
+from src.services.delivery_zones import (OUT_OF_ZONE, DeliveryZones,
+                                         straight_distance)
+from src.services.distance_calculator import DistanceCalculator
+from src.services.geo_cache import GeoCache
+
+METERS_PER_DEGREE_LAT = 111_195
+
+
+def north_of_restaurant(meters):
+    return RESTAURANT_LAT + meters / METERS_PER_DEGREE_LAT, RESTAURANT_LON
+
+
+def history(ratio=1.3, step=0.002, radius=0.04):
+    """Rutas históricas: en toda la zona el recorrido en carro es 1.3 veces la línea recta."""
+    samples = []
+    steps = int(radius / step)
+    for i in range(-steps, steps + 1):
+        for j in range(-steps, steps + 1):
+            lat, lon = RESTAURANT_LAT + i * step, RESTAURANT_LON + j * step
+            samples.append((lat, lon, ratio * straight_distance(lat, lon, RESTAURANT_LAT, RESTAURANT_LON)))
+    return samples
+
+
+def test_fee_bands_are_answered_offline_except_near_boundaries():
+    zones = DeliveryZones()
+    zones.build(history())
+
+    assert zones.fee(*north_of_restaurant(400)) == 10000      # ~520 m en carro
+    assert zones.fee(*north_of_restaurant(1200)) == 15000     # ~1.56 km
+    assert zones.fee(*north_of_restaurant(1900)) == 20000     # ~2.47 km
+    assert zones.band(*north_of_restaurant(3500)) == OUT_OF_ZONE
+    assert zones.fee(*north_of_restaurant(3500)) == -1
+    assert zones.fee(*north_of_restaurant(770)) is None       # ~1.0 km: borde entre tarifas
+    assert 0 < zones.info()["boundary_cells"] < len(zones.cells) // 4
+
+
+def test_lookups_take_microseconds():
+    zones = DeliveryZones()
+    zones.build(history())
+    lat, lon = north_of_restaurant(1200)
+    start = time.perf_counter()
+    for _ in range(10_000):
+        zones.fee(lat, lon)
+    assert (time.perf_counter() - start) / 10_000 < 50e-6
+
+
+def test_calculator_routes_only_boundary_points(monkeypatch):
+    zones = DeliveryZones()
+    zones.build(history())
+    monkeypatch.setattr(calculator_module.addresses, "list_located_sync", lambda: [])
+    calculator = DistanceCalculator(cache=GeoCache(":memory:"), zones=zones)
+    routes = []
+
+    def calculate_driving_distance(lat, lon):
+        routes.append((lat, lon))
+        return 1.3 * straight_distance(lat, lon, RESTAURANT_LAT, RESTAURANT_LON)
+
+    calculator.calculate_driving_distance = calculate_driving_distance
+
+    lat, lon = north_of_restaurant(1200)
+    assert calculator.delivery_fee("Calle 1 # 1-1", lat, lon) == (15000, None)
+    assert routes == []
+
+    lat, lon = north_of_restaurant(760)
+    fee, distance = calculator.delivery_fee("Calle 2 # 2-2", lat, lon)
+    assert fee == 10000 and distance < 1000 and len(routes) == 1
+    # La ruta queda en caché: la misma dirección ya no consulta la API
+    assert calculator.delivery_fee("Calle 2 # 2-2", lat, lon) == (fee, distance)
+    assert len(routes) == 1
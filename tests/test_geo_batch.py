@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test del cálculo vectorizado de distancias y tarifas y del rezonificado masivo de direcciones
+"""
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from config.settings import RESTAURANT_LAT, RESTAURANT_LON
+from scripts.rezone_addresses import rezone
+from src.services.delivery_zones import BOUNDARY, DeliveryZones, straight_distance
+from src.services.distance_calculator import DistanceCalculator
+from src.services.geo_batch import zone_bands_many
+from src.services.geo_cache import GeoCache
+
+
+def random_points(n, seed=7):
+    rng = random.Random(seed)
+    return ([RESTAURANT_LAT + rng.uniform(-0.05, 0.05) for _ in range(n)],
+            [RESTAURANT_LON + rng.uniform(-0.05, 0.05) for _ in range(n)])
+
+
+def make_calculator(zones=None):
+    return DistanceCalculator(cache=GeoCache(":memory:"), zones=zones or DeliveryZones())
+
+
+def test_vectorized_results_match_the_scalar_versions():
+    calculator = make_calculator()
+    lats, lons = random_points(2000)
+
+    distances = calculator.distances_many(lats, lons)
+    expected = [calculator.calculate_straight_distance(lat, lon) for lat, lon in zip(lats, lons)]
+    assert np.allclose(distances, expected)
+
+    driving = np.concatenate([distances * 1.3, [0, 999.9, 1000, 2999, 3000]])
+    assert calculator.fees_many(driving).tolist() == [calculator.calculate_delivery_fee(d) for d in driving]
+
+
+def test_grid_bands_match_point_lookups():
+    zones = DeliveryZones()
+    lats, lons = random_points(300, seed=3)
+    zones.build([(lat, lon, 1.3 * straight_distance(lat, lon, RESTAURANT_LAT, RESTAURANT_LON))
+                 for lat, lon in zip(lats, lons)])
+
+    lats, lons = random_points(2000, seed=11)
+    codes = zone_bands_many(zones, lats + [0.0], lons + [0.0])
+    expected = [zones.band(lat, lon) for lat, lon in zip(lats, lons)] + [3]
+    assert [None if code == BOUNDARY else code for code in codes.tolist()] == expected
+
+
+def test_rezone_keeps_valid_distances_and_routes_boundaries_after_a_move():
+    calculator = make_calculator()
+    routed = []
+
+    def calculate_driving_distance(lat, lon):
+        routed.append((lat, lon))
+        return 1.3 * calculator.calculate_straight_distance(lat, lon)
+
+    calculator.calculate_driving_distance = calculate_driving_distance
+    near = (RESTAURANT_LAT + 0.003, RESTAURANT_LON)   # ~330 m en línea recta
+    edge = (RESTAURANT_LAT + 0.0072, RESTAURANT_LON)  # ~800 m: borde entre tarifas
+    far = (RESTAURANT_LAT + 0.04, RESTAURANT_LON)     # ~4.4 km
+    rows = [
+        {"direccion_id": 1, "lat": near[0], "lon": near[1], "distancia": 1500},
+        {"direccion_id": 2, "lat": edge[0], "lon": edge[1], "distancia": None},
+        {"direccion_id": 3, "lat": far[0], "lon": far[1], "distancia": 5200},
+    ]
+    calculator.zones.build([])
+
+    # Sin mudanza: las distancias guardadas siguen valiendo y no se consulta la API
+    results = rezone(rows, calculator, calculator.zones, moved=False, route=False)
+    assert [fee for fee, _ in results] == [15000, None, -1]
+    assert routed == []
+
+    # Tras mudarse: solo la dirección en el borde necesita la API de rutas
+    results = rezone(rows, calculator, calculator.zones, moved=True, route=True)
+    assert [fee for fee, _ in results] == [10000, 15000, -1]
+    assert routed == [edge]
+    assert results[0][1] is None and results[1][1] > 1000
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test de la caché de geocodificación: direcciones repetidas sin llamadas externas y caché negativa
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.services import distance_calculator as calculator_module
+from src.services.delivery_zones import DeliveryZones
+from src.services.distance_calculator import DistanceCalculator
+from src.services.geo_cache import GeoCache
+
+
+class FakeAddresses:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.updates = []
+
+    def list_sync(self, cliente_id):
+        return self.rows
+
+    def update_sync(self, cliente_id, data):
+        self.updates.append(data)
+        return [data]
+
+    def list_located_sync(self):
+        return []
+
+
+def make_calculator(monkeypatch, rows=None, cache=None):
+    repo = FakeAddresses(rows)
+    monkeypatch.setattr(calculator_module, "addresses", repo)
+    calculator = DistanceCalculator(cache=cache or GeoCache(":memory:"), zones=DeliveryZones())
+    calls = []
+
+    def get_coordinates(address, limit=1):
+        calls.append(("geocode", address))
+        if "999" in address:
+            raise ValueError("Sin resultados para esa dirección")
+        return 4.70, -74.04
+
+    def calculate_driving_distance(lat, lon):
+        calls.append(("route", lat, lon))
+        return 1500.0
+
+    calculator.get_coordinates = get_coordinates
+    calculator.calculate_driving_distance = calculate_driving_distance
+    return calculator, repo, calls
+
+
+def test_repeat_address_is_served_from_the_cache(monkeypatch):
+    calculator, repo, calls = make_calculator(monkeypatch)
+
+    assert calculator.run("Cl 127a # 11b-76 apto 301", "c1") == 15000
+    # Otra forma de escribir la misma vía, otro cliente: cero llamadas externas
+    assert calculator.run("calle 127A #11B - 76", "c2") == 15000
+
+    assert calls == [("geocode", "Calle 127A # 11B-76"), ("route", 4.70, -74.04)]
+    assert repo.updates[1]["distancia"] == 1500.0 and repo.updates[1]["lat"] == 4.70
+    assert calculator.cache.stats["hits"] >= 2
+
+
+def test_registered_address_skips_geocoding(monkeypatch):
+    rows = [{"base_direccion": "Carrera 7 # 123-45", "distancia": 2500}]
+    calculator, repo, calls = make_calculator(monkeypatch, rows)
+
+    assert calculator.run("Cra 7 # 123-45", "c1") == 20000
+    assert calls == [] and repo.updates == []
+
+
+def test_unresolvable_addresses_are_negatively_cached(monkeypatch):
+    calculator, _, calls = make_calculator(monkeypatch, cache=GeoCache(":memory:", negative_ttl_seconds=0.05))
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            calculator.run("Calle 999 # 1-1", "c1")
+    assert len(calls) == 1
+
+    time.sleep(0.06)  # la caché negativa vence antes que la positiva
+    with pytest.raises(ValueError):
+        calculator.run("Calle 999 # 1-1", "c1")
+    assert len(calls) == 2
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test del pre-clasificador de intenciones por reglas (sin LLM)
+"""
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.core.intent_classifier import IntentPreClassifier
+from src.services.menu_catalog import MenuCatalog
+from tests.test_menu_catalog import MENU_ROWS, FakeClient
+
+
+def make_classifier():
+    return IntentPreClassifier(catalog=MenuCatalog(client=FakeClient(MENU_ROWS), ttl_seconds=3600))
+
+
+def test_simple_messages_skip_the_llm():
+    classifier = make_classifier()
+
+    assert classifier.classify("¡Hola, buenas tardes!") is None  # mezcla: va al LLM
+    assert classifier.classify("Buenas tardes") == [{"intent": "saludo", "action": "saludo_inicial"}]
+    assert classifier.classify("Muéstrame el menú por favor")[0]["intent"] == "consulta_menu"
+    assert classifier.classify("confirm_order_42")[0]["action"] == "confirma_pedido_boton"
+    assert classifier.classify("Nequi")[0]["action"] == "metodo_pago_transferencia"
+
+
+def test_product_requests_use_the_catalog():
+    classifier = make_classifier()
+
+    assert classifier.classify("quiero una pepperoni grande") == [
+        {"intent": "seleccion_productos", "action": "solicita_pizza_pepperoni_large"}
+    ]
+    assert classifier.classify("una hawaiana") is not None
+    # Producto inexistente o mensajes compuestos se delegan al LLM
+    assert classifier.classify("una pizza de mariscos") is None
+    assert classifier.classify("hola, quiero una pepperoni y mi dirección es calle 10") is None
+
+
+def test_hit_rate_is_reported():
+    classifier = make_classifier()
+    for message in ("hola", "gracias", "cuánto demora el domicilio?", "menu"):
+        classifier.classify(message)
+
+    stats = classifier.get_stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.75
+    assert stats["hits_by_intent"]["consulta_menu"] == 1
+
+
+def test_bare_confirmations_need_an_order_confirmation_request():
+    classifier = make_classifier()
+    summary = "🛒 RESUMEN DE TU PEDIDO\n• Pepperoni - $42.000\n¿Todo está correcto? ¿Confirmas tu pedido?"
+
+    assert classifier.classify("Sí, listo", summary) == [{"intent": "confirmacion", "action": "confirma_pedido_general"}]
+    # Sin contexto, o tras otra pregunta, el splitter decide a qué responde el "sí"
+    assert classifier.classify("Sí, listo") is None
+    assert classifier.classify("si", "¿Quieres borde de queso por $4.000?") is None
+    assert classifier.classify("dale", "¿Confirmas tu dirección: Calle 10 # 5-20?") is None
+
+
+def test_expired_catalog_is_reloaded_off_the_event_loop():
+    catalog = MenuCatalog(client=FakeClient(MENU_ROWS), ttl_seconds=3600)
+    classifier = IntentPreClassifier(catalog=catalog)
+    threads = []
+    refresh = catalog.refresh
+    catalog.refresh = lambda *args, **kwargs: threads.append(threading.current_thread()) or refresh(*args, **kwargs)
+
+    async def run():
+        return await classifier.aclassify("quiero una pepperoni grande"), threading.current_thread()
+
+    result, loop_thread = asyncio.run(run())
+    assert result[0]["action"] == "solicita_pizza_pepperoni_large"
+    assert threads and loop_thread not in threads
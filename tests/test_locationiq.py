@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test del cliente asíncrono de LocationIQ: hedging entre endpoints, circuit breaker y tarifa estimada
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from config.settings import RESTAURANT_LAT, RESTAURANT_LON
+from src.services.delivery_zones import DeliveryZones, straight_distance
+from src.services.distance_calculator import DistanceCalculator
+from src.services.geo_cache import GeoCache
+from src.services.locationiq import (CircuitBreaker, LocationIQClient,
+                                     LocationIQUnavailable)
+
+ENDPOINTS = ["https://us1.locationiq.com/v1", "https://eu1.locationiq.com/v1"]
+FOUND = [{"lat": "4.70", "lon": "-74.05"}]
+
+
+def make_client(handler, **kwargs):
+    calls = []
+
+    async def record(request):
+        calls.append(request.url.host)
+        return await handler(request)
+
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=2, reset_seconds=60))
+    client = LocationIQClient(token="test", endpoints=ENDPOINTS, timeout=1.0, hedge_seconds=0.05,
+                              transport=httpx.MockTransport(record), **kwargs)
+    return client, calls
+
+
+def test_slow_endpoint_is_hedged_and_the_fast_one_wins():
+    async def handler(request):
+        if request.url.host.startswith("us1"):
+            await asyncio.sleep(0.5)
+        return httpx.Response(200, json=FOUND)
+
+    client, calls = make_client(handler)
+    coords = asyncio.run(asyncio.wait_for(client.search("Calle 127A # 11B-76"), 0.3))
+    assert coords == (4.70, -74.05)
+    assert calls == ["us1.locationiq.com", "eu1.locationiq.com"]
+    assert client.info()["hedged"] == 1
+
+
+def test_server_error_fails_over_without_waiting_for_the_hedge():
+    async def handler(request):
+        if request.url.host.startswith("us1"):
+            return httpx.Response(503)
+        return httpx.Response(200, json={"routes": [{"distance": 1234.5}]})
+
+    client, calls = make_client(handler)
+    client.hedge_seconds = 5
+    distance = asyncio.run(asyncio.wait_for(client.route_distance(4.70, -74.05, 4.69, -74.04), 0.5))
+    assert distance == 1234.5
+    assert len(calls) == 2 and client.breaker.state == "closed"
+
+
+def test_not_found_is_an_answer_not_a_failure():
+    async def handler(request):
+        return httpx.Response(404, json={"error": "Unable to geocode"})
+
+    client, calls = make_client(handler)
+    assert asyncio.run(client.search("Calle que no existe")) is None
+    assert calls == ["us1.locationiq.com"]
+    assert client.breaker.failures == 0
+
+
+def test_breaker_opens_and_short_circuits_calls():
+    async def handler(request):
+        return httpx.Response(500)
+
+    client, calls = make_client(handler)
+
+    async def attempts():
+        for _ in range(2):
+            with pytest.raises(LocationIQUnavailable):
+                await client.search("Calle 1 # 1-1")
+        made = len(calls)
+        with pytest.raises(LocationIQUnavailable):
+            await client.search("Calle 1 # 1-1")
+        return made
+
+    made = asyncio.run(attempts())
+    assert len(calls) == made == 4
+    assert client.info()["circuit"] == "open"
+    assert client.info()["short_circuited"] == 1
+
+
+def test_half_open_breaker_closes_after_a_good_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_trial_call_does_not_leave_the_breaker_stuck():
+    async def handler(request):
+        await asyncio.sleep(0.5)
+        return httpx.Response(200, json=FOUND)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    client, calls = make_client(handler, breaker=breaker)
+    client.hedge_seconds = 5
+
+    async def cancelled_trial():
+        task = asyncio.create_task(client.search("Calle 1 # 1-1"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_trial())
+    assert len(calls) == 1
+    # La llamada de prueba se libera: la siguiente vuelve a intentarlo
+    assert breaker.allow()
+
+
+def test_calculator_falls_back_to_a_straight_line_estimate_when_routing_is_down():
+    async def handler(request):
+        return httpx.Response(502)
+
+    client, _ = make_client(handler)
+    zones = DeliveryZones()
+    zones.build([])
+    cache = GeoCache(":memory:")
+    calculator = DistanceCalculator(cache=cache, zones=zones, client=client)
+    calculator.fallback_detour = 1.5
+
+    # ~700 m en línea recta: borde de tarifa sin historial, necesita ruta
+    lat, lon = RESTAURANT_LAT + 700 / 111_195, RESTAURANT_LON
+    assert zones.fee(lat, lon) is None
+    fee, distance = asyncio.run(calculator.adelivery_fee("Calle 2 # 2-2", lat, lon))
+    assert straight_distance(lat, lon, RESTAURANT_LAT, RESTAURANT_LON) * 1.5 > 1000
+    assert fee == 15000 and distance is None
+    # La estimación no se guarda como ruta
+    assert cache.get("Calle 2 # 2-2") is None
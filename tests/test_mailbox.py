@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test del buzón por usuario: agrupa mensajes, serializa turnos y nunca cancela un turno en curso,
+con una ventana de agrupación que se adapta a cada usuario
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+import src.bots.debounce as debounce_module
+from src.bots.debounce import AdaptiveDebouncer, FixedDebouncer, looks_complete
+from src.bots.mailbox import Mailboxes
+
+DELAY = 0.05
+
+
+class RecordingHandler:
+    def __init__(self, turn_seconds=0.0):
+        self.turn_seconds = turn_seconds
+        self.turns = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, cliente_id, messages, context):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.turn_seconds)
+        self.turns.append((cliente_id, messages, context))
+        self.running -= 1
+
+
+def test_idle_burst_is_grouped_into_one_turn():
+    handler = RecordingHandler()
+    mailboxes = Mailboxes(handler, FixedDebouncer(DELAY))
+
+    async def run():
+        for text in ["hola", "quiero una pizza", "hawaiana"]:
+            mailboxes.post("u1", text, context=text)
+            await asyncio.sleep(DELAY / 5)
+        await asyncio.sleep(DELAY * 3)
+
+    asyncio.run(run())
+
+    assert handler.turns == [("u1", ["hola", "quiero una pizza", "hawaiana"], "hawaiana")]
+    assert len(mailboxes) == 0  # el buzón se libera cuando no queda nada pendiente
+
+
+def test_messages_during_a_turn_wait_for_the_next_turn():
+    handler = RecordingHandler(turn_seconds=DELAY * 4)
+    mailboxes = Mailboxes(handler, FixedDebouncer(DELAY))
+
+    async def run():
+        mailboxes.post("u1", "una pepperoni")
+        await asyncio.sleep(DELAY * 2)  # el primer turno ya está en curso
+        assert mailboxes.get("u1").in_turn
+        mailboxes.post("u1", "grande")
+        mailboxes.post("u1", "con borde de queso")
+        await asyncio.sleep(DELAY * 12)
+
+    asyncio.run(run())
+
+    # El turno en curso terminó y los mensajes nuevos formaron el siguiente turno
+    assert [messages for _, messages, _ in handler.turns] == [["una pepperoni"], ["grande", "con borde de queso"]]
+    assert handler.max_running == 1
+
+
+def test_users_run_in_parallel_and_failures_do_not_stop_the_mailbox():
+    handler = RecordingHandler(turn_seconds=DELAY * 2)
+    calls = []
+
+    async def flaky(cliente_id, messages, context):
+        calls.append(messages)
+        if messages == ["a"]:
+            raise RuntimeError("boom")
+        await handler(cliente_id, messages, context)
+
+    mailboxes = Mailboxes(flaky, FixedDebouncer(DELAY))
+
+    async def run():
+        mailboxes.post("u1", "a")
+        mailboxes.post("u2", "b")
+        mailboxes.post("u3", "c")
+        await asyncio.sleep(DELAY * 5)
+        mailboxes.post("u1", "d")
+        await asyncio.sleep(DELAY * 5)
+
+    asyncio.run(run())
+
+    assert sorted(messages for _, messages, _ in handler.turns) == [["b"], ["c"], ["d"]]
+    assert handler.max_running == 2
+    assert len(calls) == 4
+
+
+def test_complete_messages_are_detected():
+    for text in ["sí", "Listo!", "ok gracias", "confirm_order_12", "cancel_order_7", "Nequi"]:
+        assert looks_complete(text), text
+    for text in ["quiero una pizza", "si pero", "hola", "no se"]:
+        assert not looks_complete(text), text
+
+
+def test_window_adapts_to_each_user(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(debounce_module.time, "monotonic", lambda: clock[0])
+    debouncer = AdaptiveDebouncer(min_delay=0.4, max_delay=3.0, initial_delay=1.2)
+
+    def send(cliente_id, gap):
+        clock[0] += gap
+        debouncer.observe(cliente_id, "texto")
+
+    send("nuevo", 0)
+    assert debouncer.delay("nuevo", ["texto"]) == 1.2
+
+    # Un mensaje por turno: ventana mínima
+    for _ in range(5):
+        send("directo", 30)
+    assert debouncer.delay("directo", ["quiero una pizza"]) == 0.4
+
+    # Escribe en ráfagas de ~1 s: espera 1.5 veces su intervalo habitual
+    for _ in range(4):
+        send("rafagas", 30)
+        send("rafagas", 1.0)
+        send("rafagas", 1.0)
+    assert abs(debouncer.delay("rafagas", ["quiero"]) - 1.5) < 0.05
+
+    # Las confirmaciones cortas y los botones no esperan
+    assert debouncer.delay("rafagas", ["sí"]) == 0.0
+    assert debouncer.delay("rafagas", ["1"], complete=True) == 0.0
+
+
+def test_button_replies_skip_the_wait_and_typing_extends_it():
+    handler = RecordingHandler()
+    mailboxes = Mailboxes(handler, AdaptiveDebouncer(min_delay=DELAY, max_delay=DELAY * 4,
+                                                     initial_delay=DELAY * 4, typing_seconds=DELAY * 6))
+
+    async def run():
+        start = time.perf_counter()
+        mailboxes.post("u1", "confirm_order_12")
+        while not handler.turns:
+            await asyncio.sleep(0.005)
+        immediate = time.perf_counter() - start
+
+        mailboxes.post("u2", "quiero")
+        await asyncio.sleep(DELAY * 3)
+        mailboxes.typing("u2")  # la señal de "escribiendo" mantiene la ventana abierta
+        await asyncio.sleep(DELAY * 4)
+        pending = len(handler.turns)
+        mailboxes.post("u2", "una hawaiana")
+        await asyncio.sleep(DELAY * 8)
+        return immediate, pending
+
+    immediate, pending = asyncio.run(run())
+
+    assert immediate < DELAY
+    assert pending == 1
+    assert handler.turns[1][1] == ["quiero", "una hawaiana"]
+
+
+def test_sub_second_bursts_reach_the_mailbox_and_only_floods_are_dropped():
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from src.bots.base_bot import BaseBot
+
+    class Bot(BaseBot):
+        async def send_message(self, recipient, message, **kwargs):
+            return True
+
+        async def send_typing_action(self, recipient):
+            return True
+
+        def format_recipient_id(self, raw_id):
+            return raw_id
+
+    bot = Bot.__new__(Bot)
+    bot.mailboxes = Mailboxes(RecordingHandler(), FixedDebouncer(60))
+    bot.rate_limiter = {}
+    bot.rate_limit_messages = 5
+    bot.rate_limit_window = 10.0
+
+    async def run():
+        for text in ["hola", "quiero una pizza", "hawaiana"]:
+            await bot.process_user_message("u1", text)
+        inbox = list(bot.mailboxes.get("u1").inbox)
+        for i in range(5):
+            await bot.process_user_message("u1", f"spam {i}")
+        flooded = len(bot.mailboxes.get("u1").inbox)
+        await bot.mailboxes.stop()
+        return inbox, flooded
+
+    inbox, flooded = asyncio.run(run())
+    # El debouncer ve la ráfaga completa; solo se descarta lo que excede el límite
+    assert inbox == ["hola", "quiero una pizza", "hawaiana"]
+    assert flooded == 5
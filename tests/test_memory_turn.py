@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test de memory.turn(): un solo upsert por turno de conversación
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import src.core.memory as memory_module
+import src.core.workflow as workflow_module
+from src.core.checkpoint_backends import SQLiteCheckpointBackend
+from src.core.checkpointer import ChatStateManager, Checkpointer
+
+
+class FakeConversations:
+    def __init__(self):
+        self.rows = {}
+        self.upserts = 0
+
+    async def get(self, thread_id):
+        return self.rows.get(thread_id)
+
+    async def upsert(self, data):
+        self.upserts += 1
+        self.rows[data["thread_id"]] = data
+        return True
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = FakeConversations()
+    monkeypatch.setattr(memory_module, "conversations", fake)
+    manager = memory_module.MemoryManager()
+    monkeypatch.setattr(memory_module, "memory", manager)
+    monkeypatch.setattr(workflow_module, "state_manager", ChatStateManager(
+        saver=Checkpointer(SQLiteCheckpointBackend(":memory:"))))
+    return fake, manager
+
+
+def test_turn_flushes_once(store):
+    fake, manager = store
+
+    async def run():
+        async with manager.turn("u1") as turn:
+            turn.add_message(HumanMessage(content="hola"))
+            turn.add_message(AIMessage(content="¡Bienvenido!"))
+            turn.update_customer_context("customer_name", "Ana")
+            turn.update_customer_context("current_order", {"productos": [1]})
+
+    asyncio.run(run())
+
+    assert fake.upserts == 1
+    saved = fake.rows["u1"]
+    assert [m["content"] for m in saved["recent_messages"]] == ["hola", "¡Bienvenido!"]
+    assert saved["customer_context"]["customer_name"] == "Ana"
+
+
+def test_failed_turn_writes_nothing(store):
+    fake, manager = store
+
+    async def run():
+        async with manager.turn("u1") as turn:
+            turn.add_message(HumanMessage(content="hola"))
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+
+    assert fake.upserts == 0
+    assert asyncio.run(manager.get_conversation("u1")).recent_messages == []
+
+
+def test_save_memory_step_uses_a_single_upsert(store):
+    fake, _ = store
+    workflow = workflow_module.Workflow.__new__(workflow_module.Workflow)
+    state = {
+        "cliente_id": "u1",
+        "messages": [HumanMessage(content="quiero una pepperoni"), AIMessage(content="¡Claro!"),
+                     HumanMessage(content="grande"), AIMessage(content="Listo")],
+        "customer": {"nombre_completo": "Ana"},
+        "active_order": {"productos": [{"nombre": "Pepperoni"}]},
+    }
+
+    asyncio.run(workflow.save_memory_step(state))
+
+    assert fake.upserts == 1
+    assert len(fake.rows["u1"]["recent_messages"]) == 4
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test del catálogo del menú en memoria (sin base de datos real)
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.services.menu_catalog import MenuCatalog
+
+MENU_ROWS = {
+    "pizzas_armadas": [
+        {"id": "p1", "nombre": "Pepperoni", "tamano": "Large", "precio": 42000},
+        {"id": "p2", "nombre": "Pepperoni", "tamano": "Small", "precio": 22000},
+        {"id": "p3", "nombre": "Hawaiana", "tamano": "Large", "precio": 40000},
+    ],
+    "bebidas": [{"id": "b1", "nombre_producto": "Coca Cola", "precio": 5000}],
+    "adiciones": [{"id": "a1", "nombre": "Champiñones", "tamano_pizza": "Large", "precio_adicional": 6000}],
+    "bordes": [{"id": "r1", "nombre": "Ajo", "precio_adicional": 4000}],
+    "combos": [{"id": "c1", "nombre": "Combo 1", "precio": 55000}],
+}
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+
+    def select(self, *args):
+        return self
+
+    def execute(self):
+        self.client.queries += 1
+        return type("Result", (), {"data": list(self.client.rows[self.table_name])})()
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def test_catalog_loads_once_and_serves_from_memory():
+    client = FakeClient(MENU_ROWS)
+    catalog = MenuCatalog(client=client, ttl_seconds=3600)
+
+    assert catalog.find_one("pizza", "pepperoni", "Small").id == "p2"
+    assert catalog.find_one("bebida", "coca").precio == 5000
+    assert catalog.find_one("borde", "ajo").row["precio_adicional"] == 4000
+    assert [item.id for item in catalog.find("pizza", "pepperoni")] == ["p1", "p2"]
+    assert catalog.find("combo", "combo 9") == []
+
+    # Una consulta por tabla, sin importar cuántas búsquedas
+    assert client.queries == len(MENU_ROWS)
+
+
+def test_catalog_refresh_detects_new_version():
+    rows = {table: list(data) for table, data in MENU_ROWS.items()}
+    client = FakeClient(rows)
+    catalog = MenuCatalog(client=client, ttl_seconds=3600)
+    first_version = catalog.version
+
+    assert catalog.refresh(force=True) is False
+    rows["bordes"].append({"id": "r2", "nombre": "Queso", "precio_adicional": 5000})
+    catalog.invalidate()
+    assert catalog.find_one("borde", "queso").id == "r2"
+    assert catalog.version != first_version
+
+
+def test_catalog_fuzzy_lookup_ranks_best_match():
+    rows = {table: list(data) for table, data in MENU_ROWS.items()}
+    rows["adiciones"] = [
+        {"id": "a2", "nombre": "Cebolla caramelizada", "tamano_pizza": "Large", "precio_adicional": 5000},
+        {"id": "a1", "nombre": "Champiñones", "tamano_pizza": "Large", "precio_adicional": 6000},
+    ]
+    rows["bebidas"] = [{"id": "b1", "nombre_producto": "Gaseosa", "variacion_nombre_1": "Coca Cola", "precio": 5000}]
+    catalog = MenuCatalog(client=FakeClient(rows), ttl_seconds=3600)
+
+    assert catalog.find_one("adicion", "champinones", "Large").id == "a1"
+    assert catalog.find_one("pizza", "hawayana").id == "p3"
+    assert catalog.find_one("bebida", "coca cola").id == "b1"
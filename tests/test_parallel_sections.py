@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test de la ejecución concurrente de secciones independientes del mensaje
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+import src.core.workflow as workflow_module
+from src.core.prompts import CustomerServicePrompts
+
+DELAY = 0.3
+
+
+@tool
+def get_pizza_by_name(name: str) -> dict:
+    """Busca una pizza."""
+    time.sleep(DELAY)
+    return {"success": True, "data": [{"nombre": name}]}
+
+
+@tool
+def update_client(id: str, direccion: str = None) -> dict:
+    """Actualiza el cliente."""
+    time.sleep(DELAY)
+    return {"success": f"Cliente {id} actualizado"}
+
+
+TOOL_FOR_INTENT = {
+    "consulta_productos": ("get_pizza_by_name", {"name": "hawaiana"}),
+    "registro_direccion": ("update_client", {"id": "u1", "direccion": "Calle 10 # 5-20"}),
+}
+
+
+class FakeLLM:
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, context):
+        await asyncio.sleep(DELAY)
+        prompt = context[-1].content
+        intent = next(i for i in TOOL_FOR_INTENT if f"Intención: {i}" in prompt)
+        name, args = TOOL_FOR_INTENT[intent]
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{intent}"}])
+
+
+def make_workflow():
+    workflow = workflow_module.Workflow.__new__(workflow_module.Workflow)
+    workflow.llm = FakeLLM()
+    workflow.prompts = CustomerServicePrompts()
+    workflow.tools_by_name = {t.name: t for t in (get_pizza_by_name, update_client)}
+    return workflow
+
+
+def test_independent_sections_run_concurrently_and_merge_in_order():
+    workflow = make_workflow()
+    state = {
+        "cliente_id": "u1",
+        "divided_message": [
+            {"intent": "consulta_productos", "action": "pregunta_hawaiana"},
+            {"intent": "seleccion_productos", "action": "solicita_pepperoni_large"},
+            {"intent": "registro_direccion", "action": "registra_calle_10"},
+        ],
+    }
+
+    start = time.perf_counter()
+    result = asyncio.run(workflow.parallel_sections_step(state))
+    elapsed = time.perf_counter() - start
+
+    # Dos ramas de (LLM + tool) en paralelo, no en serie
+    assert elapsed < DELAY * 2 * 1.6
+    # La sección que modifica el pedido queda para el ciclo serializado
+    assert result["divided_message"] == [{"intent": "seleccion_productos", "action": "solicita_pepperoni_large"}]
+
+    tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert [m.name for m in tool_messages] == ["get_pizza_by_name", "update_client"]
+    assert [s["intent"] for s in result["tool_results"]["parallel_sections"]] == ["consulta_productos", "registro_direccion"]
+    assert workflow.should_continue_after_parallel({**state, **result}) == "process"
+
+
+def test_only_order_sections_skip_the_fan_out():
+    workflow = make_workflow()
+    state = {"cliente_id": "u1", "divided_message": [{"intent": "modificar_pedido", "action": "quitar_coca"}]}
+
+    result = asyncio.run(workflow.parallel_sections_step(state))
+
+    assert "messages" not in result
+    assert workflow.should_continue_after_parallel({**state, **result}) == "retrieve"
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test del motor de precios compilado (sin base de datos real)
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.services.menu_catalog import MenuCatalog
+from src.services.pricing import PricingEngine, adjust_total
+from tests.test_menu_catalog import MENU_ROWS, FakeClient
+
+
+def make_engine():
+    return PricingEngine(MenuCatalog(client=FakeClient(MENU_ROWS), ttl_seconds=3600))
+
+
+def test_price_table_composes_border_and_additions():
+    engine = make_engine()
+    assert engine.price(engine.make_key("p1", "Large")) == 42000
+    assert engine.price(engine.make_key("p1", "large", "r1")) == 46000
+    assert engine.price(engine.make_key("p1", "Large", "r1", ["a1"])) == 52000
+    assert engine.price(engine.make_key("p1", "Large", "r9")) is None
+    assert engine.price(engine.make_key("b1")) == 5000
+
+
+def test_price_many_reprices_stored_items():
+    engine = make_engine()
+    items = [
+        {"id_producto": "p1", "tamaño": "Large", "borde": {"id": "r1"}, "adiciones": [{"id": "a1"}], "precio_total": 1},
+        {"id_producto": "b1", "tamaño": "", "precio_total": 1},
+        {"nombre": "Producto legado", "total_price": 12000},
+    ]
+    assert engine.price_many(items) == [52000, 5000, 12000]
+    repriced, total = engine.reprice_items(items)
+    assert repriced[0]["precio_total"] == 52000
+    assert total == 69000
+
+
+def test_adjust_total_is_incremental():
+    assert adjust_total(50000, added=[5000]) == 55000
+    assert adjust_total(55000, added=[46000], removed=[42000]) == 59000
+    assert adjust_total(None, added=[1000.005]) == 1000.0
+
+
+def test_calculate_order_total_persists_the_repriced_total(monkeypatch):
+    from src.services import tools
+
+    class OrderLookup:
+        @staticmethod
+        def invoke(args):
+            return {"success": "ok", "data": {"id": 7, "total": 50000, "productos": [
+                {"id_producto": "p1", "tamaño": "Large", "borde": {"id": "r1"}, "precio_total": 45000},
+                {"id_producto": "b1", "tamaño": "", "precio_total": 5000},
+            ]}}
+
+    writes = []
+    monkeypatch.setattr(tools, "pricing_engine", make_engine())
+    monkeypatch.setattr(tools, "get_order_by_id", OrderLookup)
+    monkeypatch.setattr(tools.orders, "update_sync", lambda order_id, data: writes.append((order_id, data)) or data)
+
+    result = tools.calculate_order_total.invoke({"cliente_id": "c1"})
+    assert result["data"]["total"] == 51000
+    # El total recalculado queda guardado: las demás herramientas reportan el mismo valor
+    assert writes == [(7, {"productos": [dict(item, precio_total=price) for item, price in zip(
+        OrderLookup.invoke({})["data"]["productos"], (46000, 5000))], "total": 51000})]
+    assert tools._order_total(writes[0][1], writes[0][1]["productos"]) == 51000
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Test del índice difuso de productos (acentos, errores de digitación y variaciones)
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.product_index import ProductIndex, normalize_text
+
+
+def test_normalize_text_strips_accents_and_punctuation():
+    assert normalize_text("  Jamón-Queso ") == "jamon queso"
+    assert normalize_text("CHAMPIÑONES") == "champinones"
+
+
+def test_search_tolerates_accents_and_typos():
+    index = ProductIndex([
+        ["Jamón y Queso"],
+        ["Pepperoni"],
+        ["Coca Cola 400ml", "coca"],
+        ["Champiñones"],
+    ])
+
+    assert index.search("jamon y queso")[0].key == 0
+    assert index.search("jamon y queso")[0].score == 1.0
+    assert index.search("peperoni")[0].key == 1
+    assert index.search("coca cola")[0].key == 2
+    assert index.search("champinones")[0].key == 3
+    assert index.search("sushi") == []
+
+
+def test_exact_match_uses_aliases():
+    index = ProductIndex([["Agua Cristal", "agua"], ["Agua con gas"]])
+    assert index.exact("AGUA") == [0]
+    assert [match.key for match in index.search("agua")][:1] == [0]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test de la resolución por lotes de productos y de add_products_to_order (sin base de datos real)
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+import src.services.tools as tools
+from src.services.database import Database, OrderRepository
+from src.services.menu_catalog import MenuCatalog
+from tests.test_menu_catalog import MENU_ROWS, FakeClient
+
+
+class FakeOrderQuery:
+    def __init__(self, db):
+        self.db = db
+        self.payload = None
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def insert(self, payload):
+        self.payload = dict(payload, id=1)
+        return self
+
+    def execute(self):
+        self.db.round_trips += 1
+        if self.payload is not None:
+            self.db.order = dict(self.db.order or {}, **self.payload)
+        rows = [self.db.order] if self.db.order else []
+        return type("Result", (), {"data": rows})()
+
+
+class FakeOrdersDB:
+    def __init__(self, order=None):
+        self.order = order
+        self.round_trips = 0
+
+    def table(self, name):
+        assert name == "pedidos_activos"
+        return FakeOrderQuery(self)
+
+
+def test_resolve_products_uses_catalog_only(monkeypatch):
+    menu_client = FakeClient(MENU_ROWS)
+    monkeypatch.setattr(tools, "menu_catalog", MenuCatalog(client=menu_client, ttl_seconds=3600))
+
+    resolved, errors = tools.resolve_products([
+        {"tipo_producto": "pizza", "nombre": "pepperoni", "tamaño": "Large", "borde": "ajo", "adiciones": ["champinones"]},
+        {"tipo_producto": "bebida", "nombre": "coca cola"},
+        {"tipo_producto": "pizza", "nombre": "hawaiana"},
+    ])
+
+    assert [p.id_producto for p in resolved] == ["p1", "b1"]
+    assert resolved[0].precio_total == 42000 + 4000 + 6000
+    assert len(errors) == 1 and "tamaño" in errors[0]["error"]
+    assert menu_client.queries == len(MENU_ROWS)
+
+
+def test_add_products_to_order_single_write(monkeypatch):
+    monkeypatch.setattr(tools, "menu_catalog", MenuCatalog(client=FakeClient(MENU_ROWS), ttl_seconds=3600))
+    db = FakeOrdersDB(order={"id": 1, "cliente_id": "42", "productos": [], "total": 0})
+    monkeypatch.setattr(tools, "orders", OrderRepository(Database(sync_client=db)))
+
+    result = tools.add_products_to_order.invoke({
+        "cliente_id": "42",
+        "product_data": [
+            {"tipo_producto": "pizza", "nombre": "pepperoni", "tamaño": "Small"},
+            {"tipo_producto": "pizza", "nombre": "hawaiana", "tamaño": "Large"},
+            {"tipo_producto": "bebida", "nombre": "coca cola"},
+            {"tipo_producto": "bebida", "nombre": "coca cola"},
+        ],
+    })
+
+    assert "success" in result
+    assert db.round_trips == 2
+    assert len(db.order["productos"]) == 4
+    assert db.order["total"] == 22000 + 40000 + 5000 + 5000
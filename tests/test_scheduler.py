@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test del control de admisión: límite global de turnos, cola justa entre usuarios y descarte por SLO
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+from src.core.scheduler import TurnScheduler, WorkflowOverloaded
+
+
+def test_concurrency_is_bounded_and_users_are_served_round_robin():
+    scheduler = TurnScheduler(max_concurrent=2, max_queue=100, slo_seconds=60, initial_turn_seconds=0.01)
+    order = []
+    running = [0, 0]  # actual, max
+
+    async def turn(cliente_id, tag):
+        async with scheduler.slot(cliente_id):
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            order.append(tag)
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+
+    async def run():
+        tasks = [asyncio.create_task(turn("ocupa", f"ocupa{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        # "a" encola tres turnos antes de que "b" y "c" lleguen
+        tasks += [asyncio.create_task(turn("a", f"a{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(turn("b", "b0")), asyncio.create_task(turn("c", "c0"))]
+        await asyncio.sleep(0)
+        depth = scheduler.stats()["queued"]
+        await asyncio.gather(*tasks)
+        return depth
+
+    depth = asyncio.run(run())
+
+    assert running[1] == 2
+    assert depth == 5
+    # "b" y "c" no esperan a que "a" vacíe su cola
+    assert order[2:] == ["a0", "b0", "c0", "a1", "a2"]
+    stats = scheduler.stats()
+    assert stats["running"] == 0 and stats["queued"] == 0
+    assert stats["admitted"] == 7 and stats["max_queue_depth"] == 5
+
+
+def test_turns_are_shed_when_the_expected_wait_exceeds_the_slo():
+    scheduler = TurnScheduler(max_concurrent=1, max_queue=100, slo_seconds=1.0, initial_turn_seconds=0.6)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("u1"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.acquire("u2"))  # espera estimada 0.6 s: entra a la cola
+        await asyncio.sleep(0)
+        with pytest.raises(WorkflowOverloaded):
+            await scheduler.acquire("u3")  # espera estimada 1.2 s > SLO
+        release.set()
+        await asyncio.gather(holder, queued)
+        scheduler.release()
+
+    asyncio.run(run())
+    assert scheduler.stats()["shed"] == 1
+    assert scheduler.stats()["running"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = TurnScheduler(max_concurrent=1, slo_seconds=60)
+
+    async def run():
+        await scheduler.acquire("u1")
+        waiter = asyncio.create_task(scheduler.acquire("u2"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.stats()["queued"] == 0
+        scheduler.release()
+
+    asyncio.run(run())
+    assert scheduler.stats()["running"] == 0
+
+
+def test_telegram_replies_after_releasing_the_slot(monkeypatch):
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from types import SimpleNamespace
+
+    from langchain_core.messages import AIMessage
+
+    import src.bots.telegram_bot as telegram_module
+
+    scheduler = TurnScheduler(max_concurrent=1)
+    running_at_reply = []
+
+    class StateManager:
+        async def load_state_for_user(self, cliente_id, message):
+            return {"messages": []}
+
+    class Graph:
+        async def ainvoke(self, state):
+            return {"messages": [AIMessage(content="¡Hola!")]}
+
+    async def reply_text(text):
+        running_at_reply.append(scheduler.stats()["running"])
+
+    monkeypatch.setattr(telegram_module, "workflow_scheduler", scheduler)
+    monkeypatch.setattr(telegram_module, "state_manager", StateManager())
+    bot = telegram_module.TelegramBot.__new__(telegram_module.TelegramBot)
+    bot.workflow = SimpleNamespace(workflow=Graph())
+    update = SimpleNamespace(effective_user=SimpleNamespace(first_name="Ana"),
+                             message=SimpleNamespace(reply_text=reply_text))
+
+    asyncio.run(bot._process_messages("u1", ["hola"], update))
+    # Una llamada lenta a la API de Telegram no ocupa un cupo global
+    assert running_at_reply == [0]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test de la cola de salida de WhatsApp: ritmo por usuario, cubeta global y agrupación de textos
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bots.send_queue import OutboundQueue, TokenBucket
+
+
+class Recorder:
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = set(fail_for)
+
+    async def __call__(self, recipient, text, **options):
+        self.sent.append((recipient, text, options, time.perf_counter()))
+        return recipient not in self.fail_for
+
+
+def test_messages_inside_the_window_are_delayed_and_coalesced():
+    deliver = Recorder()
+    outbox = OutboundQueue(deliver, rate=100, min_interval=0.2)
+
+    async def run():
+        first = await outbox.send("573001", "Hola")
+        # Dentro de la ventana de 0.2 s: se retrasan y salen como un solo mensaje
+        return first, await asyncio.gather(
+            outbox.send("573001", "Tu pedido va en camino"),
+            outbox.send("573001", "Total: $45.000"),
+        )
+
+    first, rest = asyncio.run(run())
+
+    assert first is True and rest == [True, True]
+    assert [text for _, text, _, _ in deliver.sent] == ["Hola", "Tu pedido va en camino\n\nTotal: $45.000"]
+    assert deliver.sent[1][3] - deliver.sent[0][3] >= 0.18
+    assert outbox.stats["coalesced"] == 1 and outbox.stats["delayed"] == 1
+    assert outbox.info()["pending_texts"] == 0
+
+
+def test_recipients_do_not_wait_for_each_other_and_options_are_kept_apart():
+    deliver = Recorder(fail_for={"573003"})
+    outbox = OutboundQueue(deliver, rate=100, min_interval=5.0, max_chars=20)
+
+    async def run():
+        tasks = [asyncio.create_task(outbox.send("573001", "a" * 12)),
+                 asyncio.create_task(outbox.send("573001", "b" * 12)),  # no cabe en el mismo mensaje
+                 asyncio.create_task(outbox.send("573002", "hola", preview_url=True)),
+                 asyncio.create_task(outbox.send("573003", "hola"))]
+        await asyncio.sleep(0.05)
+        # El segundo mensaje a 573001 espera su ventana de 5 s sin retrasar a los demás
+        done = [task.result() if task.done() else None for task in tasks]
+        pending = outbox.info()["pending_texts"]
+        for task in tasks:
+            task.cancel()
+        return done, pending
+
+    done, pending = asyncio.run(run())
+
+    assert done == [True, None, True, False]
+    assert pending == 1
+    assert [(recipient, options) for recipient, _, options, _ in deliver.sent] == [
+        ("573001", {}), ("573002", {"preview_url": True}), ("573003", {})]
+    assert outbox.stats["failed"] == 1
+
+
+def test_token_bucket_spaces_sends_beyond_the_burst():
+    bucket = TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert 0.09 <= delays[2] <= 0.11 and 0.19 <= delays[3] <= 0.21
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test de la deduplicación de webhooks: los reenvíos de un mismo mensaje se procesan una sola vez
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.bots import whatsapp_bot as whatsapp_module
+from src.bots.dedup import SeenIds, SQLiteSeenStore, WebhookDeduplicator
+from src.bots.whatsapp_bot import WhatsAppBot
+
+
+def test_seen_ids_are_bounded_and_expire():
+    seen = SeenIds(max_entries=3, ttl_seconds=0.1)
+    assert [seen.add(key) for key in ("a", "b", "a", "c", "d")] == [True, True, False, True, True]
+    assert len(seen) == 3 and "a" not in seen  # el más antiguo sale al llenarse
+    time.sleep(0.12)
+    assert seen.add("d") is True and len(seen) == 1
+
+
+def test_shared_store_drops_redeliveries_seen_by_another_instance():
+    store = SQLiteSeenStore(":memory:", ttl_seconds=60)
+    first, second = WebhookDeduplicator(shared=store), WebhookDeduplicator(shared=store)
+
+    async def run():
+        return [
+            await first.first_time("whatsapp", "wamid.1"),
+            await second.first_time("whatsapp", "wamid.1"),   # otra instancia, mismo mensaje
+            await second.first_time("telegram", "wamid.1"),   # otra plataforma, otra clave
+            await first.first_time("whatsapp", None),          # sin id: siempre se procesa
+        ]
+
+    assert asyncio.run(run()) == [True, False, True, True]
+    assert second.info()["duplicates"] == 1
+
+
+def test_whatsapp_redelivery_runs_the_workflow_once(monkeypatch):
+    monkeypatch.setattr(whatsapp_module, "webhook_dedup", WebhookDeduplicator(local=SeenIds()))
+    bot = WhatsAppBot.__new__(WhatsAppBot)
+    received = []
+
+    async def process(cliente_id, message_text, user_name=None, complete=False):
+        received.append(message_text)
+
+    bot.process_user_message = process
+    message = {"id": "wamid.42", "from": "573001112233", "type": "text", "text": {"body": "hola"}}
+
+    async def run():
+        for _ in range(3):
+            await bot._process_message(message, {"573001112233": "Ana"})
+
+    asyncio.run(run())
+    assert received == ["hola"]
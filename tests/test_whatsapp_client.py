@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test del cliente HTTP asíncrono de WhatsApp: reintentos sin bloquear el loop y Retry-After en 429
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.bots.whatsapp_client import WhatsAppClient, _retry_after
+
+URL = "https://graph.test/123/messages"
+
+
+def make_client(responses, calls):
+    """Cliente contra un transporte en memoria que devuelve (o lanza) `responses` en orden."""
+    def handler(request):
+        calls.append((request.method, request.headers.get("authorization"), time.perf_counter()))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return WhatsAppClient({"Authorization": "Bearer token"}, max_retries=2,
+                          transport=httpx.MockTransport(handler))
+
+
+def test_429_waits_retry_after_without_blocking_the_loop():
+    calls = []
+    client = make_client([
+        httpx.Response(429, headers={"Retry-After": "0.2"}, json={"error": "throttled"}),
+        httpx.Response(200, json={"messages": [{"id": "wamid.1"}]}),
+    ], calls)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        result, _ = await asyncio.gather(client.request("POST", URL, {"to": "57300"}), ticker())
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+
+    assert result == {"messages": [{"id": "wamid.1"}]}
+    assert len(calls) == 2 and calls[0][1] == "Bearer token"
+    assert calls[1][2] - calls[0][2] >= 0.18
+    # El loop siguió atendiendo otras tareas mientras esperaba el Retry-After
+    assert len(ticks) == 5 and ticks[-1] < calls[1][2]
+    assert client.stats == {"requests": 1, "retries": 1, "throttled": 1, "failures": 0}
+
+
+def test_client_errors_are_not_retried_and_server_errors_give_up():
+    calls = []
+    client = make_client([httpx.Response(400, json={"error": "bad"})], calls)
+    assert asyncio.run(client.request("POST", URL, {})) is None
+    assert len(calls) == 1
+
+    calls = []
+    client = make_client([httpx.Response(503, headers={"Retry-After": "0"})] * 3, calls)
+    assert asyncio.run(client.request("GET", URL)) is None
+    assert len(calls) == 3
+    assert client.stats["retries"] == 2 and client.stats["failures"] == 1
+
+
+def test_posts_are_only_resent_when_they_never_reached_the_api():
+    # Timeout de lectura o 5xx: Meta pudo haber aceptado el mensaje, reenviarlo lo duplicaría
+    for failure in (httpx.ReadTimeout("read timed out"), httpx.Response(503, headers={"Retry-After": "0"})):
+        calls = []
+        client = make_client([failure, httpx.Response(200, json={"messages": [{"id": "wamid.1"}]})], calls)
+        assert asyncio.run(client.request("POST", URL, {"to": "57300"})) is None
+        assert len(calls) == 1 and client.stats["retries"] == 0
+
+    # Error de conexión: la petición no salió, se puede reenviar
+    calls = []
+    client = make_client([httpx.ConnectError("connection refused"),
+                          httpx.Response(200, json={"messages": [{"id": "wamid.2"}]})], calls)
+    assert asyncio.run(client.request("POST", URL, {"to": "57300"})) == {"messages": [{"id": "wamid.2"}]}
+    assert len(calls) == 2
+
+    # GET es idempotente: también se reintenta tras un timeout de lectura
+    calls = []
+    client = make_client([httpx.ReadTimeout("read timed out"), httpx.Response(200, json={"ok": True})], calls)
+    assert asyncio.run(client.request("GET", URL)) == {"ok": True}
+    assert len(calls) == 2
+
+
+def test_retry_after_parsing():
+    assert _retry_after(httpx.Response(429, headers={"Retry-After": "3"})) == 3.0
+    assert _retry_after(httpx.Response(429)) is None
+    assert _retry_after(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    date = _retry_after(httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+    assert date == 0.0
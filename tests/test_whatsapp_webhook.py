@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test del webhook ASGI de WhatsApp: acuse inmediato y procesamiento en segundo plano
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.bots.webhook_app import WebhookApp
+from src.bots.whatsapp_bot import WhatsAppBot
+
+PAYLOAD = {
+    "entry": [{"changes": [{"value": {
+        "contacts": [{"wa_id": "573001112233", "profile": {"name": "Ana"}}],
+        "messages": [{"id": "wamid.1", "from": "573001112233", "type": "text", "text": {"body": "hola"}}],
+    }}]}]
+}
+
+
+def make_bot():
+    """Bot sin __init__: sin credenciales reales ni workflow."""
+    bot = WhatsAppBot.__new__(WhatsAppBot)
+    bot.access_token = "token"
+    bot.phone_number_id = "123"
+    bot.verify_token = "verify"
+    bot.app = WebhookApp()
+    bot.background_tasks = set()
+    bot._setup_webhook_routes()
+    return bot
+
+
+def client(bot):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=bot.app), base_url="http://bot")
+
+
+def test_webhook_acks_before_processing_finishes():
+    bot = make_bot()
+    received = []
+
+    async def slow_process(cliente_id, message_text, user_name=None, complete=False):
+        await asyncio.sleep(0.3)
+        received.append((cliente_id, message_text, user_name))
+
+    bot.process_user_message = slow_process
+
+    async def run():
+        async with client(bot) as http:
+            start = time.perf_counter()
+            response = await http.post("/webhook/whatsapp", json=PAYLOAD)
+            elapsed = time.perf_counter() - start
+            pending = len(bot.background_tasks)
+            await asyncio.gather(*bot.background_tasks)
+        return response, elapsed, pending
+
+    response, elapsed, pending = asyncio.run(run())
+
+    assert response.status_code == 200 and response.json() == {"status": "received"}
+    assert elapsed < 0.2
+    assert pending == 1
+    assert received == [("573001112233", "hola", "Ana")]
+
+
+def test_verification_and_routing():
+    bot = make_bot()
+
+    async def run():
+        async with client(bot) as http:
+            ok = await http.get("/webhook/whatsapp", params={
+                "hub.mode": "subscribe", "hub.verify_token": "verify", "hub.challenge": "42"})
+            bad = await http.get("/webhook/whatsapp", params={
+                "hub.mode": "subscribe", "hub.verify_token": "nope", "hub.challenge": "42"})
+            health = await http.get("/health")
+            missing = await http.get("/nada")
+            wrong_method = await http.delete("/webhook/whatsapp")
+        return ok, bad, health, missing, wrong_method
+
+    ok, bad, health, missing, wrong_method = asyncio.run(run())
+
+    assert (ok.status_code, ok.text) == (200, "42")
+    assert bad.status_code == 403
+    assert health.json()["status"] == "healthy"
+    assert missing.status_code == 404 and wrong_method.status_code == 405
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test de detect_user_intent_step: consulta del cliente y LLM en paralelo
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import src.core.workflow as workflow_module
+from src.core.intent_classifier import IntentPreClassifier
+from src.core.prompts import CustomerServicePrompts
+
+DELAY = 0.3
+
+
+class SlowCustomers:
+    async def get_or_create(self, cliente_id):
+        await asyncio.sleep(DELAY)
+        return {"id": cliente_id, "nombre_completo": "Ana", "telefono": "300", "direccion": "Calle 1"}
+
+
+class SlowLLM:
+    async def ainvoke(self, context):
+        await asyncio.sleep(DELAY)
+        return AIMessage(content='[{"intent": "consulta_productos", "action": "pregunta_precio_hawaiana"}]')
+
+
+def make_workflow():
+    workflow = workflow_module.Workflow.__new__(workflow_module.Workflow)
+    workflow.llm = SlowLLM()
+    workflow.prompts = CustomerServicePrompts()
+    workflow.intent_classifier = IntentPreClassifier()
+    return workflow
+
+
+def test_customer_lookup_overlaps_llm_call(monkeypatch):
+    monkeypatch.setattr(workflow_module, "customers", SlowCustomers())
+    workflow = make_workflow()
+    state = {"cliente_id": "u1", "messages": [HumanMessage(content="¿cuánto vale la hawaiana?")]}
+
+    start = time.perf_counter()
+    result = asyncio.run(workflow.detect_user_intent_step(state))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < DELAY * 1.8
+    assert result["divided_message"][0]["intent"] == "consulta_productos"
+    assert result["customer"]["nombre_completo"] == "Ana"
+    # Los pasos se ajustan con el cliente obtenido, después de ambas llamadas
+    assert result["order_steps"]["registro_datos_personales"] == 2
+    assert result["order_steps"]["registro_direccion"] == 2